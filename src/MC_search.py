@@ -1,27 +1,43 @@
 # Libraries
-from copy import deepcopy
 import numpy as np
-import random as rd
 import sequence as seq
 import lattice as lat
 import math
-from variables import NB_ITER, TEMP, RHO
-from typing import Optional, Union
+import warnings
+import mc_kernel
+from trajectory import Trajectory
+from move_generator import MoveGenerator
+from random_streams import RandomStream
+from canonical import EnergyCache
+from variables import NB_ITER, TEMP, RHO, K_B, VALIDATE_ENERGY, TRAJECTORY_MODE, REJECTION_FREE, MC_BACKEND
+from moves.move_utils import Displacement, MoveOutcome, MOVE_KINDS
+from typing import Dict, List, Optional, Union
 
 class mc_search:
     """
-    Monte Carlo Search for protein 2D structure optimization.
+    Monte Carlo Search for protein structure optimization, on the square or the cubic lattice.
 
     Attributes:
         lattice (lat.Lattice): The lattice containing the protein to be optimized.
-        trajectory (List[lat.Lattice]): The list of lattice during the search.
+        trajectory (Trajectory): The conformations recorded during the search.
+        step (int): The number of MC steps performed so far. In rejection-free mode, the number of moves applied.
+        time (int): The number of MC steps the search stands for. Equal to `step` except in rejection-free mode.
         temperature (int): The temperature for the Monte Carlo simulation.
         probability (float): The probability of performing a pull move.
         max_iteration (int): The maximum number of iterations for the search.
         target_energy (Optional[int]): The target energy to reach (if specified).
+        validate_energy (bool): Whether to check every incremental energy against a full recomputation.
+        move_generator (Optional[MoveGenerator]): The legal moves of the lattice, in rejection-free mode.
+        move_stats (Dict[str, Dict[str, int]]): For each kind of move, the number of moves proposed,
+            applied (i.e. possible) and accepted.
+        energy_evaluations (int): The number of energy changes computed, one per applied move, or one per legal
+            move enumerated in rejection-free mode.
+        rng (RandomStream): The random stream of the replica, shared with its lattice.
+        backend (str): "python" to run the MC steps in Python, "compiled" to run whole segments in the
+            Numba kernel of `mc_kernel`.
     """
 
-    def __init__(self, lattice: lat.Lattice, temperature: int, probability: float, max_iteration: int, target_energy: Optional[int] = None):
+    def __init__(self, lattice: lat.Lattice, temperature: int, probability: float, max_iteration: int, target_energy: Optional[int] = None, validate_energy: bool = VALIDATE_ENERGY, trajectory_mode: str = TRAJECTORY_MODE, rejection_free: bool = REJECTION_FREE, rng: Optional[RandomStream] = None, backend: str = MC_BACKEND, energy_cache: Optional[EnergyCache] = None):
         """
         Initialize the Monte Carlo search object.
 
@@ -31,14 +47,55 @@ class mc_search:
             probability (float): The probability of performing a pull move.
             max_iteration (int): The maximum number of iterations for the search.
             target_energy (Optional[int], optional): The target energy to reach. Defaults to None.
+            validate_energy (bool, optional): Whether to check every incremental energy against
+                a full recomputation (slow, for debugging). Defaults to VALIDATE_ENERGY.
+            trajectory_mode (str, optional): How the trajectory is recorded, see `Trajectory`. Defaults to TRAJECTORY_MODE.
+            rejection_free (bool, optional): Whether to draw among the legal moves weighted by their acceptance
+                probability instead of proposing blind moves, see `run_rejection_free`. Defaults to REJECTION_FREE.
+            rng (Optional[RandomStream], optional): The random stream of the replica. Defaults to None, for the
+                stream of the lattice.
+            backend (str, optional): "python" or "compiled", see `run_compiled`. The compiled kernel only runs on a
+                dense lattice and does not validate energies: the compiled backend falls back to Python, with a
+                warning, on a sparse lattice (by default from SPARSE_GRID_MIN_LENGTH residues, build the lattice
+                with `sparse=False` for long chains), with `validate_energy`, or when Numba is not installed.
+                Defaults to MC_BACKEND.
+            energy_cache (Optional[EnergyCache], optional): The cache the energy of the starting conformation is looked
+                up in, e.g. shared by the replicas of a search. Defaults to None, to compute it.
+
+        Raises:
+            ValueError: If the backend is unknown, or if the rejection-free search or the compiled backend is
+                asked for on a lattice other than the square lattice.
         """
+        if backend not in mc_kernel.BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}, expected one of {mc_kernel.BACKENDS}")
+        if lattice.dimension != 2 and (rejection_free or backend == "compiled"):
+            raise ValueError("The rejection-free search and the compiled backend only run on the square lattice")
+        if backend == "compiled" and lattice.sparse:
+            warnings.warn("The compiled backend requires a dense lattice, the MC steps run in Python")
+            backend = "python"
+        if backend == "compiled" and validate_energy:
+            warnings.warn("The compiled backend does not validate energies, the MC steps run in Python")
+            backend = "python"
+        if backend == "compiled" and not mc_kernel.NUMBA_AVAILABLE:
+            warnings.warn("Numba is not installed, the MC steps run in Python")
+            backend = "python"
         self.lattice = lattice
-        self.trajectory = [lattice]
+        self.rng = rng if rng is not None else lattice.rng
+        self.lattice.rng = self.rng
         self.temperature = temperature
         self.probability = probability
         self.max_iteration = max_iteration
-        self.lattice.energy = self.lattice.calculate_energy()
+        self.lattice.energy = energy_cache.energy(self.lattice) if energy_cache is not None else self.lattice.calculate_energy()
+        self.step = 0
+        self.time = 0
+        self.trajectory = Trajectory(trajectory_mode)
+        self.trajectory.start(self.lattice)
         self.target_energy = target_energy
+        self.validate_energy = validate_energy
+        self.move_generator = MoveGenerator(self.lattice, probability) if rejection_free else None
+        self.move_stats = {kind: {"proposed": 0, "applied": 0, "accepted": 0} for kind in MOVE_KINDS}
+        self.energy_evaluations = 0
+        self.backend = backend
 
     def run(self) -> None:
         """
@@ -46,67 +103,233 @@ class mc_search:
 
         This method performs the Monte Carlo simulation, making moves and accepting or rejecting conformations
         based on the acceptance criterion (Metropolis Criterion). 
-        It updates the trajectory with accepted conformations.
+        It updates the trajectory with accepted conformations. Rejected moves are reverted in place
+        through the lattice journal instead of restoring a copy of the previous conformation.
+        Moves that could not be applied leave the lattice untouched and are skipped at no cost.
+        The residues, move choices and Metropolis uniforms of the whole run are drawn beforehand,
+        one of each per step.
         """
-        for _ in range(self.max_iteration):
+        if self.move_generator is not None:
+            self.run_rejection_free()
+            return
+        generator = self.rng.generator
+        residues = generator.integers(1, self.lattice.sequence.length + 1, size=self.max_iteration)
+        move_draws = generator.random(self.max_iteration)
+        acceptance_draws = generator.random(self.max_iteration)
+        if self.backend == "compiled":
+            self.run_compiled(residues, move_draws, acceptance_draws)
+            return
+        residues, move_draws, acceptance_draws = residues.tolist(), move_draws.tolist(), acceptance_draws.tolist()
+        for i in range(self.max_iteration):
             # Check if the target energy has been reached
             if self.target_energy is not None and self.lattice.energy == self.target_energy:
                 break
 
+            self.step += 1
+            self.time += 1
             # Choose a random amino acid
-            aa = rd.randint(1, self.lattice.sequence.length)
+            aa = residues[i]
             # Make a move
-            self.make_move(aa)
-            # Choose whether to accept the conformation or not
-            if self.accept_conformation():
-                # Check if the conformation should be translated
-                self.lattice.translation_check_and_apply()
-                self.trajectory.append(deepcopy(self.lattice))  # Accept the conformation and add it to the trajectory
-            else:
-                self.lattice = deepcopy(self.trajectory[-1])  # Reject the conformation
+            outcome = self.make_move(aa, move_draws[i])
+            stats = self.move_stats[outcome.kind]
+            stats["proposed"] += 1
+            displaced = outcome.displaced
+            # A move that could not be applied moved nothing, so there is nothing to evaluate nor revert
+            if outcome.applied:
+                stats["applied"] += 1
+                # Choose whether to accept the conformation or not
+                if self.accept_conformation(displaced, acceptance_draws[i]):
+                    stats["accepted"] += 1
+                    self.lattice.commit()
+                    # Check if the conformation should be translated
+                    shift = self.lattice.translation_check_and_apply()
+                    self.trajectory.record(self.lattice, self.step, displaced, shift)  # Accept the conformation and add it to the trajectory
+                else:
+                    self.lattice.revert()  # Reject the conformation
+            if self.step >= self.trajectory.next_sample:
+                self.trajectory.sample(self.lattice, self.step)
+
+    def run_compiled(self, residues: np.ndarray, move_draws: np.ndarray, acceptance_draws: np.ndarray) -> None:
+        """
+        Run the Monte Carlo search as one call to the kernel of `mc_kernel`, on the dense lattice.
 
-    def make_move(self, aa: int) -> None:
+        The kernel performs the same steps as `run` for the same draws, so both backends follow the
+        same trajectory. Only the conformation at the end of the segment is recorded in the trajectory.
+
+        Args:
+            residues (np.ndarray): The chain index of the residue to move at each step.
+            move_draws (np.ndarray): The uniform choosing the kind of move at each step.
+            acceptance_draws (np.ndarray): The uniform of the Metropolis criterion at each step.
+        """
+        steps, move_stats, _, accepted = mc_kernel.run_lattice_segment(
+            self.lattice, residues, move_draws, acceptance_draws, self.temperature, self.probability, self.target_energy)
+        self.step += steps
+        self.time += steps
+        for kind, stats in move_stats.items():
+            for key, count in stats.items():
+                self.move_stats[kind][key] += count
+            self.energy_evaluations += stats["applied"]
+        if accepted.any():
+            self.trajectory.record(self.lattice, self.step)
+        if self.step >= self.trajectory.next_sample:
+            self.trajectory.sample(self.lattice, self.step)
+
+    def run_rejection_free(self) -> None:
+        """
+        Run the Monte Carlo search without rejections (n-fold way).
+
+        Each iteration applies one of the legal moves, drawn with probability proportional to its
+        proposal probability times its acceptance probability, and advances `time` by the number of
+        MC steps the Metropolis search would have spent until accepting a move. The search stops once
+        `max_iteration` MC steps have elapsed, so that both modes sample the same dynamics over the
+        same budget.
+
+        Raises:
+            RuntimeError: If energy validation is enabled and the incremental energy or the legal
+                moves differ from a full recomputation.
+        """
+        end_time = self.time + self.max_iteration
+        evaluations = self.move_generator.evaluations
+        while self.time < end_time:
+            if self.target_energy is not None and self.lattice.energy == self.target_energy:
+                break
+            selected = self.move_generator.select(self.temperature)
+            if selected is None:  # frozen conformation, no move can be accepted
+                self.time = end_time
+                break
+            move, steps = selected
+            if self.time + steps > end_time:  # the budget runs out before the next move is accepted
+                self.time = end_time
+                break
+            self.step += 1
+            self.time += steps
+            displaced = self.move_generator.apply(move).displaced
+            stats = self.move_stats[move.kind]
+            stats["proposed"] += 1
+            stats["applied"] += 1
+            stats["accepted"] += 1
+            self.lattice.energy += move.delta_energy
+            if self.validate_energy:
+                energy_full = self.lattice.calculate_energy()
+                if energy_full != self.lattice.energy:
+                    raise RuntimeError(f"Incremental energy {self.lattice.energy} differs from full energy {energy_full}")
+            self.lattice.commit()
+            shift = self.lattice.translation_check_and_apply()
+            self.move_generator.update(displaced, shift)
+            if self.validate_energy:
+                self.move_generator.validate()
+            self.trajectory.record(self.lattice, self.step, displaced, shift)
+            if self.step >= self.trajectory.next_sample:
+                self.trajectory.sample(self.lattice, self.step)
+        self.energy_evaluations += self.move_generator.evaluations - evaluations
+
+    def make_move(self, aa: int, draw: Optional[float] = None) -> MoveOutcome:
         """
         Attend to make a move based on the specified amino acid.
 
         Args:
             aa (int): The index of the amino acid to be moved.
+            draw (Optional[float], optional): The uniform choosing the kind of move, then, rescaled to the
+                range of that kind, among its possible outcomes, e.g. the new position of an end residue.
+                Defaults to None, for a draw from the random stream.
+
+        Returns:
+            MoveOutcome: The outcome of the move.
         """
-        proba = rd.random()
+        proba = draw if draw is not None else self.rng.random()
         # Check if the amino acid is at the end of the sequence
         if aa == 1 or aa == self.lattice.sequence.length:
-            self.lattice.end_move(aa)
+            return self.lattice.end_move(aa, draw=proba)
         elif proba < self.probability:
-            # Perform pull move
-            self.lattice.pull_move(aa)
+            # Perform pull move, the draw rescaled to [0, 1) choosing among the possible pulls
+            return self.lattice.pull_move(aa, draw=proba / self.probability)
         else:
-            # Perform VSHD move
-            move = rd.choice(["corner_move", "cks_move"])
-            if move == "corner_move":
-                self.lattice.corner_move(aa)
+            # Perform VSHD move, corner or CKS with equal probability
+            corner_limit = self.probability + (1 - self.probability) / 2
+            if proba < corner_limit:
+                return self.lattice.corner_move(aa)
             else:
-                self.lattice.cks_move(aa)
+                return self.lattice.cks_move(aa, draw=(proba - corner_limit) / (1 - corner_limit))
+
+    def state(self) -> Dict[str, object]:
+        """
+        Return the progress of the search, as plain values that can be stored as JSON.
+        The conformation is left out, see `Conformation.to_numpy`.
+
+        Returns:
+            Dict[str, object]: The temperature, step counts, segment length, move statistics and random stream state.
+        """
+        return {
+            "temperature": self.temperature,
+            "step": self.step,
+            "time": self.time,
+            "max_iteration": self.max_iteration,
+            "move_stats": self.move_stats,
+            "energy_evaluations": self.energy_evaluations,
+            "rng": self.rng.state(),
+        }
 
-    def accept_conformation(self) -> bool:
+    def restore(self, state: Dict[str, object]) -> None:
+        """
+        Restore the progress of the search from a state returned by `state`, on the current conformation.
+
+        Args:
+            state (Dict[str, object]): The state of the search.
+        """
+        self.temperature = state["temperature"]
+        self.step = state["step"]
+        self.time = state["time"]
+        self.max_iteration = state["max_iteration"]
+        self.move_stats = {kind: dict(stats) for kind, stats in state["move_stats"].items()}
+        self.energy_evaluations = state["energy_evaluations"]
+        self.rng.restore(state["rng"])
+
+    def acceptance_rates(self) -> Dict[str, float]:
+        """
+        Compute the fraction of proposed moves that were accepted, for each kind of move.
+
+        Returns:
+            Dict[str, float]: The acceptance rate of each kind of move, 0 if none was proposed.
+        """
+        return {kind: stats["accepted"] / stats["proposed"] if stats["proposed"] else 0.0
+                for kind, stats in self.move_stats.items()}
+
+    def accept_conformation(self, displaced: List[Displacement], draw: Optional[float] = None) -> bool:
         """
         Evaluate whether to accept or reject the new conformation based on the energy.
+        Downhill moves are always accepted, uphill moves with the Metropolis probability exp(-dE / (K_B * T)),
+        so that the search samples the Boltzmann distribution at its temperature.
+
+        Args:
+            displaced (List[Displacement]): The residues displaced by the last move.
+            draw (Optional[float], optional): The uniform of the Metropolis criterion. Defaults to None,
+                for a draw from the random stream.
 
         Returns:
             bool: True if the new conformation is accepted, False otherwise.
+
+        Raises:
+            RuntimeError: If energy validation is enabled and the incremental energy
+                differs from the full recomputation.
         """
-        # Calculate the energy of the new lattice
-        energy_new_conf = self.lattice.calculate_energy()
+        # Calculate the energy of the new lattice from the residues that moved
+        energy_new_conf = self.lattice.energy + self.lattice.calculate_delta_energy(displaced)
+        self.energy_evaluations += 1
+        if self.validate_energy:
+            energy_full = self.lattice.calculate_energy()
+            if energy_full != energy_new_conf:
+                raise RuntimeError(f"Incremental energy {energy_new_conf} differs from full energy {energy_full}")
         # Accept or reject the new conformation
         # Compare if a move has been made
-        if np.array_equal(self.lattice.lattice, self.trajectory[-1].lattice):
+        if not displaced:
             return False
         else:
             if energy_new_conf <= self.lattice.energy:
                 self.lattice.energy = energy_new_conf
                 return True
             else:
-                rand_num = rd.random()
-                if rand_num > math.exp((self.lattice.energy - energy_new_conf) / self.temperature):
+                rand_num = draw if draw is not None else self.rng.random()
+                if rand_num < math.exp((self.lattice.energy - energy_new_conf) / (K_B * self.temperature)):
                     self.lattice.energy = energy_new_conf
                     return True
                 else:
@@ -1,10 +1,20 @@
-from copy import deepcopy
 import math
+import time
 import numpy as np
-import random as rd
+import sequence as seq
 import lattice as lat
 import MC_search as mc
-from typing import List, Optional, Union
+from canonical import EnergyCache, GroundStateRegistry, canonical_key
+from checkpoint import SearchCheckpoint, save_checkpoint, load_checkpoint
+from initialization import random_conformations
+from ladder_tuning import LadderTuner
+from scheduling import ExchangeSchedule
+from random_streams import RandomStream, spawn_streams
+from replica_pool import ReplicaPool
+from stopping import StopCriteria
+from telemetry import Telemetry, ConsoleObserver, Observer, replica_counters, pair_counters
+from variables import K_B, TRAJECTORY_MODE, REJECTION_FREE, MC_BACKEND, DIMENSION, WALL_TIME, MAX_ROUNDS, STAGNATION_ROUNDS, CHECKPOINT_INTERVAL, TELEMETRY_INTERVAL
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
 
 def temp_range(start: int, end: int, nb_replicat: int) -> List[int]:
     """
@@ -20,13 +30,15 @@ def temp_range(start: int, end: int, nb_replicat: int) -> List[int]:
     step = (end - start) // nb_replicat
     return list(range(start, end, step))
 
-def exchange_replicates(replicate1: mc.mc_search, replicate2: mc.mc_search) -> bool:
+def exchange_replicates(replicate1: mc.mc_search, replicate2: mc.mc_search, rng: RandomStream) -> bool:
     """
     Attempt to exchange the states of two replica MC simulations based on the Metropolis like criterion.
+    The exchange swaps the temperatures of the replicas, their conformations stay in place.
 
     Args:
         replicate1 (mc.MCSearch): The first replicate to exchange.
         replicate2 (mc.MCSearch): The second replicate to exchange.
+        rng (RandomStream): The random stream of the exchanges.
 
     Returns:
         bool: True if the exchange is accepted, False otherwise.
@@ -38,14 +50,10 @@ def exchange_replicates(replicate1: mc.mc_search, replicate2: mc.mc_search) -> b
     # Compute delta
     delta = compute_delta(energy1, energy2, temp1, temp2)
     # Accept or reject the exchange
-    if evaluate_exchange(delta):
-        # Exchange the lattice
-        temporary_lattice = deepcopy(replicate1.lattice)
-        replicate1.lattice = deepcopy(replicate2.lattice)
-        replicate2.lattice = deepcopy(temporary_lattice)
-        # Update the trajectory
-        replicate1.trajectory.append(deepcopy(replicate1.lattice))
-        replicate2.trajectory.append(deepcopy(replicate2.lattice))
+    if evaluate_exchange(delta, rng):
+        # Exchange the temperatures
+        replicate1.temperature = temp2
+        replicate2.temperature = temp1
         return True
     else:
         return False
@@ -57,22 +65,24 @@ def compute_delta(energy_i: float, energy_j: float, temp_i: float, temp_j: float
     Args:
         energy_i (float): The energy of the first replica.
         energy_j (float): The energy of the second replica.
-        temp_i (float): The temperature of the first replica.
-        temp_j (float): The temperature of the second replica.
+        temp_i (float): The temperature of the first replica, in kelvin.
+        temp_j (float): The temperature of the second replica, in kelvin.
 
     Returns:
         float: The computed delta.
     """
-    beta_i = 1 / temp_i
-    beta_j = 1 / temp_j
+    beta_i = 1 / (K_B * temp_i)
+    beta_j = 1 / (K_B * temp_j)
     return (beta_j - beta_i) * (energy_i - energy_j)
 
-def evaluate_exchange(delta: float) -> bool:
+def evaluate_exchange(delta: float, rng: RandomStream) -> bool:
     """
-    Evaluate whether to accept or reject the replicat exchange based on the computed delta.
+    Evaluate whether to accept or reject the replicat exchange based on the computed delta, with the
+    Metropolis criterion: the exchange is accepted with probability min(1, exp(-delta)).
 
     Args:
         delta (float): The computed delta from the energy difference.
+        rng (RandomStream): The random stream of the exchanges.
 
     Returns:
         bool: True if the exchange is accepted, False otherwise.
@@ -80,68 +90,574 @@ def evaluate_exchange(delta: float) -> bool:
     if delta < 0:
         return True
     else:
-        probability = rd.random()
-        return probability > math.exp(-delta)
+        probability = rng.random()
+        return probability < math.exp(-delta)
+
+class ReplicaLadder:
+    """
+    Assignment of the replicas to the temperatures of the ladder, updated by exchanging temperatures.
+
+    The ladder also gathers the statistics used to judge its mixing: attempts and acceptances for each
+    pair of neighbouring temperatures, the round-trip times of each replica, i.e. the number of
+    exchange rounds it takes to go from the lowest temperature to the highest one and back, and at
+    each temperature, the number of visits by replicas heading up or down the ladder.
+
+    Attributes:
+        temperatures (List[float]): The temperatures of the ladder, from the lowest to the highest.
+        replica_at (List[int]): The index of the replica at each temperature.
+        slot_of (List[int]): The index of the temperature of each replica.
+        attempts (List[int]): The number of exchanges attempted between temperatures k and k + 1.
+        accepts (List[int]): The number of exchanges accepted between temperatures k and k + 1.
+        round_trip_times (List[List[int]]): The completed round-trip times of each replica, in exchange rounds.
+        up_visits (List[int]): The number of rounds each temperature held a replica that last visited the lowest one.
+        down_visits (List[int]): The number of rounds each temperature held a replica that last visited the highest one.
+        offset (int): 0 to attempt the (0, 1), (2, 3)... pairs in the next round, 1 for the (1, 2), (3, 4)... pairs.
+        rounds (int): The number of exchange rounds performed.
+        rng (RandomStream): The random stream of the exchanges.
+    """
+
+    def __init__(self, temperatures: List[float], rng: RandomStream) -> None:
+        """
+        Initialize the ladder, with replica i at the i-th temperature.
+
+        Args:
+            temperatures (List[float]): The temperatures of the ladder, from the lowest to the highest.
+            rng (RandomStream): The random stream of the exchanges.
+        """
+        self.rng = rng
+        self.offset = 0
+        self.rounds = 0
+        self.retune(temperatures, list(range(len(temperatures))))
+
+    def retune(self, temperatures: List[float], replica_at: Optional[List[int]] = None) -> None:
+        """
+        Move the ladder to new temperatures and start its statistics over, keeping the count of rounds.
+
+        Args:
+            temperatures (List[float]): The new temperatures, from the lowest to the highest.
+            replica_at (Optional[List[int]], optional): The index of the replica at each new temperature.
+                Defaults to None, to keep the current assignment, in which case the number of temperatures
+                must not change.
+
+        Raises:
+            ValueError: If the assignment does not match the number of temperatures.
+        """
+        nb_temperatures = len(temperatures)
+        replica_at = list(self.replica_at if replica_at is None else replica_at)
+        if len(replica_at) != nb_temperatures:
+            raise ValueError(f"{len(replica_at)} replicas for {nb_temperatures} temperatures")
+        self.temperatures = list(temperatures)
+        self.replica_at = replica_at
+        self.slot_of = [0] * nb_temperatures
+        for k, replica in enumerate(replica_at):
+            self.slot_of[replica] = k
+        self.attempts = [0] * (nb_temperatures - 1)
+        self.accepts = [0] * (nb_temperatures - 1)
+        self.round_trip_times: List[List[int]] = [[] for _ in range(nb_temperatures)]
+        self.up_visits = [0] * nb_temperatures
+        self.down_visits = [0] * nb_temperatures
+        # Last end of the ladder visited by each replica ("bottom" or "top") and start of its current round trip
+        self._last_end: List[Optional[str]] = [None] * nb_temperatures
+        self._trip_start = [self.rounds] * nb_temperatures
+        # Last end of the ladder visited by each replica, whether or not it has visited the other one
+        self._heading: List[Optional[str]] = [None] * nb_temperatures
+        self._track_round_trips()
+
+    def state(self) -> Dict[str, object]:
+        """
+        Return the assignment, statistics and random stream of the ladder, as plain values that can be stored as JSON.
+
+        Returns:
+            Dict[str, object]: The state of the ladder.
+        """
+        return {
+            "temperatures": self.temperatures,
+            "replica_at": self.replica_at,
+            "attempts": self.attempts,
+            "accepts": self.accepts,
+            "round_trip_times": self.round_trip_times,
+            "up_visits": self.up_visits,
+            "down_visits": self.down_visits,
+            "last_end": self._last_end,
+            "trip_start": self._trip_start,
+            "heading": self._heading,
+            "offset": self.offset,
+            "rounds": self.rounds,
+            "rng": self.rng.state(),
+        }
+
+    def restore(self, state: Dict[str, object]) -> None:
+        """
+        Restore the ladder to a state returned by `state`.
+
+        Args:
+            state (Dict[str, object]): The state of the ladder.
+        """
+        self.temperatures = list(state["temperatures"])
+        self.replica_at = list(state["replica_at"])
+        self.slot_of = [0] * len(self.replica_at)
+        for k, replica in enumerate(self.replica_at):
+            self.slot_of[replica] = k
+        self.attempts = list(state["attempts"])
+        self.accepts = list(state["accepts"])
+        self.round_trip_times = [list(times) for times in state["round_trip_times"]]
+        self.up_visits = list(state["up_visits"])
+        self.down_visits = list(state["down_visits"])
+        self._last_end = list(state["last_end"])
+        self._trip_start = list(state["trip_start"])
+        self._heading = list(state["heading"])
+        self.offset = state["offset"]
+        self.rounds = state["rounds"]
+        self.rng.restore(state["rng"])
+
+    def exchange(self, replicates: List[mc.mc_search]) -> List[Tuple[int, int]]:
+        """
+        Attempt one round of exchanges between neighbouring temperatures, alternating even and odd pairs.
+
+        Args:
+            replicates (List[mc.mc_search]): The replicas, indexed as in the ladder.
+
+        Returns:
+            List[Tuple[int, int]]: The pairs of temperature indices whose replicas were exchanged.
+        """
+        exchanged = []
+        for k in range(self.offset, len(self.temperatures) - 1, 2):
+            replica_low, replica_high = self.replica_at[k], self.replica_at[k + 1]
+            self.attempts[k] += 1
+            if exchange_replicates(replicates[replica_low], replicates[replica_high], self.rng):
+                self.accepts[k] += 1
+                self.replica_at[k], self.replica_at[k + 1] = replica_high, replica_low
+                self.slot_of[replica_low], self.slot_of[replica_high] = k + 1, k
+                exchanged.append((k, k + 1))
+        self.offset = 1 - self.offset
+        self.rounds += 1
+        self._track_round_trips()
+        return exchanged
+
+    def acceptance_rates(self) -> List[Optional[float]]:
+        """
+        Compute the exchange acceptance rate of each pair of neighbouring temperatures.
+
+        Returns:
+            List[Optional[float]]: The acceptance rate between temperatures k and k + 1, None if never attempted.
+        """
+        return [accepts / attempts if attempts else None for accepts, attempts in zip(self.accepts, self.attempts)]
+
+    def up_fractions(self) -> List[Optional[float]]:
+        """
+        Compute, at each temperature, the fraction of visits by replicas heading up the ladder, i.e. that
+        last visited the lowest temperature. It falls from 1 to 0 along a well-mixed ladder.
+
+        Returns:
+            List[Optional[float]]: The fraction at each temperature, None if no replica has visited either end yet.
+        """
+        return [up / (up + down) if up + down else None for up, down in zip(self.up_visits, self.down_visits)]
+
+    def summary(self) -> Dict[str, object]:
+        """
+        Summarize the mixing statistics of the ladder.
+
+        Returns:
+            Dict[str, object]: The temperatures, attempts, acceptances and acceptance rates of each pair,
+            the number of completed round trips and their mean duration in exchange rounds.
+        """
+        trips = [time for times in self.round_trip_times for time in times]
+        return {
+            "temperatures": self.temperatures,
+            "attempts": self.attempts,
+            "accepts": self.accepts,
+            "acceptance_rates": self.acceptance_rates(),
+            "up_fractions": self.up_fractions(),
+            "round_trips": len(trips),
+            "mean_round_trip_time": sum(trips) / len(trips) if trips else None,
+        }
+
+    def _track_round_trips(self) -> None:
+        """
+        Update the round trips of the replicas standing at either end of the ladder, and the visits
+        of each temperature by replicas heading up or down.
+        """
+        bottom, top = self.replica_at[0], self.replica_at[-1]
+        if self._last_end[bottom] == "top":
+            self.round_trip_times[bottom].append(self.rounds - self._trip_start[bottom])
+        if self._last_end[bottom] != "bottom":
+            self._last_end[bottom] = "bottom"
+            self._trip_start[bottom] = self.rounds
+        if self._last_end[top] == "bottom":
+            self._last_end[top] = "top"
+        self._heading[bottom], self._heading[top] = "up", "down"
+        for k, replica in enumerate(self.replica_at):
+            if self._heading[replica] == "up":
+                self.up_visits[k] += 1
+            elif self._heading[replica] == "down":
+                self.down_visits[k] += 1
+
+class SearchResult(NamedTuple):
+    """
+    The outcome of a REMC search: the best conformation found, as a copy of the lattice of the replica
+    that reached it, its energy, why the search stopped (one of `stopping.STOP_REASONS`), the number of
+    exchange rounds performed, the wall-clock time spent, in seconds, the number of MC steps performed
+    by each replica, in the order of the replicas, the time spent in each phase of the search, see
+    `telemetry.PHASES`, the distinct conformations of the best energy found, up to GROUND_STATE_LIMIT,
+    and their number, symmetric copies of a fold counting once.
+    """
+    lattice: Optional[lat.Lattice]
+    energy: float
+    reason: str
+    rounds: int
+    seconds: float
+    replica_steps: List[int]
+    timings: Dict[str, float]
+    ground_states: Tuple[seq.Conformation, ...] = ()
+    distinct_ground_states: int = 0
 
 def REMC_search(
     sequence: str,
     Tmin: float,
     Tmax: float,
     nb_replica: int,
-    energy_optimal: float,
+    energy_optimal: Optional[float] = None,
     max_iteration: int = 500,
-    probability: float = 0.5
-) -> Optional[lat.Lattice]:
+    probability: float = 0.5,
+    trajectory_mode: str = TRAJECTORY_MODE,
+    parallel: bool = False,
+    seed: Optional[int] = None,
+    rejection_free: bool = REJECTION_FREE,
+    backend: str = MC_BACKEND,
+    dimension: int = DIMENSION,
+    wall_time: Optional[float] = WALL_TIME,
+    max_rounds: Optional[int] = MAX_ROUNDS,
+    stagnation_rounds: Optional[int] = STAGNATION_ROUNDS,
+    ladder_tuner: Optional[LadderTuner] = None,
+    schedule: Optional[ExchangeSchedule] = None,
+    checkpoint_path: Optional[str] = None,
+    checkpoint_interval: float = CHECKPOINT_INTERVAL,
+    resume_from: Optional[SearchCheckpoint] = None,
+    observers: Optional[List[Observer]] = None,
+    telemetry_interval: float = TELEMETRY_INTERVAL
+) -> SearchResult:
     """
     Perform a replica exchange Monte Carlo (REMC) search to find the lattice conformation
     with the lowest energy.
 
+    The search runs exchange rounds until one of its stop conditions is met, see `StopCriteria`:
+    the target energy reached, the wall-clock budget spent, the maximum number of rounds performed,
+    no improvement in `stagnation_rounds` rounds, or a SIGINT or SIGTERM received. Conditions are
+    checked after each round. Without any condition, the search runs until interrupted.
+
+    With a `ladder_tuner`, the temperatures between Tmin and Tmax are retuned during a warm-up from the
+    exchange statistics, then frozen for the rest of the search. When the tuner resizes the ladder, the
+    replicas kept are spread evenly along it and new replicas start from a copy of the conformation of
+    the replica at the closest temperature, with a fresh random stream.
+
+    With a `schedule`, the MC segments are counted in sweeps and their length depends on the temperature
+    each replica holds, and exchanges are attempted every `schedule.exchange_interval` segments, instead
+    of every segment of `max_iteration` steps. Stop conditions are still checked after every segment.
+
+    With a `checkpoint_path`, the state of the search is written there at the end of a round whenever
+    `checkpoint_interval` seconds have passed since the last checkpoint, and when the search stops, see
+    `save_checkpoint`. `resume_REMC_search` continues a search from its checkpoint exactly as if it had
+    not stopped, except for the trajectories of the replicas, which start over from the checkpoint.
+
+    The progress of the search is reported as events passed to `observers`, see `telemetry.EVENTS`: every
+    round, the energy of each replica, and every `telemetry_interval` seconds, a snapshot of the move counters
+    of each replica, the exchange counters of each pair of temperatures and the time spent in each phase.
+
+    After every round, the conformation of each replica is looked up by canonical key, see `canonical`, in an
+    LRU cache of energies, which also provides the energy of the replicas created from a conformation, and
+    offered to a registry of the distinct conformations of the best energy. The counters report the hit rate
+    and evictions of the cache, i.e. how often the replicas revisit a conformation, and the number of
+    distinct ground states found.
+
     Args:
         sequence (str): The amino acid sequence to be used in the lattice.
         Tmin (float): The minimum temperature for replica exchange range.
         Tmax (float): The maximum temperature for replica exchange range.
-        nb_replica (int): The number of replicas (temperatures) to use.
-        energy_optimal (float): The target energy to achieve.
-        max_iteration (int, optional): The maximum number of iterations for each MC search. Defaults to 500.
+        nb_replica (int): The number of replicas (temperatures) to use, see `temp_range`.
+        energy_optimal (Optional[float], optional): The target energy to achieve. Defaults to None, to search
+            until another stop condition is met.
+        max_iteration (int, optional): The maximum number of iterations for each MC search, unless a schedule
+            is given. Defaults to 500.
         probability (float, optional): The probability of acceptance for each MC move. Defaults to 0.5.
+        trajectory_mode (str, optional): How the replicas record their trajectory, see `Trajectory`. Defaults to TRAJECTORY_MODE.
+        parallel (bool, optional): Whether to run the MC segments of the replicas concurrently, each replica
+            in its own worker process. Defaults to False.
+        seed (Optional[int], optional): The seed of the random streams, for reproducible runs. Defaults to None.
+        rejection_free (bool, optional): Whether the replicas draw among their legal moves without rejections,
+            see `mc_search.run_rejection_free`. Defaults to REJECTION_FREE.
+        backend (str, optional): Whether the replicas run their MC segments in Python or in the compiled
+            kernel, see `mc_search.run_compiled`. With the compiled backend, the replicas get dense lattices
+            whatever the length of the sequence, as the kernel does not run on sparse ones. Defaults to MC_BACKEND.
+        dimension (int, optional): 2 to fold the sequence on the square lattice, 3 on the cubic lattice, where
+            neither the rejection-free search nor the compiled backend is available. Defaults to DIMENSION.
+        wall_time (Optional[float], optional): The wall-clock budget of the search, in seconds. Defaults to WALL_TIME.
+        max_rounds (Optional[int], optional): The maximum number of exchange rounds. Defaults to MAX_ROUNDS.
+        stagnation_rounds (Optional[int], optional): The number of rounds without improvement of the best energy
+            after which the search stops. Defaults to STAGNATION_ROUNDS.
+        ladder_tuner (Optional[LadderTuner], optional): The tuner of the temperature ladder. Defaults to None,
+            for a fixed ladder.
+        schedule (Optional[ExchangeSchedule], optional): The MC work of each replica between exchanges. Defaults to
+            None, for segments of `max_iteration` steps and exchanges after every segment.
+        checkpoint_path (Optional[str], optional): The file the checkpoints are written to. Defaults to None, for no checkpoints.
+        checkpoint_interval (float, optional): The minimum wall-clock time between two checkpoints, in seconds.
+            Defaults to CHECKPOINT_INTERVAL.
+        resume_from (Optional[SearchCheckpoint], optional): The checkpoint to continue the search from, written with
+            the same settings. Defaults to None, to start a new search. See `resume_REMC_search`.
+        observers (Optional[List[Observer]], optional): The callables the events of the search are passed to. Defaults
+            to None, for a `ConsoleObserver` printing the progress. An empty list runs the search quietly.
+        telemetry_interval (float, optional): The minimum wall-clock time between two snapshots of the counters, in
+            seconds. Defaults to TELEMETRY_INTERVAL.
 
     Returns:
-        Optional[lat.Lattice]: The lattice with the best energy, or None if no lattice meets the criteria.
+        SearchResult: The best conformation found, with its energy and the reason the search stopped.
     """
-    temperatures = temp_range(Tmin, Tmax, nb_replica)
-    energy_best = float('inf')
-    offset = 0
-    # Initialize the replicates
-    replicates: List[mc.mc_search] = []
-    for temperature in temperatures:
-        lattice = lat.Lattice(sequence=sequence)
-        mc_search = mc.mc_search(
+    criteria = StopCriteria(energy_optimal, wall_time, max_rounds, stagnation_rounds)
+    telemetry = Telemetry([ConsoleObserver()] if observers is None else observers)
+    energy_cache = EnergyCache()
+    ground_states = GroundStateRegistry()
+
+    def new_replica(temperature: float, conformation, stream: RandomStream) -> mc.mc_search:
+        # The compiled kernel only runs on a dense lattice, which long chains would not get by default
+        lattice = lat.make_lattice(sequence=sequence, conformation=conformation, sparse=False if backend == "compiled" else None, rng=stream)
+        return mc.mc_search(
             lattice=lattice,
             temperature=temperature,
             probability=probability,
             max_iteration=max_iteration,
-            target_energy=energy_optimal
+            target_energy=energy_optimal,
+            trajectory_mode=trajectory_mode,
+            rejection_free=rejection_free,
+            rng=stream,
+            backend=backend,
+            energy_cache=energy_cache
         )
-        replicates.append(mc_search)
-    # Run the replica exchange
-    while energy_best > energy_optimal:
-        for replica in range(nb_replica):
-            replicates[replica].run()
-            if replicates[replica].lattice.energy < energy_best:
-                energy_best = replicates[replica].lattice.energy
-            print("replica", replica, "energy", replicates[replica].lattice.energy)
-            print("energy best", energy_best, "target energy", energy_optimal)
-            
-        i = offset + 1
-        while i + 1 <= nb_replica:
-            j = i + 1
-            test = exchange_replicates(replicates[i-1], replicates[j-1])
-            if test:
-                print("exchange between", i-1, "and", j-1, "successful")
-            i += 2
-        offset = 1 - offset
-    # Return the conformation associated with the best energy
-    for i, replicate in enumerate(replicates):
-        if replicate.lattice.energy == energy_best:
-            print("energy best", energy_best, "is associated with lattice", i)
-            return replicate.lattice
+
+    def write_checkpoint() -> None:
+        states = pool.states() if pool is not None else [replicate.state() for replicate in replicates]
+        config = {
+            "sequence": sequence.sequence, "hp_sequence": sequence.hp_sequence, "Tmin": Tmin, "Tmax": Tmax,
+            "nb_replica": nb_replica, "energy_optimal": energy_optimal, "max_iteration": max_iteration,
+            "probability": probability, "trajectory_mode": trajectory_mode, "seed": seed, "rejection_free": rejection_free,
+            "backend": backend, "dimension": dimension, "wall_time": wall_time, "max_rounds": max_rounds, "stagnation_rounds": stagnation_rounds,
+            "ladder_tuner": ladder_tuner.state() if ladder_tuner is not None else None,
+            "schedule": schedule.state() if schedule is not None else None,
+        }
+        meta = {
+            "config": config,
+            "replicas": states,
+            "ladder": ladder.state(),
+            "root_seed": {"entropy": root_seed.entropy, "spawn_key": list(root_seed.spawn_key),
+                          "n_children_spawned": root_seed.n_children_spawned},
+            "segments": segments,
+            "elapsed": criteria.elapsed,
+            "energy_best": energy_best,
+            "best_round": criteria.best_round,
+            "ground_states": ground_states.state(),
+        }
+        arrays = {
+            "coordinates": np.stack([replicate.lattice.sequence.conformation.to_numpy() for replicate in replicates]),
+            "best": lattice_best.sequence.conformation.to_numpy() if lattice_best is not None else np.empty((0, dimension)),
+            "ground_states": np.stack([conformation.to_numpy() for conformation in ground_states.conformations])
+                             if ground_states.conformations else np.empty((0, sequence.length, dimension)),
+        }
+        size = save_checkpoint(checkpoint_path, SearchCheckpoint(meta, arrays))
+        telemetry.emit("checkpoint", round=ladder.rounds, path=checkpoint_path, bytes=size)
+
+    def counters() -> Dict[str, object]:
+        return {
+            "round": ladder.rounds,
+            "segments": segments,
+            "elapsed": criteria.elapsed,
+            "energy_best": energy_best,
+            "timings": dict(telemetry.timings),
+            "replicas": [replica_counters(replicate) for replicate in replicates],
+            "pairs": pair_counters(ladder),
+            "ladder": ladder.summary(),
+            "cache": energy_cache.stats(),
+            "ground_states": len(ground_states),
+        }
+
+    replicates: List[mc.mc_search] = []
+    if resume_from is None:
+        # One independent stream per replica, plus one for the initial conformations and the exchanges,
+        # spawned from a root that can spawn more streams if the ladder grows
+        # `temp_range` gives one more temperature than asked when the range is not a multiple of nb_replica,
+        # and every temperature of the ladder gets its replica
+        temperatures = temp_range(Tmin, Tmax, nb_replica)
+        root_seed = np.random.SeedSequence(seed)
+        streams = spawn_streams(root_seed, len(temperatures) + 1)
+        energy_best = float('inf')
+        lattice_best = None
+        ladder = ReplicaLadder(temperatures, rng=streams[-1])
+        # Initialize the replicates from independent random conformations, grown in one call
+        conformations = random_conformations(sequence, len(temperatures), streams[-1], dimension)
+        for temperature, conformation, stream in zip(temperatures, conformations, streams):
+            replicates.append(new_replica(temperature, conformation, stream))
+        segments = 0
+        elapsed = 0.0
+    else:
+        meta, arrays = resume_from
+        root = meta["root_seed"]
+        root_seed = np.random.SeedSequence(root["entropy"], spawn_key=tuple(root["spawn_key"]),
+                                           n_children_spawned=root["n_children_spawned"])
+        ladder = ReplicaLadder(meta["ladder"]["temperatures"], RandomStream(0))
+        ladder.restore(meta["ladder"])
+        for state, coordinates in zip(meta["replicas"], arrays["coordinates"]):
+            conformation = seq.Conformation.from_numpy(sequence.hp_sequence, coordinates)
+            replicate = new_replica(state["temperature"], conformation, RandomStream(0))
+            replicate.restore(state)
+            replicates.append(replicate)
+        energy_best = meta["energy_best"]
+        lattice_best = None
+        if len(arrays["best"]):
+            lattice_best = lat.make_lattice(sequence, seq.Conformation.from_numpy(sequence.hp_sequence, arrays["best"]), rng=RandomStream(0))
+            lattice_best.energy = energy_best
+        if "ground_states" in meta:
+            ground_states.restore(meta["ground_states"], [seq.Conformation.from_numpy(sequence.hp_sequence, coordinates)
+                                                          for coordinates in arrays["ground_states"]])
+        segments = meta["segments"]
+        elapsed = meta["elapsed"]
+    # Each replica carries its random stream into its worker
+    pool = ReplicaPool(replicates) if parallel else None
+    try:
+        with criteria.catch_signals():
+            criteria.start(elapsed)
+            if resume_from is not None:
+                criteria.best_energy = energy_best
+                criteria.best_round = resume_from.meta["best_round"]
+            telemetry.emit("start", sequence=sequence.hp_sequence, length=sequence.length, dimension=dimension, replicas=len(replicates),
+                           temperatures=ladder.temperatures, resumed=resume_from is not None, round=ladder.rounds,
+                           elapsed=elapsed, energy_best=energy_best if lattice_best is not None else None)
+            last_checkpoint = last_counters = time.perf_counter()
+            # Run the replica exchange
+            while True:
+                if schedule is not None:
+                    for k, replica in enumerate(ladder.replica_at):
+                        replicates[replica].max_iteration = schedule.steps(k, len(ladder.temperatures), sequence.length)
+                start = time.perf_counter()
+                if pool is not None:
+                    pool.run()
+                else:
+                    for replicate in replicates:
+                        replicate.run()
+                telemetry.timings["mc"] += time.perf_counter() - start
+                for replica, replicate in enumerate(replicates):
+                    key = canonical_key(replicate.lattice.sequence.conformation)
+                    energy_cache.visit(replicate.lattice, key)
+                    ground_states.offer(replicate.lattice, key)
+                    if replicate.lattice.energy < energy_best:
+                        # Keep a copy, as the replica may leave its best conformation in the next rounds
+                        energy_best = replicate.lattice.energy
+                        lattice_best = replicate.lattice.copy()
+                        telemetry.emit("improvement", round=ladder.rounds, replica=replica, energy=energy_best)
+                if telemetry.enabled:
+                    telemetry.emit("round", round=ladder.rounds, segments=segments + 1, elapsed=criteria.elapsed,
+                                   energies=[replicate.lattice.energy for replicate in replicates],
+                                   energy_best=energy_best, target_energy=energy_optimal)
+
+                start = time.perf_counter()
+                segments += 1
+                if schedule is None or schedule.exchange_due(segments):
+                    exchanged = ladder.exchange(replicates)
+                    for k, l in exchanged:
+                        if pool is not None:
+                            pool.set_temperature(ladder.replica_at[k], ladder.temperatures[k])
+                            pool.set_temperature(ladder.replica_at[l], ladder.temperatures[l])
+                    if exchanged:
+                        telemetry.emit("exchange", round=ladder.rounds, pairs=exchanged)
+
+                    if ladder_tuner is not None and ladder_tuner.due(ladder):
+                        statistics = ladder.summary()
+                        new_temperatures = ladder_tuner.propose(ladder)
+                        if len(new_temperatures) == len(replicates):
+                            ladder.retune(new_temperatures)
+                        else:
+                            # Spread the replicas kept evenly along the ladder, copying them where it grows
+                            if pool is not None:
+                                pool.close()
+                            in_order = [replicates[replica] for replica in ladder.replica_at]
+                            nb_new = len(new_temperatures)
+                            sources = [round(j * (len(in_order) - 1) / (nb_new - 1)) for j in range(nb_new)]
+                            replicates = []
+                            for j, source in enumerate(sources):
+                                if j > 0 and source == sources[j - 1]:
+                                    stream = spawn_streams(root_seed, 1)[0]
+                                    replicates.append(new_replica(new_temperatures[j], in_order[source].lattice.sequence.conformation, stream))
+                                else:
+                                    replicates.append(in_order[source])
+                            ladder.retune(new_temperatures, list(range(nb_new)))
+                            pool = ReplicaPool(replicates) if parallel else None
+                        for k, replica in enumerate(ladder.replica_at):
+                            replicates[replica].temperature = ladder.temperatures[k]
+                            if pool is not None:
+                                pool.set_temperature(replica, ladder.temperatures[k])
+                        telemetry.emit("retune", round=ladder.rounds, statistics=statistics, temperatures=ladder.temperatures,
+                                       cycles_done=ladder_tuner.cycles_done, cycles=ladder_tuner.cycles, frozen=ladder_tuner.frozen)
+                telemetry.timings["exchange"] += time.perf_counter() - start
+
+                reason = criteria.check(energy_best, ladder.rounds)
+                now = time.perf_counter()
+                if checkpoint_path is not None and (reason is not None or now - last_checkpoint >= checkpoint_interval):
+                    write_checkpoint()
+                    last_checkpoint = time.perf_counter()
+                    telemetry.timings["checkpoint"] += last_checkpoint - now
+                if reason is None and telemetry.enabled and now - last_counters >= telemetry_interval:
+                    telemetry.emit("counters", **counters())
+                    last_counters = now
+                if reason is not None:
+                    break
+    finally:
+        if pool is not None:
+            pool.close()
+    if telemetry.enabled:
+        telemetry.emit("stop", reason=reason, **counters())
+    return SearchResult(lattice_best, energy_best, reason, ladder.rounds, criteria.elapsed, [replicate.time for replicate in replicates],
+                        dict(telemetry.timings), tuple(ground_states.conformations), len(ground_states))
+
+def resume_REMC_search(path: str, parallel: bool = False, checkpoint_path: Optional[str] = None,
+                       checkpoint_interval: float = CHECKPOINT_INTERVAL, observers: Optional[List[Observer]] = None,
+                       telemetry_interval: float = TELEMETRY_INTERVAL, **stop_conditions) -> SearchResult:
+    """
+    Continue a REMC search from a checkpoint written by `REMC_search`, with the settings it was started with.
+
+    The search goes on exactly as it would have without stopping: the replicas, ladder, tuner and random
+    streams are restored, and the wall-clock time already spent counts towards the budget. Only the stop
+    conditions can be changed, e.g. to extend a budget that was spent.
+
+    Args:
+        path (str): The path of the checkpoint.
+        parallel (bool, optional): Whether to run each replica in its own worker process, which does not change
+            the search. Defaults to False.
+        checkpoint_path (Optional[str], optional): The file further checkpoints are written to. Defaults to None,
+            for the checkpoint resumed from.
+        checkpoint_interval (float, optional): The minimum wall-clock time between two checkpoints, in seconds.
+            Defaults to CHECKPOINT_INTERVAL.
+        observers (Optional[List[Observer]], optional): The callables the events of the search are passed to, see
+            `REMC_search`. Defaults to None, for a `ConsoleObserver`.
+        telemetry_interval (float, optional): The minimum wall-clock time between two snapshots of the counters, in
+            seconds. Defaults to TELEMETRY_INTERVAL.
+        **stop_conditions: New values of `energy_optimal`, `wall_time`, `max_rounds` or `stagnation_rounds`.
+
+    Returns:
+        SearchResult: The best conformation found since the search started, with its energy and the reason the search stopped.
+
+    Raises:
+        ValueError: If another setting than a stop condition is given, or the checkpoint has another layout.
+    """
+    unknown = set(stop_conditions) - {"energy_optimal", "wall_time", "max_rounds", "stagnation_rounds"}
+    if unknown:
+        raise ValueError(f"Only the stop conditions can change when resuming a search, got {sorted(unknown)}")
+    checkpoint = load_checkpoint(path)
+    config = dict(checkpoint.meta["config"], **stop_conditions)
+    aa_sequence, hp_sequence = config.pop("sequence"), config.pop("hp_sequence")
+    if aa_sequence == hp_sequence:
+        sequence = seq.Sequence(hp_sequence=hp_sequence)
+    else:
+        sequence = seq.Sequence(sequence=aa_sequence)
+    if config["ladder_tuner"] is not None:
+        config["ladder_tuner"] = LadderTuner.from_state(config["ladder_tuner"])
+    if config["schedule"] is not None:
+        config["schedule"] = ExchangeSchedule(**config["schedule"])
+    return REMC_search(sequence, parallel=parallel, checkpoint_path=checkpoint_path if checkpoint_path is not None else path,
+                       checkpoint_interval=checkpoint_interval, resume_from=checkpoint, observers=observers,
+                       telemetry_interval=telemetry_interval, **config)
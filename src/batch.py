@@ -0,0 +1,404 @@
+"""
+Batch folding of many sequences read from a file: each sequence is searched by an independent REMC job
+in its own worker process, and one JSON line is written per sequence as soon as its job ends.
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import signal
+import sys
+import time
+import multiprocessing as mp
+from multiprocessing.connection import wait
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional
+import numpy as np
+import sequence as seq
+from REMC_search import REMC_search
+from stopping import StopCriteria
+from variables import (T_MIN, T_MAX, STEP, MAX_ITERATIONS, PROBABILITY, MC_BACKEND, DIMENSION, WALL_TIME, MAX_ROUNDS,
+                       STAGNATION_ROUNDS, BATCH_TIMEOUT_MARGIN, BATCH_KILL_GRACE)
+
+BATCH_FORMATS = ("fasta", "csv", "text")
+ALPHABETS = ("auto", "hp", "aa")
+# The status of a job: its search ended, it was stopped at its timeout, or it failed
+JOB_STATUSES = ("ok", "timeout", "error")
+FASTA_EXTENSIONS = (".fasta", ".fa", ".faa", ".fas")
+
+
+class BatchJob(NamedTuple):
+    """
+    One sequence to fold: its position in the input file, its name, the sequence as read, and the target
+    energy of its search, None for the target of the batch.
+    """
+    index: int
+    name: str
+    sequence: str
+    optimal_energy: Optional[float] = None
+
+
+def detect_format(path: str) -> str:
+    """
+    Guess the format of a sequence file from its extension.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        str: "fasta" for .fasta, .fa, .faa and .fas files, "csv" for .csv files, "text" otherwise.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in FASTA_EXTENSIONS:
+        return "fasta"
+    return "csv" if extension == ".csv" else "text"
+
+
+def read_sequences(path: str, file_format: Optional[str] = None) -> Iterator[BatchJob]:
+    """
+    Read the sequences of a file lazily, so that a batch starts before a large file is read through.
+
+    - "fasta": records starting with a `>name` line, the sequence possibly spanning several lines.
+    - "csv": a header with a `sequence` column, and optionally `id` (or `name`) and `optimal_energy` columns.
+    - "text": one sequence per line, blank lines and lines starting with `#` being skipped.
+
+    Args:
+        path (str): The path of the file.
+        file_format (Optional[str], optional): One of BATCH_FORMATS. Defaults to None, to guess it from the extension.
+
+    Returns:
+        Iterator[BatchJob]: The jobs, in the order of the file.
+
+    Raises:
+        ValueError: If the format is unknown, or a CSV file has no `sequence` column.
+    """
+    file_format = detect_format(path) if file_format is None else file_format
+    if file_format not in BATCH_FORMATS:
+        raise ValueError(f"Unknown sequence file format: {file_format}, expected one of {BATCH_FORMATS}")
+    with open(path, newline="") as file:
+        if file_format == "fasta":
+            yield from _read_fasta(file)
+        elif file_format == "csv":
+            yield from _read_csv(file)
+        else:
+            index = 0
+            for line in file:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    yield BatchJob(index, str(index + 1), line.upper())
+                    index += 1
+
+
+def _read_fasta(file) -> Iterator[BatchJob]:
+    """
+    Read the records of a FASTA file, named after the first word of their header line.
+
+    Args:
+        file: The open file.
+
+    Returns:
+        Iterator[BatchJob]: The jobs, in the order of the file.
+    """
+    index, name, lines = 0, None, []
+    for line in file:
+        line = line.strip()
+        if line.startswith(">"):
+            if name is not None:
+                yield BatchJob(index, name, "".join(lines).upper())
+                index += 1
+            words = line[1:].split()
+            name, lines = words[0] if words else str(index + 1), []
+        elif line and not line.startswith(";") and name is not None:
+            lines.append(line)
+    if name is not None:
+        yield BatchJob(index, name, "".join(lines).upper())
+
+
+def _read_csv(file) -> Iterator[BatchJob]:
+    """
+    Read the rows of a CSV file with a header.
+
+    Args:
+        file: The open file.
+
+    Returns:
+        Iterator[BatchJob]: The jobs, in the order of the file.
+
+    Raises:
+        ValueError: If there is no `sequence` column.
+    """
+    reader = csv.DictReader(file)
+    if reader.fieldnames is None or "sequence" not in reader.fieldnames:
+        raise ValueError("A CSV sequence file needs a header with a 'sequence' column")
+    for index, row in enumerate(reader):
+        name = row.get("id") or row.get("name") or str(index + 1)
+        optimal_energy = row.get("optimal_energy")
+        yield BatchJob(index, name, row["sequence"].strip().upper(), float(optimal_energy) if optimal_energy else None)
+
+
+def make_sequence(sequence: str, alphabet: str = "auto") -> seq.Sequence:
+    """
+    Build the sequence object of a sequence read from a file.
+
+    Args:
+        sequence (str): The sequence, in capital letters.
+        alphabet (str, optional): "hp" for an HP sequence, "aa" for an amino acid sequence, or "auto" to read
+            sequences made of H and P only as HP sequences. Defaults to "auto".
+
+    Returns:
+        seq.Sequence: The sequence object.
+
+    Raises:
+        ValueError: If the sequence is empty or has a letter outside its alphabet.
+    """
+    if not sequence:
+        raise ValueError("Empty sequence")
+    if alphabet == "hp" or (alphabet == "auto" and set(sequence) <= {"H", "P"}):
+        if not set(sequence) <= {"H", "P"}:
+            raise ValueError(f"Invalid HP sequence: {sequence}")
+        return seq.Sequence(hp_sequence=sequence)
+    return seq.Sequence(sequence=sequence)
+
+
+def job_seed(seed: Optional[int], index: int) -> Optional[int]:
+    """
+    Derive the seed of a job from the seed of the batch, independently of the order the jobs run in.
+
+    Args:
+        seed (Optional[int]): The seed of the batch, None for unseeded jobs.
+        index (int): The index of the job.
+
+    Returns:
+        Optional[int]: The seed of the job.
+    """
+    if seed is None:
+        return None
+    return int(np.random.SeedSequence(seed, spawn_key=(index,)).generate_state(1, np.uint64)[0])
+
+
+def job_record(job: BatchJob, status: str, **fields) -> Dict[str, object]:
+    """
+    Build the result line of a job.
+
+    Args:
+        job (BatchJob): The job.
+        status (str): One of JOB_STATUSES.
+        **fields: The other fields of the line.
+
+    Returns:
+        Dict[str, object]: The line, starting with the index and name of the job, the sequence and the status.
+    """
+    return dict({"index": job.index, "id": job.name, "sequence": job.sequence, "status": status}, **fields)
+
+
+def fold_job(job: BatchJob, search_options: Dict[str, object], alphabet: str = "auto", seed: Optional[int] = None) -> Dict[str, object]:
+    """
+    Fold one sequence with a quiet REMC search.
+
+    Args:
+        job (BatchJob): The job.
+        search_options (Dict[str, object]): The keyword arguments of `REMC_search`, but the sequence and seed.
+        alphabet (str, optional): The alphabet of the sequence, see `make_sequence`. Defaults to "auto".
+        seed (Optional[int], optional): The seed of the search. Defaults to None.
+
+    Returns:
+        Dict[str, object]: The result line of the job, with the HP sequence, the best energy and its conformation
+        as (x, y) or (x, y, z) coordinates from the first residue, the number of distinct conformations of that
+        energy found, the MC steps of all replicas, the exchange rounds, the reason
+        the search stopped, the time spent in each phase of the search and the wall-clock time of the job, in seconds.
+    """
+    start = time.perf_counter()
+    sequence = make_sequence(job.sequence, alphabet)
+    options = dict(search_options)
+    if job.optimal_energy is not None:
+        options["energy_optimal"] = job.optimal_energy
+    result = REMC_search(sequence, seed=seed, observers=[], **options)
+    conformation = None
+    if result.lattice is not None:
+        coordinates = result.lattice.sequence.conformation.to_numpy()
+        conformation = (coordinates - coordinates[0]).tolist()
+    return job_record(
+        job, "ok",
+        hp_sequence=sequence.hp_sequence,
+        energy=int(result.energy) if result.lattice is not None else None,
+        conformation=conformation,
+        ground_states=result.distinct_ground_states,
+        steps=int(sum(result.replica_steps)),
+        rounds=result.rounds,
+        reason=result.reason,
+        timings={phase: round(seconds, 3) for phase, seconds in result.timings.items()},
+        seconds=round(time.perf_counter() - start, 3),
+        seed=seed,
+    )
+
+
+def _batch_worker(conn, job: BatchJob, search_options: Dict[str, object], alphabet: str, seed: Optional[int]) -> None:
+    """
+    Run one job and send its result line back to `run_batch`.
+
+    The worker leaves the process group of the batch, so that a Ctrl-C in the terminal only reaches the batch,
+    which stops the jobs itself. SIGTERM stops the search after its current round, see `StopCriteria`. Any
+    exception of the job is turned into an "error" line.
+
+    Args:
+        conn: The worker end of the pipe connected to the batch.
+        job (BatchJob): The job.
+        search_options (Dict[str, object]): The keyword arguments of `REMC_search`.
+        alphabet (str): The alphabet of the sequence.
+        seed (Optional[int]): The seed of the search.
+    """
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    start = time.perf_counter()
+    try:
+        record = fold_job(job, search_options, alphabet, seed)
+    except Exception as error:
+        record = job_record(job, "error", error=f"{type(error).__name__}: {error}", seconds=round(time.perf_counter() - start, 3))
+    conn.send(record)
+    conn.close()
+
+
+class _RunningJob:
+    """
+    A job running in a worker process, with its deadline and the time it was asked to stop, if it was.
+    """
+
+    def __init__(self, job: BatchJob, process: mp.Process, deadline: Optional[float]) -> None:
+        self.job = job
+        self.process = process
+        self.deadline = deadline
+        self.stopped_at: Optional[float] = None
+        self.timed_out = False
+
+
+def run_batch(jobs: Iterable[BatchJob], search_options: Dict[str, object], workers: int = 1, alphabet: str = "auto",
+              seed: Optional[int] = None, job_timeout: Optional[float] = None,
+              kill_grace: float = BATCH_KILL_GRACE) -> Iterator[Dict[str, object]]:
+    """
+    Fold sequences concurrently, each in its own worker process, and yield their result lines as the jobs end.
+
+    Jobs are isolated from each other: a job that raises, crashes or exceeds its budget yields an "error" or
+    "timeout" line and the batch goes on. A job still running `job_timeout` seconds after it started receives
+    SIGTERM, so that its search stops after the current round and still returns its best conformation, with
+    the "timeout" status. A job that does not return within `kill_grace` seconds after SIGTERM is killed.
+
+    A SIGINT or SIGTERM received by the batch stops the running jobs the same way, without starting new ones.
+    A second signal aborts the batch.
+
+    Args:
+        jobs (Iterable[BatchJob]): The jobs, e.g. from `read_sequences`.
+        search_options (Dict[str, object]): The keyword arguments of `REMC_search`, but the sequence and seed.
+        workers (int, optional): The number of jobs run at once. Defaults to 1.
+        alphabet (str, optional): The alphabet of the sequences, see `make_sequence`. Defaults to "auto".
+        seed (Optional[int], optional): The seed of the batch, from which each job gets its own seed. Defaults to None.
+        job_timeout (Optional[float], optional): The wall-clock time after which a job is stopped, in seconds.
+            Defaults to None, for no limit besides the stop conditions of the searches.
+        kill_grace (float, optional): The time a stopped job has to return, in seconds. Defaults to BATCH_KILL_GRACE.
+
+    Returns:
+        Iterator[Dict[str, object]]: The result line of each job, in the order the jobs end.
+    """
+    pending = iter(jobs)
+    running: Dict[object, _RunningJob] = {}
+    criteria = StopCriteria()
+    with criteria.catch_signals():
+        while True:
+            # Start jobs until every worker is busy
+            while criteria.interrupted is None and len(running) < workers:
+                job = next(pending, None)
+                if job is None:
+                    break
+                parent_conn, child_conn = mp.Pipe(duplex=False)
+                process = mp.Process(target=_batch_worker, args=(child_conn, job, search_options, alphabet, job_seed(seed, job.index)),
+                                     daemon=True)
+                process.start()
+                child_conn.close()
+                running[parent_conn] = _RunningJob(job, process, time.perf_counter() + job_timeout if job_timeout is not None else None)
+            if not running:
+                break
+
+            # Wait for a job to end, waking up at the next deadline and at least every second to notice signals
+            now = time.perf_counter()
+            deadlines = [entry.deadline if entry.stopped_at is None else entry.stopped_at + kill_grace
+                         for entry in running.values() if entry.deadline is not None or entry.stopped_at is not None]
+            ready = wait(list(running), timeout=max(0.0, min([1.0] + [deadline - now for deadline in deadlines])))
+            for conn in ready:
+                entry = running.pop(conn)
+                try:
+                    record = conn.recv()
+                except EOFError:  # the worker died without sending its result
+                    record = None
+                conn.close()
+                entry.process.join()
+                if record is None:
+                    record = job_record(entry.job, "timeout" if entry.timed_out else "error",
+                                        error=f"worker exited with code {entry.process.exitcode}")
+                elif entry.timed_out:
+                    record["status"] = "timeout"
+                yield record
+
+            # Stop the jobs past their deadline, or all of them once interrupted, and kill those that do not return
+            now = time.perf_counter()
+            for conn, entry in list(running.items()):
+                if entry.stopped_at is None:
+                    timed_out = entry.deadline is not None and now >= entry.deadline
+                    if timed_out or criteria.interrupted is not None:
+                        entry.process.terminate()
+                        entry.stopped_at = now
+                        entry.timed_out = timed_out
+                elif now >= entry.stopped_at + kill_grace:
+                    entry.process.kill()
+                    entry.process.join()
+                    conn.close()
+                    del running[conn]
+                    yield job_record(entry.job, "timeout" if entry.timed_out else "error",
+                                     error=f"killed {kill_grace} s after being stopped")
+
+
+if __name__ == "__main__":
+
+    # Parse the arguments
+    parser = argparse.ArgumentParser(description='Batch REMC search, one JSON line per sequence')
+    parser.add_argument('path', type = str, help = 'File of sequences: FASTA, CSV with a sequence column, or one sequence per line')
+    parser.add_argument('--format', choices = BATCH_FORMATS, help = 'Format of the file (default: guessed from its extension)')
+    parser.add_argument('--alphabet', choices = ALPHABETS, default = 'auto', help = 'Read the sequences as HP or amino acid sequences (auto: HP if made of H and P only)')
+    parser.add_argument('--output', type = str, help = 'JSONL file to write the results to (default: standard output)')
+    parser.add_argument('--workers', type = int, default = os.cpu_count(), help = 'Number of sequences folded at once')
+    parser.add_argument('--optimal_energy', type = int, help = 'Target Energy of every sequence, unless given in the CSV file')
+    parser.add_argument('--wall_time', type = float, default = WALL_TIME, help = 'Wall-clock budget of each search, in seconds')
+    parser.add_argument('--max_rounds', type = int, default = MAX_ROUNDS, help = 'Maximum number of exchange rounds of each search')
+    parser.add_argument('--stagnation', type = int, default = STAGNATION_ROUNDS, help = 'Stop each search after this many rounds without improvement')
+    parser.add_argument('--job_timeout', type = float, help = 'Stop a job after this many seconds (default: the wall-clock budget plus BATCH_TIMEOUT_MARGIN)')
+    parser.add_argument('--rejection_free', action = 'store_true', help = 'Draw among the legal moves weighted by their acceptance probability')
+    parser.add_argument('--backend', choices = ['python', 'compiled'], default = MC_BACKEND, help = 'Run the MC steps in Python or in the Numba-compiled kernel')
+    parser.add_argument('--dimension', type = int, choices = [2, 3], default = DIMENSION, help = 'Fold the sequences on the square (2) or the cubic (3) lattice')
+    parser.add_argument('--seed', type = int, help = 'Seed of the batch, each sequence getting its own seed from it')
+
+    args = parser.parse_args()
+    if args.wall_time is None and args.max_rounds is None and args.stagnation is None and args.job_timeout is None:
+        parser.error('a budget is required for each job: --wall_time, --max_rounds, --stagnation or --job_timeout')
+    if args.dimension != 2 and (args.rejection_free or args.backend == 'compiled'):
+        parser.error('--rejection_free and --backend compiled only run on the square lattice (--dimension 2)')
+    job_timeout = args.job_timeout
+    if job_timeout is None and args.wall_time is not None:
+        job_timeout = args.wall_time + BATCH_TIMEOUT_MARGIN
+
+    search_options = {
+        "Tmin": T_MIN, "Tmax": T_MAX, "nb_replica": STEP, "energy_optimal": args.optimal_energy,
+        "max_iteration": MAX_ITERATIONS, "probability": PROBABILITY, "trajectory_mode": "off",
+        "rejection_free": args.rejection_free, "backend": args.backend, "dimension": args.dimension,
+        "wall_time": args.wall_time, "max_rounds": args.max_rounds, "stagnation_rounds": args.stagnation,
+    }
+    counts = {status: 0 for status in JOB_STATUSES}
+    start = time.perf_counter()
+    with (open(args.output, "w") if args.output else contextlib.nullcontext(sys.stdout)) as output:
+        for record in run_batch(read_sequences(args.path, args.format), search_options, max(1, args.workers), args.alphabet,
+                                args.seed, job_timeout):
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            counts[record["status"]] += 1
+            print("job", record["index"], record["id"], record["status"], record.get("energy", record.get("error")), file=sys.stderr)
+    print("batch of", sum(counts.values()), "jobs done in", round(time.perf_counter() - start, 3), "s:", counts, file=sys.stderr)
@@ -0,0 +1,343 @@
+"""
+Micro- and macro-benchmarks of the search on the reference sequences, and startup times, written to a JSON file
+so that builds can be compared and regressions caught.
+
+Example:
+    python src/benchmark.py --output bench.json
+    python src/benchmark.py --output new.json --compare bench.json --tolerance 0.2
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List
+import numpy as np
+import sequence as seq
+import lattice as lat
+import MC_search as mc
+import mc_kernel
+import REMC_search as remc
+import energy
+from random_streams import RandomStream
+from moves.move_utils import find_empty_neighbors, translate_chain
+from variables import SI_1, SI_2, SI_3, SI_4, SI3D_1, seq_ex1, T_MIN, T_MAX, PROBABILITY, STARTUP_TARGET
+
+# Reference sequences, as (sequence, is an HP sequence, target energy of the REMC macrobenchmark, dimension)
+REFERENCE_SEQUENCES = {
+    "SI_1": (SI_1, True, -9, 2),
+    "SI_2": (SI_2, True, -9, 2),
+    "SI_3": (SI_3, True, -8, 2),
+    "SI_4": (SI_4, True, -12, 2),
+    "seq_ex1": (seq_ex1, False, -8, 2),
+    "SI3D_1": (SI3D_1, True, -24, 3),
+}
+# Commands timed from a cold interpreter by the startup benchmark. A worker process started with the "spawn"
+# method imports the module of the parent script again, so importing main and batch is the startup of a worker.
+STARTUP_COMMANDS = {
+    "main.py --help": ["main.py", "--help"],
+    "import main": ["-c", "import main"],
+    "import batch": ["-c", "import batch"],
+}
+# Modules that must stay out of the search and its workers
+PLOTTING_MODULES = ("matplotlib", "networkx")
+
+
+def build_sequence(name: str) -> seq.Sequence:
+    """
+    Build one of the reference sequences.
+
+    Args:
+        name (str): The name of the reference sequence.
+
+    Returns:
+        seq.Sequence: The sequence.
+    """
+    sequence, is_hp, _, _ = REFERENCE_SEQUENCES[name]
+    return seq.Sequence(hp_sequence=sequence) if is_hp else seq.Sequence(sequence=sequence)
+
+
+def time_calls(function: Callable[[int], object], calls: int, repeat: int = 5) -> float:
+    """
+    Time repeated calls of a function, keeping the best of several rounds to limit the noise.
+
+    Args:
+        function (Callable[[int], object]): The function to time, called with the index of the call.
+        calls (int): The number of calls per round.
+        repeat (int, optional): The number of rounds. Defaults to 5.
+
+    Returns:
+        float: The mean time per call of the fastest round, in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for call in range(calls):
+            function(call)
+        best = min(best, time.perf_counter() - start)
+    return best / calls
+
+
+def micro_benchmarks(name: str, calls: int, seed: int) -> List[Dict[str, object]]:
+    """
+    Time the elementary operations of the search on one reference sequence.
+
+    Moves are attempted on random residues drawn beforehand and reverted right after, so that
+    every call starts from the same conformation. Their timings include the revert. The neighbour search and
+    translation helpers of the square lattice are not timed on the cubic lattice.
+
+    Args:
+        name (str): The name of the reference sequence.
+        calls (int): The number of calls per operation.
+        seed (int): The seed of the conformation and of the drawn residues.
+
+    Returns:
+        List[Dict[str, object]]: One record per operation.
+    """
+    rng = RandomStream(seed)
+    sequence = build_sequence(name)
+    dimension = REFERENCE_SEQUENCES[name][3]
+    length = sequence.length
+    lattice = lat.make_lattice(sequence, rng=rng, dimension=dimension)
+    lattice.energy = lattice.calculate_energy()
+    inner = [rng.randint(2, length - 1) for _ in range(calls)]
+    ends = [rng.choice((1, length)) for _ in range(calls)]
+    conformation = lattice.sequence.conformation
+
+    def attempt(move: Callable[[int], object], residues: List[int]) -> Callable[[int], None]:
+        def call(i: int) -> None:
+            move(residues[i])
+            lattice.revert()
+        return call
+
+    replicate1 = mc.mc_search(lat.make_lattice(sequence, rng=rng, dimension=dimension), T_MIN, PROBABILITY, 0)
+    replicate2 = mc.mc_search(lat.make_lattice(sequence, rng=rng, dimension=dimension), T_MAX, PROBABILITY, 0)
+
+    operations = {
+        "end_move": attempt(lattice.end_move, ends),
+        "corner_move": attempt(lattice.corner_move, inner),
+        "cks_move": attempt(lattice.cks_move, inner),
+        "pull_move": attempt(lattice.pull_move, inner),
+        "calculate_energy": lambda i: lattice.calculate_energy(),
+        "lattice_energy": lambda i: energy.lattice_energy(lattice),
+        "find_empty_neighbors": lambda i: find_empty_neighbors(lattice, conformation.x[inner[i] - 1], conformation.y[inner[i] - 1]),
+        "translate_chain": lambda i: translate_chain(lattice, 1 - 2 * (i % 2), 0),
+        "exchange_replicates": lambda i: remc.exchange_replicates(replicate1, replicate2, rng),
+    }
+    if dimension != 2:
+        del operations["find_empty_neighbors"], operations["translate_chain"]
+    return [
+        {"benchmark": operation, "sequence": name, "calls": calls, "seconds_per_call": time_calls(function, calls)}
+        for operation, function in operations.items()
+    ]
+
+
+def mc_benchmark(name: str, iterations: int, seed: int, backend: str = "python") -> Dict[str, object]:
+    """
+    Measure the throughput of `mc_search.run` on one reference sequence.
+
+    Args:
+        name (str): The name of the reference sequence.
+        iterations (int): The number of MC steps to run.
+        seed (int): The seed of the run.
+        backend (str, optional): The backend of the search. Defaults to "python". The compiled kernel
+            is run once beforehand, so that its compilation is not timed.
+
+    Returns:
+        Dict[str, object]: The record of the run, with its iterations per second.
+    """
+    search = mc.mc_search(lat.make_lattice(build_sequence(name), rng=RandomStream(seed), dimension=REFERENCE_SEQUENCES[name][3]),
+                          T_MIN, PROBABILITY, iterations, backend=backend)
+    if backend == "compiled":
+        mc.mc_search(search.lattice.copy(), T_MIN, PROBABILITY, 10, backend=backend).run()
+    start = time.perf_counter()
+    search.run()
+    seconds = time.perf_counter() - start
+    benchmark = "mc_search.run" if backend == "python" else f"mc_search.run[{backend}]"
+    return {"benchmark": benchmark, "sequence": name, "iterations": search.step,
+            "seconds": seconds, "iterations_per_second": search.step / seconds, "energy": search.lattice.energy}
+
+
+def remc_benchmark(name: str, nb_replica: int, max_iteration: int, seed: int) -> Dict[str, object]:
+    """
+    Measure the wall time of `REMC_search` to reach the target energy of one reference sequence.
+
+    Args:
+        name (str): The name of the reference sequence.
+        nb_replica (int): The number of replicas.
+        max_iteration (int): The number of MC steps between exchanges.
+        seed (int): The seed of the run.
+
+    Returns:
+        Dict[str, object]: The record of the run, with its wall time.
+    """
+    _, _, target, dimension = REFERENCE_SEQUENCES[name]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = remc.REMC_search(build_sequence(name), T_MIN, T_MAX, nb_replica, energy_optimal=target,
+                                  max_iteration=max_iteration, probability=PROBABILITY, seed=seed,
+                                  dimension=dimension)
+    return {"benchmark": "REMC_search", "sequence": name, "target_energy": target,
+            "seconds": time.perf_counter() - start, "energy": result.energy}
+
+
+def startup_benchmark(repeat: int = 5) -> List[Dict[str, object]]:
+    """
+    Measure the cold-start time of the command line and of the worker processes, and check that they do not
+    import the plotting libraries.
+
+    Args:
+        repeat (int, optional): The number of runs of each command, the fastest one being kept. Defaults to 5.
+
+    Returns:
+        List[Dict[str, object]]: One record per command of STARTUP_COMMANDS, with its time, the target time
+        and the plotting modules it loaded.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    check = "; import sys; print(' '.join(name for name in {!r} if name in sys.modules))".format(PLOTTING_MODULES)
+    records = []
+    for name, arguments in STARTUP_COMMANDS.items():
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + arguments, cwd=directory, capture_output=True, check=True)
+            best = min(best, time.perf_counter() - start)
+        loaded = []
+        if arguments[0] == "-c":
+            loaded = subprocess.run([sys.executable, "-c", arguments[1] + check], cwd=directory, capture_output=True,
+                                    text=True, check=True).stdout.split()
+        records.append({"benchmark": f"startup[{name}]", "sequence": None, "seconds": best, "target": STARTUP_TARGET,
+                        "plotting_modules": loaded})
+    return records
+
+
+def startup_issues(results: List[Dict[str, object]]) -> List[str]:
+    """
+    Find the startup records over their target time or loading plotting modules.
+
+    Args:
+        results (List[Dict[str, object]]): The records.
+
+    Returns:
+        List[str]: One message per issue.
+    """
+    issues = []
+    for record in results:
+        if "target" in record and record["seconds"] > record["target"]:
+            issues.append(f"{record['benchmark']}: {record['seconds']:.3g} s over the {record['target']} s target")
+        if record.get("plotting_modules"):
+            issues.append(f"{record['benchmark']}: imports {', '.join(record['plotting_modules'])}")
+    return issues
+
+
+def metadata() -> Dict[str, object]:
+    """
+    Describe the build and the machine the benchmarks run on.
+
+    Returns:
+        Dict[str, object]: The git commit, Python and NumPy versions, platform and date.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "date": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def compare(results: List[Dict[str, object]], baseline: List[Dict[str, object]], tolerance: float) -> List[str]:
+    """
+    Find the benchmarks that got slower than a baseline by more than a tolerance.
+
+    Args:
+        results (List[Dict[str, object]]): The current records.
+        baseline (List[Dict[str, object]]): The baseline records.
+        tolerance (float): The accepted relative slowdown, e.g. 0.2 for 20%.
+
+    Returns:
+        List[str]: One message per regression.
+    """
+    reference = {(record["benchmark"], record["sequence"]): record for record in baseline}
+    regressions = []
+    for record in results:
+        previous = reference.get((record["benchmark"], record["sequence"]))
+        if previous is None:
+            continue
+        for metric, higher_is_better in (("seconds_per_call", False), ("seconds", False), ("iterations_per_second", True)):
+            if metric not in record or metric not in previous:
+                continue
+            if metric == "seconds" and "iterations_per_second" in record:
+                continue  # the throughput is compared instead
+            ratio = record[metric] / previous[metric] if not higher_is_better else previous[metric] / record[metric]
+            if ratio > 1 + tolerance:
+                regressions.append(f"{record['benchmark']} on {record['sequence']}: {metric} "
+                                   f"{previous[metric]:.3g} -> {record[metric]:.3g} ({ratio - 1:+.0%} slower)")
+    return regressions
+
+
+def run_benchmarks(sequences: List[str], calls: int, iterations: int, nb_replica: int, max_iteration: int,
+                   seed: int, remc_runs: bool = True, startup: bool = True) -> Dict[str, object]:
+    """
+    Run all benchmarks on the given reference sequences.
+
+    Args:
+        sequences (List[str]): The names of the reference sequences.
+        calls (int): The number of calls per microbenchmark.
+        iterations (int): The number of MC steps of the `mc_search.run` benchmark.
+        nb_replica (int): The number of replicas of the `REMC_search` benchmark.
+        max_iteration (int): The number of MC steps between exchanges of the `REMC_search` benchmark.
+        seed (int): The seed of every benchmark.
+        remc_runs (bool, optional): Whether to run the `REMC_search` benchmark. Defaults to True.
+        startup (bool, optional): Whether to run the startup benchmark. Defaults to True.
+
+    Returns:
+        Dict[str, object]: The metadata and the list of records.
+    """
+    results = startup_benchmark() if startup else []
+    for name in sequences:
+        results += micro_benchmarks(name, calls, seed)
+        results.append(mc_benchmark(name, iterations, seed))
+        if mc_kernel.NUMBA_AVAILABLE and REFERENCE_SEQUENCES[name][3] == 2:
+            results.append(mc_benchmark(name, iterations, seed, backend="compiled"))
+        if remc_runs:
+            results.append(remc_benchmark(name, nb_replica, max_iteration, seed))
+    return {"metadata": metadata(), "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmarks of the REMC search')
+    parser.add_argument('--output', type = str, default = 'benchmark.json', help = 'JSON file to write the results to')
+    parser.add_argument('--compare', type = str, help = 'JSON file of a previous run to compare with')
+    parser.add_argument('--tolerance', type = float, default = 0.2, help = 'Accepted relative slowdown when comparing')
+    parser.add_argument('--sequences', nargs = '+', default = list(REFERENCE_SEQUENCES), choices = list(REFERENCE_SEQUENCES), help = 'Reference sequences to benchmark')
+    parser.add_argument('--calls', type = int, default = 2000, help = 'Calls per microbenchmark')
+    parser.add_argument('--iterations', type = int, default = 20000, help = 'MC steps of the mc_search.run benchmark')
+    parser.add_argument('--nb_replica', type = int, default = 6, help = 'Replicas of the REMC_search benchmark')
+    parser.add_argument('--max_iteration', type = int, default = 2000, help = 'MC steps between exchanges of the REMC_search benchmark')
+    parser.add_argument('--seed', type = int, default = 0, help = 'Seed of every benchmark')
+    parser.add_argument('--no_remc', action = 'store_true', help = 'Skip the REMC_search benchmark')
+    parser.add_argument('--no_startup', action = 'store_true', help = 'Skip the startup benchmark')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.sequences, args.calls, args.iterations, args.nb_replica, args.max_iteration,
+                            args.seed, remc_runs = not args.no_remc, startup = not args.no_startup)
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent = 2)
+    for record in report["results"]:
+        print(record)
+
+    issues = startup_issues(report["results"])
+    for issue in issues:
+        print("SLOW STARTUP", issue)
+    regressions = []
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(report["results"], json.load(file)["results"], args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+    sys.exit(1 if regressions or issues else 0)
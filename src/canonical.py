@@ -0,0 +1,283 @@
+"""
+Canonical keys of conformations, identical for conformations that only differ by a translation, rotation or
+reflection of the lattice, and the caches built on them: a bounded LRU cache of energies, and the registry
+of the distinct ground states found by a search.
+"""
+
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+import sequence as seq
+from variables import ENERGY_CACHE_SIZE, GROUND_STATE_LIMIT
+
+# Symbols of the steps of a key: two per axis, in the order the axes are first stepped along,
+# the first for the direction of the first step along the axis, the second for the opposite one
+KEY_SYMBOLS = "abcdef"
+
+
+def canonical_key(conformation: seq.Conformation) -> str:
+    """
+    Encode a conformation as the string of its bond directions, relabeled in order of first appearance.
+
+    The first axis the chain steps along is labeled a (first direction taken) and b (opposite direction),
+    the second one c and d, and so on. The rotations and reflections of the square and cubic lattices only
+    permute the axes and flip their directions, so they leave the relabeled string unchanged, as do the
+    translations, which leave the bonds unchanged. The chain of a palindromic sequence read from its last
+    residue is the same fold, so its key is the smaller of the keys of both readings. Two conformations of a
+    chain have the same key if and only if one is the image of the other by these symmetries, and then have
+    the same energy.
+
+    Args:
+        conformation (seq.Conformation): The conformation.
+
+    Returns:
+        str: The key, of one symbol per bond.
+    """
+    coordinates = conformation.to_numpy()
+    key = _bond_key(coordinates)
+    if conformation.hydrophobic == conformation.hydrophobic[::-1]:
+        key = min(key, _bond_key(coordinates[::-1]))
+    return key
+
+
+def _bond_key(coordinates: np.ndarray) -> str:
+    """
+    Encode the bonds of a chain, from its first residue, as relabeled directions, see `canonical_key`.
+
+    Args:
+        coordinates (np.ndarray): The coordinates of the residues, of shape (n, dimension).
+
+    Returns:
+        str: The key, of one symbol per bond.
+    """
+    steps = np.diff(coordinates, axis=0)
+    if len(steps) == 0:
+        return ""
+    axis = np.abs(steps).argmax(axis=1)
+    sign = steps[np.arange(len(steps)), axis]
+    axes_seen, first = np.unique(axis, return_index=True)
+    rank = np.zeros(steps.shape[1], dtype=np.int64)
+    rank[axes_seen[np.argsort(first)]] = np.arange(len(axes_seen))
+    first_sign = np.zeros(steps.shape[1], dtype=np.int64)
+    first_sign[axes_seen] = sign[first]
+    symbols = 2 * rank[axis] + (sign != first_sign[axis])
+    return (symbols.astype(np.uint8) + ord(KEY_SYMBOLS[0])).tobytes().decode("ascii")
+
+
+class EnergyCache:
+    """
+    Bounded cache of the energies of the conformations of one sequence, by canonical key, evicting the
+    least recently used conformation when full.
+
+    Attributes:
+        maxsize (int): The maximum number of conformations kept.
+        entries (OrderedDict): The energy of each cached key, from the least to the most recently used.
+        hits (int): The number of lookups of a cached key.
+        misses (int): The number of lookups of a key that was not cached.
+        evictions (int): The number of keys evicted to make room for new ones.
+    """
+
+    def __init__(self, maxsize: int = ENERGY_CACHE_SIZE) -> None:
+        """
+        Initialize an empty cache.
+
+        Args:
+            maxsize (int, optional): The maximum number of conformations kept. Defaults to ENERGY_CACHE_SIZE.
+
+        Raises:
+            ValueError: If the size is not positive.
+        """
+        if maxsize < 1:
+            raise ValueError(f"The size of the cache must be positive, got {maxsize}")
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[str, float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        """
+        Return the number of cached conformations.
+
+        Returns:
+            int: The number of cached conformations.
+        """
+        return len(self.entries)
+
+    def get(self, key: str) -> Optional[float]:
+        """
+        Look up the energy of a key, marking it as the most recently used.
+
+        Args:
+            key (str): The canonical key of the conformation.
+
+        Returns:
+            Optional[float]: The cached energy, None if the key is not cached.
+        """
+        energy = self.entries.get(key)
+        if energy is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return energy
+
+    def put(self, key: str, energy: float) -> None:
+        """
+        Cache the energy of a key, evicting the least recently used key if the cache is full.
+
+        Args:
+            key (str): The canonical key of the conformation.
+            energy (float): Its energy.
+        """
+        self.entries[key] = energy
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def energy(self, lattice, key: Optional[str] = None) -> float:
+        """
+        Return the energy of the conformation of a lattice, computed with `calculate_energy` only if it is not cached.
+
+        Args:
+            lattice (lat.Lattice): The lattice.
+            key (Optional[str], optional): The canonical key of its conformation. Defaults to None, to compute it.
+
+        Returns:
+            float: The energy of the conformation.
+        """
+        if key is None:
+            key = canonical_key(lattice.sequence.conformation)
+        energy = self.get(key)
+        if energy is None:
+            energy = lattice.calculate_energy()
+            self.put(key, energy)
+        return energy
+
+    def visit(self, lattice, key: Optional[str] = None) -> bool:
+        """
+        Record a visit of the conformation of a lattice whose energy is known, caching it if it is new.
+
+        Args:
+            lattice (lat.Lattice): The lattice, with its energy.
+            key (Optional[str], optional): The canonical key of its conformation. Defaults to None, to compute it.
+
+        Returns:
+            bool: Whether the conformation was cached already, i.e. is revisited.
+        """
+        if key is None:
+            key = canonical_key(lattice.sequence.conformation)
+        if self.get(key) is not None:
+            return True
+        self.put(key, lattice.energy)
+        return False
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Return the counters of the cache.
+
+        Returns:
+            Dict[str, object]: The size, maximum size, hits, misses, evictions and hit rate of the cache.
+        """
+        lookups = self.hits + self.misses
+        return {"size": len(self.entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+class GroundStateRegistry:
+    """
+    The distinct conformations of lowest energy offered so far, told apart by their canonical keys, so that
+    symmetric copies of a fold count once.
+
+    Attributes:
+        energy (float): The lowest energy offered, infinite until a conformation is offered.
+        keys (Dict[str, None]): The canonical keys of the distinct conformations of that energy, in the order found.
+        conformations (List[seq.Conformation]): Copies of the first `limit` of these conformations.
+        limit (int): The maximum number of conformations kept. Keys are counted beyond it.
+    """
+
+    def __init__(self, limit: int = GROUND_STATE_LIMIT) -> None:
+        """
+        Initialize an empty registry.
+
+        Args:
+            limit (int, optional): The maximum number of conformations kept. Defaults to GROUND_STATE_LIMIT.
+        """
+        self.limit = limit
+        self.energy = float("inf")
+        self.keys: Dict[str, None] = {}
+        self.conformations: List[seq.Conformation] = []
+
+    def __len__(self) -> int:
+        """
+        Return the number of distinct conformations of the lowest energy.
+
+        Returns:
+            int: The number of distinct conformations of the lowest energy.
+        """
+        return len(self.keys)
+
+    def offer(self, lattice, key: Optional[str] = None) -> bool:
+        """
+        Offer the conformation of a lattice, kept if its energy is the lowest and it is new. A lower energy
+        than the lowest one clears the registry first.
+
+        Args:
+            lattice (lat.Lattice): The lattice, with its energy.
+            key (Optional[str], optional): The canonical key of its conformation. Defaults to None, to compute it.
+
+        Returns:
+            bool: Whether the conformation was added.
+        """
+        return self.offer_conformation(lattice.sequence.conformation, lattice.energy, key)
+
+    def offer_conformation(self, conformation: seq.Conformation, energy: float, key: Optional[str] = None) -> bool:
+        """
+        Offer a conformation of known energy, e.g. a walker of a population held as coordinates, see `offer`.
+
+        Args:
+            conformation (seq.Conformation): The conformation, copied if kept.
+            energy (float): Its energy.
+            key (Optional[str], optional): Its canonical key. Defaults to None, to compute it.
+
+        Returns:
+            bool: Whether the conformation was added.
+        """
+        if energy > self.energy:
+            return False
+        if energy < self.energy:
+            self.energy = energy
+            self.keys.clear()
+            self.conformations.clear()
+        if key is None:
+            key = canonical_key(conformation)
+        if key in self.keys:
+            return False
+        self.keys[key] = None
+        if len(self.conformations) < self.limit:
+            self.conformations.append(conformation.copy())
+        return True
+
+    def state(self) -> Dict[str, object]:
+        """
+        Return the energy and keys of the registry, as plain values that can be stored as JSON.
+        The conformations are left out, see `Conformation.to_numpy`.
+
+        Returns:
+            Dict[str, object]: The limit, energy and keys of the registry.
+        """
+        return {"limit": self.limit, "energy": self.energy if self.keys else None, "keys": list(self.keys)}
+
+    def restore(self, state: Dict[str, object], conformations: List[seq.Conformation]) -> None:
+        """
+        Restore the registry from a state returned by `state` and the conformations it kept.
+
+        Args:
+            state (Dict[str, object]): The state of the registry.
+            conformations (List[seq.Conformation]): The conformations kept by the registry.
+        """
+        self.limit = state["limit"]
+        self.energy = state["energy"] if state["energy"] is not None else float("inf")
+        self.keys = dict.fromkeys(state["keys"])
+        self.conformations = list(conformations)
@@ -0,0 +1,93 @@
+"""
+Compact binary checkpoints of a REMC search, to resume a run exactly after it was stopped or pre-empted.
+"""
+
+import io
+import json
+import os
+from typing import Dict, NamedTuple
+import numpy as np
+
+# Version of the checkpoint layout, bumped when it changes
+CHECKPOINT_VERSION = 1
+
+
+class SearchCheckpoint(NamedTuple):
+    """
+    The state of a REMC search at the end of a round.
+
+    `meta` holds the settings of the search and the state of its replicas, ladder, tuner, stop conditions
+    and random streams as plain values, `arrays` holds the conformations as integer arrays: "coordinates",
+    of shape (replicas, n, d), "best", of shape (n, d), empty if no conformation was kept yet, and
+    "ground_states", of shape (k, n, d), the distinct lowest-energy conformations kept, d being 2 or 3.
+    """
+    meta: Dict[str, object]
+    arrays: Dict[str, np.ndarray]
+
+
+def _to_json(value):
+    """
+    Convert the NumPy scalars that may hide in a state to Python values, for `json.dumps`.
+
+    Args:
+        value: A value `json` cannot serialize.
+
+    Returns:
+        The equivalent Python value.
+
+    Raises:
+        TypeError: If the value is not a NumPy scalar.
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot store {type(value).__name__} in a checkpoint")
+
+
+def save_checkpoint(path: str, checkpoint: SearchCheckpoint) -> int:
+    """
+    Write a checkpoint as an uncompressed `.npz` archive, without pickled objects.
+
+    The metadata is stored as a JSON document in a byte array next to the coordinate arrays. The archive
+    is written to a temporary file which then replaces the previous checkpoint, so that a run killed while
+    writing still leaves the previous checkpoint intact.
+
+    Args:
+        path (str): The path of the checkpoint.
+        checkpoint (SearchCheckpoint): The checkpoint.
+
+    Returns:
+        int: The size of the checkpoint, in bytes.
+    """
+    meta = dict(checkpoint.meta, version=CHECKPOINT_VERSION)
+    buffer = io.BytesIO()
+    np.savez(buffer, meta=np.frombuffer(json.dumps(meta, default=_to_json).encode(), dtype=np.uint8),
+             **{name: np.ascontiguousarray(array, dtype=np.int64) for name, array in checkpoint.arrays.items()})
+    data = buffer.getvalue()
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+    return len(data)
+
+
+def load_checkpoint(path: str) -> SearchCheckpoint:
+    """
+    Read a checkpoint written by `save_checkpoint`.
+
+    Args:
+        path (str): The path of the checkpoint.
+
+    Returns:
+        SearchCheckpoint: The checkpoint.
+
+    Raises:
+        ValueError: If the file was written with another checkpoint layout.
+    """
+    with np.load(path, allow_pickle=False) as archive:
+        meta = json.loads(archive["meta"].tobytes().decode())
+        arrays = {name: archive[name] for name in archive.files if name != "meta"}
+    if meta.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version: {meta.get('version')}, expected {CHECKPOINT_VERSION}")
+    return SearchCheckpoint(meta, arrays)
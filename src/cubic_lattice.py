@@ -0,0 +1,442 @@
+"""
+Lattice of any dimension, used for the cubic lattice.
+
+The moves work on the flat site indices of a `FlatGrid`: the neighbours of a residue are found by adding
+the offsets of the grid to its site, and the geometry of a move (corner, U, pull) is expressed as sums and
+differences of sites, so that the same code runs on the square and the cubic lattice.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import lattice as lat
+import sequence as seq
+from occupancy import FlatGrid
+from initialization import random_conformations
+from random_streams import RandomStream
+from moves.move_utils import Displacement, MoveOutcome, move_outcome
+from moves.end_move_utils import is_end_move_possible
+from variables import CUBIC_GRID_MARGIN
+
+
+class CubicLattice(lat.Lattice):
+    """
+    Lattice of any dimension, holding the occupancy in a `FlatGrid` and the site of each residue.
+
+    It offers the same moves, energies, journal and translation as `Lattice`, and is built by `lattice.make_lattice`
+    for a conformation or dimension other than 2. The rejection-free search and the compiled
+    backend only run on the square lattice of `Lattice`. The grid is sparse by default, as a dense one holds
+    side ** dimension sites, and only the initial conformation is kept to rebuild the lattice on `reset`.
+
+    Attributes:
+        dimension (int): The dimension of the lattice.
+        size (int): The number of sites along each axis of the dense lattice.
+        sparse (bool): Whether the grid only stores the occupied sites, and is never translated.
+        lattice (FlatGrid): The occupancy of the lattice.
+        conformation_initial (seq.Conformation): The initial conformation of the lattice.
+        sites (List[int]): The site of each residue, by index.
+        energy (Optional[float]): The energy of the lattice.
+        journal (List[Displacement]): The displacements applied since the last commit, used to revert moves.
+        rng (RandomStream): The random stream of the moves, shared with the search running on the lattice.
+    """
+
+    def __init__(self, sequence: seq.Sequence, conformation: Optional[seq.Conformation] = None, sparse: Optional[bool] = None,
+                 rng: Optional[RandomStream] = None, dimension: Optional[int] = None):
+        """
+        Initialize the lattice with a given sequence.
+
+        Args:
+            sequence (seq.Sequence): The sequence of amino acids.
+            conformation (Optional[seq.Conformation], optional): The conformation to place on the lattice.
+                Defaults to None, in which case a random valid conformation is generated.
+            sparse (Optional[bool], optional): Whether to store only the occupied sites. Defaults to None,
+                for sparse.
+            rng (Optional[RandomStream], optional): The random stream of the random initialization and of
+                the moves. Defaults to None, for a new stream.
+            dimension (Optional[int], optional): The dimension of the lattice. Defaults to None, for the
+                dimension of the conformation, or 3 without conformation.
+        """
+        if dimension is None:
+            dimension = conformation.dimension if conformation is not None else 3
+        self.sequence = sequence.copy()
+        self.rng = rng if rng is not None else RandomStream()
+        self.dimension = dimension
+        # The chain spans at most length - 1 sites along an axis, kept CUBIC_GRID_MARGIN sites away from the faces
+        self.size = self.sequence.length + 2 * CUBIC_GRID_MARGIN + 1
+        self.sparse = True if sparse is None else sparse
+        self.lattice = FlatGrid(self.size, dimension, self.sparse)
+        self.sites: List[int] = [0] * self.sequence.length
+        if conformation is None:
+            self._initialize_random()
+        else:
+            self._place(conformation)
+        self.conformation_initial = self.sequence.conformation.copy()
+        self.energy = None
+        self.journal: List[Displacement] = []
+
+    def copy(self) -> "CubicLattice":
+        """
+        Return a copy of the lattice with its own grid, sites and coordinates.
+
+        Returns:
+            CubicLattice: The copied lattice, with an empty journal.
+        """
+        new = super().copy()
+        new.sites = self.sites[:]
+        return new
+
+    def revert(self) -> None:
+        """
+        Undo in place the moves applied since the last commit, in reverse order, and clear the journal.
+        """
+        grid, conformation = self.lattice, self.sequence.conformation
+        for chain_index, old, new in reversed(self.journal):
+            grid.put(grid.site(new), 0)
+            site = grid.site(old)
+            grid.put(site, chain_index)
+            self.sites[chain_index - 1] = site
+            conformation.set_position(chain_index - 1, old)
+        self.journal.clear()
+
+    def reset(self) -> None:
+        """
+        Place the initial conformation back on the lattice.
+        """
+        self.load(self.conformation_initial)
+
+    def load(self, conformation: seq.Conformation, energy: Optional[float] = None) -> None:
+        """
+        Replace the current conformation of the lattice by a copy of the given one.
+
+        Args:
+            conformation (seq.Conformation): The coordinates of the amino acids.
+            energy (Optional[float], optional): The energy of the conformation. Defaults to None.
+        """
+        for site in self.sites:
+            self.lattice.put(site, 0)
+        self._place(conformation)
+        self.energy = energy
+        self.journal.clear()
+
+    def _place(self, conformation: seq.Conformation) -> None:
+        """
+        Place a copy of the given conformation on the lattice, translated to the center of a dense lattice
+        if it comes closer than CUBIC_GRID_MARGIN sites to its faces.
+
+        Args:
+            conformation (seq.Conformation): The coordinates of the amino acids.
+
+        Raises:
+            ValueError: If the conformation is not of the dimension of the lattice.
+        """
+        if conformation.dimension != self.dimension:
+            raise ValueError(f"Cannot place a conformation of dimension {conformation.dimension} "
+                             f"on a lattice of dimension {self.dimension}")
+        conformation = conformation.copy()
+        if not self.sparse:
+            shift = self._centering_shift(conformation)
+            if any(shift):
+                for buffer, delta in zip(conformation.axes, shift):
+                    for index in range(len(buffer)):
+                        buffer[index] += delta
+        self.sequence.conformation = conformation
+        grid = self.lattice
+        for index in range(self.sequence.length):
+            site = grid.site(conformation.position(index))
+            grid.put(site, index + 1)
+            self.sites[index] = site
+
+    def _initialize_random(self) -> None:
+        """
+        Initialize the lattice with a random valid conformation, grown from the origin as a self-avoiding walk
+        and translated to the center of the lattice.
+        """
+        self._place(random_conformations(self.sequence, 1, self.rng, self.dimension)[0])
+
+    def _centering_shift(self, conformation: seq.Conformation) -> Tuple[int, ...]:
+        """
+        Compute the translation bringing the chain to the center of the dense lattice, along the axes
+        where it comes closer than CUBIC_GRID_MARGIN sites to a face, or lies outside the lattice.
+
+        Args:
+            conformation (seq.Conformation): The coordinates of the amino acids.
+
+        Returns:
+            Tuple[int, ...]: The translation along each axis, 0 where none is needed.
+        """
+        low, high = CUBIC_GRID_MARGIN, self.size - 1 - CUBIC_GRID_MARGIN
+        center = (self.size - 1) // 2
+        shift = []
+        for buffer in conformation.axes:
+            first, last = min(buffer), max(buffer)
+            shift.append(center - (first + last) // 2 if first < low or last > high else 0)
+        return tuple(shift)
+
+    def calculate_energy(self) -> float:
+        """
+        Calculate the energy of the lattice based on the hydrophobic interactions.
+
+        Returns:
+            float: The calculated energy of the lattice.
+        """
+        cells, offsets = self.lattice.cells, self.lattice.offsets
+        hydrophobic = self.sequence.conformation.hydrophobic
+        energy = 0
+        for index, site in enumerate(self.sites):
+            if hydrophobic[index]:
+                for offset in offsets:
+                    other = cells[site + offset]
+                    # Each contact is counted once, from the lower chain index
+                    if other > index + 2 and hydrophobic[other - 1]:
+                        energy -= 1
+        return energy
+
+    def calculate_delta_energy(self, displaced: List[Displacement]) -> int:
+        """
+        Calculate the energy change caused by a move from the residues it displaced, as `Lattice` does.
+
+        Args:
+            displaced (List[Displacement]): The residues displaced by the move.
+
+        Returns:
+            int: The energy of the new conformation minus the energy of the previous one.
+        """
+        if not displaced:
+            return 0
+        grid = self.lattice
+        cells, offsets = grid.cells, grid.offsets
+        hydrophobic = self.sequence.conformation.hydrophobic
+        old_site: Dict[int, int] = {}
+        for chain_index, old, _ in displaced:
+            old_site.setdefault(chain_index, grid.site(old))
+        # Sites occupied by the displaced residues before the move
+        old_cells = {site: chain_index for chain_index, site in old_site.items()}
+
+        delta = 0
+        for chain_index, site in old_site.items():
+            if not hydrophobic[chain_index - 1]:
+                continue
+            new_site = self.sites[chain_index - 1]
+            for offset in offsets:
+                other = cells[new_site + offset]
+                # Contacts between two displaced residues are counted once, from the lower index
+                if other and hydrophobic[other - 1] and abs(other - chain_index) > 1 \
+                        and not (other in old_site and other < chain_index):
+                    delta -= 1
+                neighbor = site + offset
+                if neighbor in old_cells:
+                    other = old_cells[neighbor]
+                else:
+                    other = cells[neighbor]
+                    if other in old_site:
+                        other = 0
+                if other and hydrophobic[other - 1] and abs(other - chain_index) > 1 \
+                        and not (other in old_site and other < chain_index):
+                    delta += 1
+        return delta
+
+    def _apply(self, kind: str, moves: List[Tuple[int, int]]) -> MoveOutcome:
+        """
+        Move residues to new sites, journal their displacements and return the outcome.
+
+        Args:
+            kind (str): The kind of move.
+            moves (List[Tuple[int, int]]): The chain index and new site of each moved residue.
+
+        Returns:
+            MoveOutcome: The outcome of the move.
+        """
+        grid, conformation = self.lattice, self.sequence.conformation
+        for chain_index, _ in moves:
+            grid.put(self.sites[chain_index - 1], 0)
+        displaced = []
+        for chain_index, site in moves:
+            old = conformation.position(chain_index - 1)
+            new = grid.position(site)
+            grid.put(site, chain_index)
+            self.sites[chain_index - 1] = site
+            conformation.set_position(chain_index - 1, new)
+            displaced.append((chain_index, old, new))
+        self.journal.extend(displaced)
+        return move_outcome(kind, displaced)
+
+    def end_move(self, chain_index: int, position: Optional[Tuple[int, ...]] = None, draw: Optional[float] = None) -> MoveOutcome:
+        """
+        Attempt to move an end residue to an empty neighbour of the next residue of the chain.
+
+        Args:
+            chain_index (int): The chain index of the amino acid to move.
+            position (Optional[Tuple[int, ...]], optional): The position to move to. Defaults to None,
+                for a random choice among the empty positions.
+            draw (Optional[float], optional): The uniform choosing among the empty positions when no position
+                is given. Defaults to None, for a draw from the random stream.
+
+        Returns:
+            MoveOutcome: The outcome of the move, not applied if nothing moved.
+        """
+        res_ref = is_end_move_possible(self, chain_index)
+        cells = self.lattice.cells
+        site = self.sites[res_ref - 1]
+        possible = [site + offset for offset in self.lattice.offsets if not cells[site + offset]]
+        if position is not None:
+            target = self.lattice.site(position)
+            possible = [target] if target in possible else []
+            draw = 0.0  # nothing to choose, so nothing is drawn from the random stream
+        if not possible:
+            return move_outcome("end", [])
+        new = possible[int(draw * len(possible))] if draw is not None else self.rng.choice(possible)
+        return self._apply("end", [(chain_index, new)])
+
+    def corner_move(self, chain_index: int) -> MoveOutcome:
+        """
+        Attempt to move a residue at a corner of the chain to the opposite corner of its square.
+
+        Args:
+            chain_index (int): The chain index of the amino acid to move.
+
+        Returns:
+            MoveOutcome: The outcome of the move, not applied if nothing moved.
+
+        Raises:
+            ValueError: If the amino acid is at the end of the chain, where a corner move is not possible.
+        """
+        if chain_index in (1, self.sequence.length):
+            raise ValueError("No Corner move possible. The amino acid is at the end of the chain")
+        previous, site, following = self.sites[chain_index - 2:chain_index + 1]
+        if following - previous not in self.lattice.diagonals:  # straight, not a corner
+            return move_outcome("corner", [])
+        target = previous + following - site
+        if self.lattice.cells[target]:
+            return move_outcome("corner", [])
+        return self._apply("corner", [(chain_index, target)])
+
+    def cks_move(self, chain_index: int, draw: Optional[float] = None) -> MoveOutcome:
+        """
+        Attempt a crankshaft move: rotate the U formed by the residue, its successor and the residues
+        around them about the axis of the U. On the cubic lattice, the U can turn to one of three sides,
+        drawn at random among the empty ones.
+
+        Args:
+            chain_index (int): The chain index of the amino acid to move.
+            draw (Optional[float], optional): The uniform choosing among the empty sides. Defaults to None,
+                for a draw from the random stream.
+
+        Returns:
+            MoveOutcome: The outcome of the move, not applied if nothing moved.
+
+        Raises:
+            ValueError: If the amino acid is at the end of the chain, where a CKS move is not possible.
+        """
+        if chain_index in (1, self.sequence.length):
+            raise ValueError("No CKS move possible. The amino acid is at the end of the chain")
+        # The U with the residue first in its base, then the U with the residue second in its base
+        for first in (chain_index, chain_index - 1):
+            if first < 2 or first + 2 > self.sequence.length:
+                continue
+            targets = self._crankshaft_targets(first)
+            if targets:
+                pair = targets[self._pick(len(targets), draw)]
+                return self._apply("cks", [(first, pair[0]), (first + 1, pair[1])])
+        return move_outcome("cks", [])
+
+    def _pick(self, count: int, draw: Optional[float]) -> int:
+        """
+        Choose one of several possible moves from the uniform of the MC step, so that a move draws nothing
+        more from the random stream than the step already did.
+
+        Args:
+            count (int): The number of possible moves.
+            draw (Optional[float]): The uniform in [0, 1) choosing the move, or None for a draw from the
+                random stream when there is a choice to make.
+
+        Returns:
+            int: The index of the chosen move.
+        """
+        if count == 1:
+            return 0
+        if draw is None:
+            draw = self.rng.random()
+        return min(int(draw * count), count - 1)
+
+    def _crankshaft_targets(self, first: int) -> List[Tuple[int, int]]:
+        """
+        Find the new sites of the base of a U, whose base is made of the residues `first` and `first + 1`.
+
+        Args:
+            first (int): The chain index of the first residue of the base.
+
+        Returns:
+            List[Tuple[int, int]]: The pairs of empty new sites of the base, empty if the residues do not form a U.
+        """
+        a, b, c, d = self.sites[first - 2:first + 2]
+        arm, base = b - a, c - b
+        if d - c != -arm:  # not a U
+            return []
+        cells = self.lattice.cells
+        return [(a + offset, d + offset) for offset in self.lattice.offsets
+                if offset != arm and offset != base and offset != -base
+                and not cells[a + offset] and not cells[d + offset]]
+
+    def pull_move(self, chain_index: int, draw: Optional[float] = None) -> MoveOutcome:
+        """
+        Attempt a pull move: move the residue to an empty site L next to its successor and diagonal to it,
+        its predecessor to the empty site C next to both, and pull the rest of the chain behind them.
+
+        Args:
+            chain_index (int): The chain index of the amino acid to move.
+            draw (Optional[float], optional): The uniform choosing among the possible sites L. Defaults to None,
+                for a draw from the random stream.
+
+        Returns:
+            MoveOutcome: The outcome of the move, with the residues displaced while propagating
+            the pull, not applied if nothing moved.
+
+        Raises:
+            ValueError: If the amino acid is at the end of the chain, where a pull move is not possible.
+        """
+        if chain_index in (1, self.sequence.length):
+            raise ValueError("No pull move possible. The amino acid is at the end of the chain")
+        sites, cells = self.sites, self.lattice.cells
+        site, following, previous = sites[chain_index - 1], sites[chain_index], sites[chain_index - 2]
+        bond = following - site
+        candidates = [offset for offset in self.lattice.offsets if offset != bond and offset != -bond
+                      and not cells[following + offset]
+                      and (site + offset == previous or not cells[site + offset])]
+        if not candidates:
+            return move_outcome("pull", [])
+        offset = candidates[self._pick(len(candidates), draw)]
+        site_L, site_C = following + offset, site + offset
+        if site_C == previous:  # the predecessor already sits at C, so this is a corner move
+            return self._apply("pull", [(chain_index, site_L)])
+        moves = [(chain_index, site_L), (chain_index - 1, site_C)]
+        # The residues behind follow into the sites vacated two residues ahead, until the chain is connected
+        vacated = [site, previous]
+        new_next = site_C
+        for index in range(chain_index - 2, 0, -1):
+            current = sites[index - 1]
+            if abs(current - new_next) in self.lattice.strides:
+                break
+            new_next = vacated.pop(0)
+            vacated.append(current)
+            moves.append((index, new_next))
+        return self._apply("pull", moves)
+
+    def translation_check_and_apply(self) -> Tuple[int, ...]:
+        """
+        Check if the protein came closer than CUBIC_GRID_MARGIN sites to a face of the lattice and translate
+        the chain to the center along the axes where it did. The translation is not journaled, so pending
+        moves must be committed first. A sparse lattice is never translated.
+
+        Returns:
+            Tuple[int, ...]: The applied translation along each axis, zeros if the chain was not moved.
+        """
+        if self.sparse:
+            return (0,) * self.dimension
+        shift = self._centering_shift(self.sequence.conformation)
+        if any(shift):
+            conformation = self.sequence.conformation
+            for site in self.sites:
+                self.lattice.put(site, 0)
+            for buffer, delta in zip(conformation.axes, shift):
+                for index in range(len(buffer)):
+                    buffer[index] += delta
+            self._place(conformation)
+        return shift
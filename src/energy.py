@@ -0,0 +1,189 @@
+"""
+Vectorized evaluation of the HP contact energy, for single lattices and for batches of conformations.
+"""
+
+import time
+import numpy as np
+from typing import Dict, List, Tuple
+
+
+def grid_energy(grid: np.ndarray, hydrophobic: np.ndarray) -> int:
+    """
+    Calculate the energy of a conformation from its lattice grid.
+
+    Hydrophobic contacts are counted by comparing the hydrophobic occupancy mask of the grid with
+    itself shifted by one cell along each axis. Contacts between residues that are bonded in the chain,
+    i.e. whose chain indices differ by one, are then subtracted.
+
+    Args:
+        grid (np.ndarray): The lattice grid of any dimension, holding the chain index of each residue and 0 for empty cells.
+        hydrophobic (np.ndarray): The hydrophobic mask of the residues, in chain order.
+
+    Returns:
+        int: The energy of the conformation.
+    """
+    is_h = np.zeros(len(hydrophobic) + 1, dtype=bool)
+    is_h[1:] = np.asarray(hydrophobic, dtype=bool)
+    h_mask = is_h[grid]
+    contacts = 0
+    for axis in range(grid.ndim):
+        head = [slice(None)] * grid.ndim
+        tail = [slice(None)] * grid.ndim
+        head[axis] = slice(1, None)
+        tail[axis] = slice(None, -1)
+        pairs = h_mask[tuple(head)] & h_mask[tuple(tail)]
+        bonded = np.abs(grid[tuple(head)] - grid[tuple(tail)]) == 1
+        contacts += np.count_nonzero(pairs & ~bonded)
+    return -contacts
+
+
+def lattice_energy(lattice) -> int:
+    """
+    Calculate the energy of a lattice with the vectorized grid evaluator, on a grid of the
+    bounding box of the chain built from its coordinates, so that it works whatever the
+    occupancy backend. Gives the same result as `Lattice.calculate_energy`.
+
+    Args:
+        lattice: The lattice object containing sequence and grid information.
+
+    Returns:
+        int: The energy of the lattice.
+    """
+    conformation = lattice.sequence.conformation
+    hydrophobic = np.frombuffer(conformation.hydrophobic, dtype=np.uint8)
+    coords = conformation.to_numpy()
+    coords = coords - coords.min(axis=0)
+    box = np.zeros(coords.max(axis=0) + 1, dtype=np.int64)
+    box[tuple(coords.T)] = np.arange(1, len(coords) + 1)
+    return grid_energy(box, hydrophobic)
+
+
+def batch_energy(coords: np.ndarray, hydrophobic: np.ndarray) -> np.ndarray:
+    """
+    Calculate the energies of a stack of conformations of the same sequence in one call.
+
+    The hydrophobic residues of all conformations are encoded as integer keys, disjoint between
+    conformations, and sorted once. The contacts are then found by looking up, for each hydrophobic
+    residue, the keys of its next neighbours along each axis, so that each pair is counted once.
+
+    Args:
+        coords (np.ndarray): A (K, n, 2) array of (x, y) coordinates, or a (K, n, 3) array of (x, y, z) coordinates.
+        hydrophobic (np.ndarray): The hydrophobic mask of the n residues, in chain order.
+
+    Returns:
+        np.ndarray: The K energies.
+    """
+    coords = np.asarray(coords, dtype=np.int64)
+    nb_conformations = coords.shape[0]
+    h_index = np.flatnonzero(np.asarray(hydrophobic, dtype=bool))
+    if nb_conformations == 0 or len(h_index) == 0:
+        return np.zeros(nb_conformations, dtype=np.int64)
+    h_coords = coords[:, h_index, :]
+    h_coords = h_coords - h_coords.min(axis=1, keepdims=True)
+    # One spare row and column so that a neighbour key never spills into the next row or conformation
+    span = int(h_coords.max()) + 2
+    keys = np.arange(nb_conformations)[:, None]
+    for axis in range(coords.shape[2]):
+        keys = keys * span + h_coords[..., axis]
+    keys = keys.ravel()
+    residues = np.broadcast_to(h_index, (nb_conformations, len(h_index))).ravel()
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    sorted_residues = residues[order]
+    contacts = np.zeros(keys.shape, dtype=np.int64)
+    for step in (span ** axis for axis in range(coords.shape[2])):
+        target = keys + step
+        position = np.minimum(np.searchsorted(sorted_keys, target), len(sorted_keys) - 1)
+        found = sorted_keys[position] == target
+        contacts += found & (np.abs(sorted_residues[position] - residues) > 1)
+    return -contacts.reshape(nb_conformations, -1).sum(axis=1)
+
+
+def serpentine_coords(length: int, width: int, origin: int = 0) -> np.ndarray:
+    """
+    Build the coordinates of a valid serpentine conformation, folded in rows of `width` residues.
+
+    Args:
+        length (int): The number of residues.
+        width (int): The number of residues per row.
+        origin (int, optional): The coordinate of the first residue on both axes. Defaults to 0.
+
+    Returns:
+        np.ndarray: An (n, 2) array of (x, y) coordinates.
+    """
+    index = np.arange(length)
+    row, column = np.divmod(index, width)
+    column = np.where(row % 2 == 0, column, width - 1 - column)
+    return np.stack((origin + row, origin + column), axis=1)
+
+
+def perturbed_serpentine(length: int, rng: "RandomStream") -> Tuple["Lattice", np.ndarray]:
+    """
+    Build a lattice for a random HP sequence, folded as a serpentine then perturbed by random MC moves,
+    and record its conformation along the way.
+
+    Args:
+        length (int): The number of residues.
+        rng (RandomStream): The random stream of the sequence and of the moves.
+
+    Returns:
+        Tuple[lat.Lattice, np.ndarray]: The lattice, in its final conformation, and a (K, n, 2) stack of
+        the conformations recorded every n moves.
+    """
+    import lattice as lat
+    import sequence as seq
+
+    sequence = seq.Sequence(hp_sequence="".join(rng.choice("HP") for _ in range(length)))
+    width = int(np.ceil(np.sqrt(length)))
+    coords = serpentine_coords(length, width, origin=length // 2 + 1)
+    lattice = lat.Lattice(sequence, conformation=seq.Conformation.from_numpy(sequence.hp_sequence, coords), rng=rng)
+    snapshots = []
+    for move in range(20 * length):
+        chain_index = rng.randint(2, length - 1)
+        lattice.pull_move(chain_index) if rng.random() < 0.5 else lattice.corner_move(chain_index)
+        lattice.commit()
+        lattice.translation_check_and_apply()
+        if move % length == 0:
+            snapshots.append(lattice.sequence.conformation.to_numpy())
+    return lattice, np.stack(snapshots)
+
+
+def benchmark(lengths: Tuple[int, ...] = (20, 50, 100, 200, 500, 1000), repeat: int = 5, seed: int = 0) -> List[Dict[str, float]]:
+    """
+    Compare the vectorized evaluators with `Lattice.calculate_energy` on random HP sequences.
+
+    Each conformation is a serpentine perturbed by random MC moves, see `perturbed_serpentine`. The evaluators
+    are checked to agree by `tests/test_energy.py`.
+
+    Args:
+        lengths (Tuple[int, ...], optional): The sequence lengths to benchmark. Defaults to 20 to 1000 residues.
+        repeat (int, optional): The number of timed calls per evaluator. Defaults to 5.
+        seed (int, optional): The seed of the random sequences and moves. Defaults to 0.
+
+    Returns:
+        List[Dict[str, float]]: For each length, the mean time per call of each evaluator, in seconds.
+    """
+    from random_streams import RandomStream
+
+    rng = RandomStream(seed)
+    results = []
+    for length in lengths:
+        lattice, stack = perturbed_serpentine(length, rng)
+        hydrophobic = np.frombuffer(lattice.sequence.conformation.hydrophobic, dtype=np.uint8)
+
+        timings = {"length": length, "energy": lattice.calculate_energy()}
+        for name, evaluate in (("python", lattice.calculate_energy),
+                               ("grid", lambda: lattice_energy(lattice)),
+                               ("batch_per_conformation", lambda: batch_energy(stack, hydrophobic))):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                evaluate()
+            timings[name] = (time.perf_counter() - start) / repeat
+        timings["batch_per_conformation"] /= len(stack)
+        results.append(timings)
+    return results
+
+
+if __name__ == "__main__":
+    for timings in benchmark():
+        print(timings)
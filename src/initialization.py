@@ -0,0 +1,127 @@
+"""
+Random self-avoiding walks to initialize the conformations of the lattices.
+"""
+
+import math
+from typing import List, Optional, Tuple
+import numpy as np
+import sequence as seq
+from random_streams import RandomStream
+from variables import GRID_SIZE_FACTOR, SAW_OUTWARD_BIAS
+
+
+def self_avoiding_walk(length: int, start: Tuple[int, ...], bound: Optional[Tuple[int, int]] = None,
+                       outward_bias: float = SAW_OUTWARD_BIAS, rng: Optional[RandomStream] = None) -> List[Tuple[int, ...]]:
+    """
+    Grow a random self-avoiding walk on the square lattice, or on the cubic lattice from a start in 3D.
+
+    The walk is grown one cell at a time, trying the free neighbours of its end in a random order
+    biased towards the cells with the most free neighbours, as in Rosenbluth growth with look-ahead,
+    and towards the cells farther from the start, so that the walk rarely traps itself. On a dead end,
+    it backtracks and grows again from there instead of starting over. Repeated dead ends within the
+    cells regrown since the last backtrack double the number of cells removed, so that the walk
+    leaves a pocket after a few attempts instead of exploring all of it. The cost is linear in the
+    length in practice.
+
+    Args:
+        length (int): The number of cells of the walk.
+        start (Tuple[int, ...]): The first cell of the walk, whose length is the dimension of the lattice.
+        bound (Optional[Tuple[int, int]], optional): The lowest and highest coordinate allowed on every
+            axis. Defaults to None, for an unbounded lattice.
+        outward_bias (float, optional): How much more likely a step away from the start is tried first.
+            Defaults to SAW_OUTWARD_BIAS.
+        rng (Optional[RandomStream], optional): The random stream of the walk. Defaults to None, for a new stream.
+
+    Returns:
+        List[Tuple[int, ...]]: The cells of the walk, in order.
+
+    Raises:
+        ValueError: If the walk cannot fit in the bounds.
+    """
+    if rng is None:
+        rng = RandomStream()
+    low, high = bound if bound is not None else (-math.inf, math.inf)
+    dimension = len(start)
+    if length > (high - low + 1) ** dimension:
+        raise ValueError(f"No self-avoiding walk of {length} cells fits in the bounds {bound}")
+    # The steps to the neighbours of a cell, -1 then +1 along each axis
+    steps = [tuple(sign if k == axis else 0 for k in range(dimension)) for axis in range(dimension) for sign in (-1, 1)]
+
+    def inside(cell: Tuple[int, ...]) -> bool:
+        return all(low <= coordinate <= high for coordinate in cell)
+
+    def neighbors(*cell: int) -> List[Tuple[int, ...]]:
+        return [tuple(coordinate + delta for coordinate, delta in zip(cell, step)) for step in steps]
+
+    def distance(cell: Tuple[int, ...]) -> int:
+        return sum((coordinate - origin) ** 2 for coordinate, origin in zip(cell, start))
+
+    path = [start]
+    occupied = {start}
+    untried: List[List[Tuple[int, ...]]] = []  # the neighbours left to try at each cell of the walk but the last
+    dead_ends = 0  # consecutive dead ends in the same region of the walk
+    cut_to, cut = 0, 0  # the length the walk was last cut back to, and by how many cells
+    while len(path) < length:
+        if len(untried) < len(path):
+            radius = distance(path[-1])
+            candidates = [cell for cell in neighbors(*path[-1]) if cell not in occupied and inside(cell)]
+            # Rosenbluth-like look-ahead: cells are tried first with a probability growing with their
+            # number of free neighbours, and outwards; cells with none are dead ends unless they end the walk
+            keys = {}
+            for cell in candidates:
+                free = sum(1 for other in neighbors(*cell) if other not in occupied and inside(other))
+                outward = distance(cell) > radius
+                weight = free * (outward_bias if outward else 1.0)
+                keys[cell] = rng.random() ** (1 / weight) if free else -1.0
+            candidates.sort(key=keys.get)
+            if len(path) < length - 1:
+                candidates = [cell for cell in candidates if keys[cell] >= 0]
+            untried.append(candidates)
+        if untried[-1]:
+            cell = untried[-1].pop()
+            path.append(cell)
+            occupied.add(cell)
+        else:
+            # Remove the dead end and, after repeated dead ends in the cells regrown since the last
+            # cut, more of the walk before it
+            dead_ends = dead_ends + 1 if len(path) - cut_to <= cut // 2 else 0
+            cut = min(2 ** dead_ends, len(path))
+            for _ in range(cut):
+                untried.pop()
+                occupied.discard(path.pop())
+            cut_to = len(path)
+            if not path:  # every neighbour of the start was tried, grow again from the start
+                path = [start]
+                occupied = {start}
+    return path
+
+
+def random_conformations(sequence: seq.Sequence, k: int, rng: Optional[RandomStream] = None,
+                         dimension: int = 2) -> List[seq.Conformation]:
+    """
+    Generate independent random valid conformations of a sequence, e.g. one per replica.
+
+    On the square lattice, the conformations start at the center of the dense lattice of the sequence
+    and stay inside it, so that they can be placed on a lattice of either backend. On the cubic lattice,
+    they start at the origin and are recentered by the lattice they are placed on.
+
+    Args:
+        sequence (seq.Sequence): The sequence to fold.
+        k (int): The number of conformations.
+        rng (Optional[RandomStream], optional): The random stream of the walks. Defaults to None, for a new stream.
+        dimension (int, optional): 2 for the square lattice, 3 for the cubic lattice. Defaults to 2.
+
+    Returns:
+        List[seq.Conformation]: The k conformations.
+    """
+    if rng is None:
+        rng = RandomStream()
+    if dimension == 2:
+        size = sequence.length * GRID_SIZE_FACTOR
+        start = (size // 2, size // 2)
+        bound = (1, size - 2)
+    else:
+        start = (0,) * dimension
+        bound = None
+    return [seq.Conformation.from_numpy(sequence.hp_sequence, np.array(self_avoiding_walk(sequence.length, start, bound, rng=rng)))
+            for _ in range(k)]
@@ -0,0 +1,211 @@
+"""
+Adaptive tuning of the temperature ladder of a REMC search, from statistics gathered during a warm-up.
+"""
+
+import math
+from typing import Dict, List
+from variables import LADDER_TARGET_ACCEPTANCE, LADDER_WARMUP_ROUNDS, LADDER_TUNING_CYCLES, LADDER_MAX_REPLICAS
+
+TUNING_MODES = ("acceptance", "flux")
+
+
+def redistribute_temperatures(temperatures: List[float], weights: List[float], nb_temperatures: int) -> List[float]:
+    """
+    Place temperatures between the ends of a ladder so that each gap holds the same share of a weight.
+
+    The weight of each gap of the current ladder is spread uniformly over the gap. The new temperatures
+    cut the cumulated weight in equal parts, so that heavy gaps get split and light ones merged.
+
+    Args:
+        temperatures (List[float]): The current temperatures, from the lowest to the highest.
+        weights (List[float]): The weight of each gap between neighbouring temperatures.
+        nb_temperatures (int): The number of new temperatures, at least 2.
+
+    Returns:
+        List[float]: The new temperatures, from the lowest to the highest, with the same ends.
+    """
+    weights = [max(weight, 1e-9) for weight in weights]
+    total = sum(weights)
+    new_temperatures = [temperatures[0]]
+    k, cumulated = 0, 0.0
+    for j in range(1, nb_temperatures - 1):
+        target = total * j / (nb_temperatures - 1)
+        while cumulated + weights[k] < target:
+            cumulated += weights[k]
+            k += 1
+        share = (target - cumulated) / weights[k]
+        new_temperatures.append(temperatures[k] + share * (temperatures[k + 1] - temperatures[k]))
+    new_temperatures.append(temperatures[-1])
+    return new_temperatures
+
+
+class LadderTuner:
+    """
+    Warm-up tuning of the temperatures of a `ReplicaLadder`, frozen after a number of retunings.
+
+    Every `warmup_rounds` exchange rounds, the temperatures are moved between the fixed ends of the
+    ladder from the statistics gathered since the last retuning, according to the mode:
+
+    - "acceptance": equalize the exchange acceptance of neighbouring temperatures. The exchange acceptance
+      of a gap decays roughly as exp(-c * gap^2), so each gap weighs sqrt(-ln(acceptance)). With `resize`,
+      the number of temperatures is also changed so that every gap reaches `target_acceptance`.
+    - "flux": maximize the flux of round trips (feedback-optimized ladder, Katzgraber et al., 2006). With
+      f(T) the fraction of visits by replicas heading up the ladder, the optimal density of temperatures
+      is proportional to sqrt(df/dT / gap), so that each gap weighs sqrt(f(T_k) - f(T_k+1)). It needs
+      round trips to happen during the warm-up, so longer warm-ups than the acceptance mode.
+
+    Attributes:
+        mode (str): The tuning mode, one of TUNING_MODES.
+        target_acceptance (float): The exchange acceptance aimed at when resizing the ladder.
+        warmup_rounds (int): The number of exchange rounds between two retunings.
+        cycles (int): The number of retunings before the ladder is frozen.
+        resize (bool): Whether to add or remove temperatures, in "acceptance" mode.
+        min_replicas (int): The lowest number of temperatures when resizing.
+        max_replicas (int): The highest number of temperatures when resizing.
+        cycles_done (int): The number of retunings performed.
+    """
+
+    def __init__(self, mode: str = "acceptance", target_acceptance: float = LADDER_TARGET_ACCEPTANCE,
+                 warmup_rounds: int = LADDER_WARMUP_ROUNDS, cycles: int = LADDER_TUNING_CYCLES, resize: bool = False,
+                 min_replicas: int = 2, max_replicas: int = LADDER_MAX_REPLICAS) -> None:
+        """
+        Initialize the tuner.
+
+        Args:
+            mode (str, optional): The tuning mode, "acceptance" or "flux". Defaults to "acceptance".
+            target_acceptance (float, optional): The exchange acceptance aimed at when resizing the ladder.
+                Defaults to LADDER_TARGET_ACCEPTANCE.
+            warmup_rounds (int, optional): The number of exchange rounds between two retunings. Defaults to LADDER_WARMUP_ROUNDS.
+            cycles (int, optional): The number of retunings before the ladder is frozen. Defaults to LADDER_TUNING_CYCLES.
+            resize (bool, optional): Whether to add or remove temperatures. Defaults to False.
+            min_replicas (int, optional): The lowest number of temperatures when resizing. Defaults to 2.
+            max_replicas (int, optional): The highest number of temperatures when resizing. Defaults to LADDER_MAX_REPLICAS.
+
+        Raises:
+            ValueError: If the mode is unknown, the target acceptance is not in (0, 1), or resizing is asked in "flux" mode.
+        """
+        if mode not in TUNING_MODES:
+            raise ValueError(f"Unknown ladder tuning mode: {mode}, expected one of {TUNING_MODES}")
+        if not 0 < target_acceptance < 1:
+            raise ValueError(f"The target acceptance must be in (0, 1), got {target_acceptance}")
+        if resize and mode != "acceptance":
+            raise ValueError("The ladder can only be resized in acceptance mode")
+        self.mode = mode
+        self.target_acceptance = target_acceptance
+        self.warmup_rounds = warmup_rounds
+        self.cycles = cycles
+        self.resize = resize
+        self.min_replicas = max(2, min_replicas)
+        self.max_replicas = max(self.min_replicas, max_replicas)
+        self.cycles_done = 0
+        self._last_round = 0
+
+    @classmethod
+    def from_state(cls, state: Dict[str, object]) -> "LadderTuner":
+        """
+        Build a tuner from the state of another one.
+
+        Args:
+            state (Dict[str, object]): The state, as returned by `state`.
+
+        Returns:
+            LadderTuner: A tuner with the same settings and progress.
+        """
+        tuner = cls(state["mode"], state["target_acceptance"], state["warmup_rounds"], state["cycles"], state["resize"],
+                    state["min_replicas"], state["max_replicas"])
+        tuner.cycles_done = state["cycles_done"]
+        tuner._last_round = state["last_round"]
+        return tuner
+
+    def state(self) -> Dict[str, object]:
+        """
+        Return the settings and progress of the tuner, as plain values that can be stored as JSON.
+
+        Returns:
+            Dict[str, object]: The state of the tuner.
+        """
+        return {
+            "mode": self.mode,
+            "target_acceptance": self.target_acceptance,
+            "warmup_rounds": self.warmup_rounds,
+            "cycles": self.cycles,
+            "resize": self.resize,
+            "min_replicas": self.min_replicas,
+            "max_replicas": self.max_replicas,
+            "cycles_done": self.cycles_done,
+            "last_round": self._last_round,
+        }
+
+    @property
+    def frozen(self) -> bool:
+        """
+        Whether the ladder is frozen for production, all retunings being done.
+        """
+        return self.cycles_done >= self.cycles
+
+    def due(self, ladder) -> bool:
+        """
+        Check whether the ladder should be retuned after the current round.
+
+        Args:
+            ladder (ReplicaLadder): The ladder of the search.
+
+        Returns:
+            bool: True if the ladder is not frozen and has gathered `warmup_rounds` rounds since the last retuning.
+        """
+        return not self.frozen and ladder.rounds - self._last_round >= self.warmup_rounds
+
+    def propose(self, ladder) -> List[float]:
+        """
+        Compute the new temperatures of a ladder from its statistics, and count a retuning.
+
+        Args:
+            ladder (ReplicaLadder): The ladder of the search.
+
+        Returns:
+            List[float]: The new temperatures, from the lowest to the highest.
+        """
+        weights = self.acceptance_weights(ladder) if self.mode == "acceptance" else self.flux_weights(ladder)
+        nb_temperatures = len(ladder.temperatures)
+        if self.resize:
+            # Number of gaps of weight sqrt(-ln(target)) needed to cover the ladder
+            gaps = math.ceil(sum(weights) / math.sqrt(-math.log(self.target_acceptance)))
+            nb_temperatures = min(max(gaps + 1, self.min_replicas), self.max_replicas)
+        self.cycles_done += 1
+        self._last_round = ladder.rounds
+        return redistribute_temperatures(ladder.temperatures, weights, nb_temperatures)
+
+    @staticmethod
+    def acceptance_weights(ladder) -> List[float]:
+        """
+        Weigh each gap of a ladder by sqrt(-ln(acceptance)), from its exchange statistics.
+
+        Acceptances are estimated as (accepts + 1/2) / (attempts + 1), so that gaps with no accepted
+        or no rejected exchange still get a finite weight.
+
+        Args:
+            ladder (ReplicaLadder): The ladder of the search.
+
+        Returns:
+            List[float]: The weight of each gap.
+        """
+        return [math.sqrt(-math.log((accepts + 0.5) / (attempts + 1))) for accepts, attempts in zip(ladder.accepts, ladder.attempts)]
+
+    @staticmethod
+    def flux_weights(ladder) -> List[float]:
+        """
+        Weigh each gap of a ladder by sqrt(f(T_k) - f(T_k+1)), with f the fraction of visits by replicas
+        heading up the ladder.
+
+        Fractions are estimated as (up + 1/2) / (up + down + 1), the lowest and highest temperatures being
+        set to 1 and 0, and drops are floored at a small value so that no gap vanishes.
+
+        Args:
+            ladder (ReplicaLadder): The ladder of the search.
+
+        Returns:
+            List[float]: The weight of each gap.
+        """
+        fractions = [(up + 0.5) / (up + down + 1) for up, down in zip(ladder.up_visits, ladder.down_visits)]
+        fractions[0], fractions[-1] = 1.0, 0.0
+        return [math.sqrt(max(fractions[k] - fractions[k + 1], 1e-3)) for k in range(len(fractions) - 1)]
@@ -1,40 +1,68 @@
-from copy import deepcopy
+from copy import copy, deepcopy
 import numpy as np
-import random as rd
-from variables import GRID_SIZE_FACTOR
-from moves.move_utils import *
-from moves.end_move_utils import *
-from moves.corner_move_utils import *
-from moves.cks_utils import *
-from moves.pull_move_utils import *
+from variables import GRID_SIZE_FACTOR, SPARSE_GRID_MIN_LENGTH
+from occupancy import SparseGrid
+from initialization import random_conformations
+from random_streams import RandomStream
+from moves.move_utils import (Displacement, MoveOutcome, move_outcome, is_hydrophobic, are_topological_neighbors,
+                              are_not_connected_neighbors, are_corner, check_occupancy, find_empty_neighbors,
+                              neighbor_positions, translate_chain, need_translation_x, need_translation_y)
+from moves.end_move_utils import is_end_move_possible, execute_end_move
+from moves.corner_move_utils import find_potential_corner, get_corner_aa_to_check, execute_corner_move
+from moves.cks_utils import get_cks_aa_to_check, get_alternative_positions, validate_U, execute_u_move, execute_alternative_u_move
+from moves.pull_move_utils import get_pull_aa_to_check, find_L_positions, find_C_positions, execute_pull_move, propagate_pull
 import sequence as seq
-from typing import Tuple, List
+from typing import Tuple, List, Optional, Union
 
 class Lattice:
     """
     Class representing the lattice for the protein, its sequence, along with methods to manipulate it.
 
+    This class implements the square lattice. `cubic_lattice.CubicLattice` offers the same methods on lattices
+    of any dimension, and `make_lattice` builds the lattice of either class for a dimension.
+
     Attributes:
         sequence (seq.Sequence): The sequence of amino acids.
-        size (int): The size of the lattice.
-        lattice (np.ndarray): The 2D array representing the lattice.
-        lattice_initial (np.ndarray): The initial configuration of the lattice.
+        dimension (int): The dimension of the lattice, 2.
+        size (int): The size of the dense lattice, around whose center the chain starts.
+        sparse (bool): Whether the occupancy is a `SparseGrid` instead of a dense array.
+        lattice (Union[np.ndarray, SparseGrid]): The occupancy of the lattice, indexed by (x, y).
+        lattice_initial (Union[np.ndarray, SparseGrid]): The initial configuration of the lattice.
         energy (Optional[float]): The energy of the lattice.
+        journal (List[Displacement]): The displacements applied since the last commit, used to revert moves.
+        rng (RandomStream): The random stream of the moves, shared with the search running on the lattice.
     """
 
-    def __init__(self, sequence: seq.Sequence):
+    def __init__(self, sequence: seq.Sequence, conformation: Optional[seq.Conformation] = None, sparse: Optional[bool] = None,
+                 rng: Optional[RandomStream] = None):
         """
         Initialize the lattice with a given sequence.
+        The lattice works on its own copy of the sequence, so that several lattices
+        can be built from the same sequence without sharing coordinates.
 
         Args:
             sequence (seq.Sequence): The sequence of amino acids.
+            conformation (Optional[seq.Conformation], optional): The conformation to place on the lattice.
+                Defaults to None, in which case a random valid conformation is generated.
+            sparse (Optional[bool], optional): Whether to store the occupancy in an unbounded `SparseGrid`,
+                whose memory grows with the chain instead of its square and which never needs recentering,
+                rather than in a dense array. Defaults to None, for sparse from SPARSE_GRID_MIN_LENGTH residues.
+            rng (Optional[RandomStream], optional): The random stream of the random initialization and of
+                the end moves. Defaults to None, for a new stream.
         """
-        self.sequence = sequence
+        self.sequence = sequence.copy()
+        self.dimension = 2
+        self.rng = rng if rng is not None else RandomStream()
         self.size = self.sequence.length * GRID_SIZE_FACTOR
-        self.lattice = np.zeros((self.size, self.size), dtype=int)
-        self._initialize_random()
+        self.sparse = self.sequence.length >= SPARSE_GRID_MIN_LENGTH if sparse is None else sparse
+        self.lattice: Union[np.ndarray, SparseGrid] = SparseGrid() if self.sparse else np.zeros((self.size, self.size), dtype=int)
+        if conformation is None:
+            self._initialize_random()
+        else:
+            self._place(conformation)
         self.lattice_initial = deepcopy(self.lattice)
         self.energy = None
+        self.journal: List[Displacement] = []
 
     def __str__(self) -> str:
         """
@@ -45,37 +73,73 @@ class Lattice:
         """
         return str(self.lattice)
 
-    def _initialize_random(self) -> None:
+    def copy(self) -> "Lattice":
         """
-        Initialize the lattice with a random valid conformation.
-        
-        This method places the amino acids on center of the lattice in a valid conformation.
+        Return a copy of the lattice with its own grid and coordinates.
+        The initial lattice is shared, as it is never modified after initialization.
+
+        Returns:
+            Lattice: The copied lattice, with an empty journal.
         """
-        while True:
-            try:
-                self.lattice.fill(0)
-                start_pos_i = self.size // 2
-                start_pos_j = self.size // 2
-                i, j = start_pos_i, start_pos_j
+        new = copy(self)
+        new.lattice = self.lattice.copy()
+        new.sequence = self.sequence.copy()
+        new.journal = []
+        return new
 
-                self.lattice[i, j] = 1
-                self.sequence.aa_coord_update(0, i, j)
+    def commit(self) -> None:
+        """
+        Keep the moves applied since the last commit and clear the journal.
+        """
+        self.journal.clear()
 
-                for aa_index in range(1, self.sequence.length):
-                    possible_pos = find_empty_neighbors(self, i, j)
+    def revert(self) -> None:
+        """
+        Undo in place the moves applied since the last commit, in reverse order, and clear the journal.
+        """
+        for chain_index, old, new in reversed(self.journal):
+            self.lattice[new] = 0
+            self.lattice[old] = chain_index
+            self.sequence.aa_coord_update(chain_index - 1, old[0], old[1])
+        self.journal.clear()
 
-                    if len(possible_pos) == 0:
-                        raise ValueError("No possible position for the next amino acid, restarting initialization")
+    def load(self, conformation: seq.Conformation, energy: Optional[float] = None) -> None:
+        """
+        Replace the current conformation of the lattice by a copy of the given one.
 
-                    pos = rd.choice(possible_pos)
-                    i, j = pos[0], pos[1]
-                    self.lattice[i, j] = aa_index + 1
-                    self.sequence.aa_coord_update(aa_index, i, j)
+        Args:
+            conformation (seq.Conformation): The coordinates of the amino acids.
+            energy (Optional[float], optional): The energy of the conformation. Defaults to None.
+        """
+        self.lattice.fill(0)
+        self._place(conformation)
+        self.energy = energy
+        self.journal.clear()
 
-                break
+    def _place(self, conformation: seq.Conformation) -> None:
+        """
+        Place a copy of the given conformation on the lattice.
 
-            except ValueError:
-                continue
+        Args:
+            conformation (seq.Conformation): The coordinates of the amino acids.
+
+        Raises:
+            ValueError: If the conformation is not on the square lattice, see `make_lattice`.
+        """
+        if conformation.dimension != 2:
+            raise ValueError(f"Cannot place a conformation of dimension {conformation.dimension} on the square lattice")
+        self.sequence.conformation = conformation.copy()
+        for index in range(self.sequence.length):
+            self.lattice[conformation.x[index], conformation.y[index]] = index + 1
+
+    def _initialize_random(self) -> None:
+        """
+        Initialize the lattice with a random valid conformation.
+        
+        This method places the amino acids on center of the lattice in a valid conformation,
+        grown as a self-avoiding walk that backtracks out of dead ends.
+        """
+        self._place(random_conformations(self.sequence, 1, self.rng)[0])
 
     def calculate_energy(self) -> float:
         """
@@ -85,17 +149,65 @@ class Lattice:
             float: The calculated energy of the lattice.
         """
         energy = 0
+        conf = self.sequence.conformation
         n = self.sequence.length
         for j in range(n - 1):
-            if is_hydrophobic(self.sequence.aa_coord[j]):
+            if is_hydrophobic(conf, j):
                 for k in range(j + 1, n):
-                    if is_hydrophobic(self.sequence.aa_coord[k]):
-                        if are_topological_neighbors(self.sequence.aa_coord[j], self.sequence.aa_coord[k]):
-                            if are_not_connected_neighbors(self.sequence.aa_coord[j], self.sequence.aa_coord[k]):
+                    if is_hydrophobic(conf, k):
+                        if are_topological_neighbors(conf, j, k):
+                            if are_not_connected_neighbors(j, k):
                                 energy -= 1
         return energy
 
-    def end_move(self, chain_index: int) -> None:
+    def calculate_delta_energy(self, displaced: List[Displacement]) -> int:
+        """
+        Calculate the energy change caused by a move from the residues it displaced.
+
+        Only the contacts around the old and new positions of the displaced residues are
+        inspected, so the cost depends on the number of moved residues, not on the chain length.
+        The lattice is expected to already hold the new conformation.
+
+        Args:
+            displaced (List[Displacement]): The residues displaced by the move.
+
+        Returns:
+            int: The energy of the new conformation minus the energy of the previous one.
+        """
+        if not displaced:
+            return 0
+        hydrophobic = self.sequence.conformation.hydrophobic
+        old_pos, new_pos = {}, {}
+        for chain_index, old, new in displaced:
+            old_pos.setdefault(chain_index, old)
+            new_pos[chain_index] = new
+        # Cells occupied by the displaced residues before the move
+        old_cells = {pos: chain_index for chain_index, pos in old_pos.items()}
+
+        def old_occupant(pos: Tuple[int, int]) -> int:
+            if pos in old_cells:
+                return old_cells[pos]
+            occupant = self.lattice[pos]
+            return 0 if occupant in new_pos else occupant
+
+        delta = 0
+        for chain_index in new_pos:
+            if not hydrophobic[chain_index - 1]:
+                continue
+            for pos in neighbor_positions(*new_pos[chain_index]):
+                other = self.lattice[pos]
+                # Contacts between two displaced residues are counted once, from the lower index
+                if other and hydrophobic[other - 1] and abs(other - chain_index) > 1 \
+                        and not (other in new_pos and other < chain_index):
+                    delta -= 1
+            for pos in neighbor_positions(*old_pos[chain_index]):
+                other = old_occupant(pos)
+                if other and hydrophobic[other - 1] and abs(other - chain_index) > 1 \
+                        and not (other in new_pos and other < chain_index):
+                    delta += 1
+        return delta
+
+    def end_move(self, chain_index: int, position: Optional[Tuple[int, int]] = None, draw: Optional[float] = None) -> MoveOutcome:
         """
         Attempt to perform an end move for the amino acid at the specified chain index.
         The move is only performed if it is possible.
@@ -103,15 +215,29 @@ class Lattice:
 
         Args:
             chain_index (int): The chain index of the amino acid to move.
+            position (Optional[Tuple[int, int]], optional): The position to move to. Defaults to None,
+                for a random choice among the empty positions.
+            draw (Optional[float], optional): The uniform choosing among the empty positions when no position
+                is given. Defaults to None, for a draw from the random stream.
+
+        Returns:
+            MoveOutcome: The outcome of the move, not applied if nothing moved.
         """
         res_ref = is_end_move_possible(self, chain_index)
-        x, y = self.sequence.aa_coord[chain_index - 1]["x"], self.sequence.aa_coord[chain_index - 1]["y"]
-        possible_pos = find_empty_neighbors(self, self.sequence.aa_coord[res_ref - 1]["x"], self.sequence.aa_coord[res_ref - 1]["y"])
+        conf = self.sequence.conformation
+        x, y = conf.x[chain_index - 1], conf.y[chain_index - 1]
+        possible_pos = find_empty_neighbors(self, conf.x[res_ref - 1], conf.y[res_ref - 1])
+        if position is not None:
+            possible_pos = [position] if position in possible_pos else []
+            draw = 0.0  # nothing to choose, so nothing is drawn from the random stream
 
         if possible_pos:
-            execute_end_move(self, possible_pos, chain_index, x, y)
+            displaced = execute_end_move(self, possible_pos, chain_index, x, y, draw)
+            self.journal.extend(displaced)
+            return move_outcome("end", displaced)
+        return move_outcome("end", [])
 
-    def corner_move(self, chain_index: int) -> None:
+    def corner_move(self, chain_index: int) -> MoveOutcome:
         """
         Attempt to perform a corner move for the amino acid at the specified chain index.
         The move is only performed if it is possible.
@@ -120,21 +246,27 @@ class Lattice:
         Args:
             chain_index (int): The chain index of the amino acid to move.
 
+        Returns:
+            MoveOutcome: The outcome of the move, not applied if nothing moved.
+
         Raises:
             ValueError: If the amino acid is at the end of the chain, where a corner move is not possible.
         """
         if chain_index not in (1, self.sequence.length):
             res_i, res_iminus1, res_iplus1 = get_corner_aa_to_check(self, chain_index)
-            is_corner = are_corner(res_iminus1, res_iplus1)
+            is_corner = are_corner(self.sequence.conformation, res_iminus1, res_iplus1)
             
             if is_corner:
                 x_new, y_new = find_potential_corner(self, chain_index)
                 if check_occupancy(self, x_new, y_new):
-                    execute_corner_move(self, chain_index, res_i, x_new, y_new)
+                    displaced = execute_corner_move(self, chain_index, res_i, x_new, y_new)
+                    self.journal.extend(displaced)
+                    return move_outcome("corner", displaced)
+            return move_outcome("corner", [])
         else:
             raise ValueError("No Corner move possible. The amino acid is at the end of the chain")
 
-    def cks_move(self, chain_index: int) -> None:
+    def cks_move(self, chain_index: int, draw: Optional[float] = None) -> MoveOutcome:
         """
         Attempt to perform a Crankshaft move for the amino acid at the specified chain index.
         The move is only performed if it is possible.
@@ -142,6 +274,11 @@ class Lattice:
 
         Args:
             chain_index (int): The chain index of the amino acid to move.
+            draw (Optional[float], optional): Unused, a U turns to a single side on the square lattice.
+                Kept for the signature of `CubicLattice.cks_move`, which chooses among several sides.
+
+        Returns:
+            MoveOutcome: The outcome of the move, not applied if nothing moved.
 
         Raises:
             ValueError: If the amino acid is at the end of the chain, where a CKS move is not possible.
@@ -151,16 +288,21 @@ class Lattice:
             is_u_valid, x_new1, y_new1, x_new2, y_new2 = validate_U(self, res_iminus1, res_i, res_iplus1, res_next2, chain_index)
 
             if is_u_valid:
-                execute_u_move(self, chain_index, res_i, res_iplus1, x_new1, y_new1, x_new2, y_new2)
+                displaced = execute_u_move(self, chain_index, res_i, res_iplus1, x_new1, y_new1, x_new2, y_new2)
+                self.journal.extend(displaced)
+                return move_outcome("cks", displaced)
             elif chain_index != 2:
                 res_prev2, res_iminus1, res_i, res_iplus1 = get_alternative_positions(self, chain_index)
                 is_alt_u_valid, x_new1, y_new1, x_new2, y_new2 = validate_U(self, res_prev2, res_iminus1, res_i, res_iplus1, chain_index)
                 if is_alt_u_valid:
-                    execute_alternative_u_move(self, chain_index, res_i, res_iminus1, x_new1, y_new1, x_new2, y_new2)
+                    displaced = execute_alternative_u_move(self, chain_index, res_i, res_iminus1, x_new1, y_new1, x_new2, y_new2)
+                    self.journal.extend(displaced)
+                    return move_outcome("cks", displaced)
+            return move_outcome("cks", [])
         else:
             raise ValueError("No CKS move possible. The amino acid is at the end of the chain")
 
-    def pull_move(self, chain_index: int) -> None:
+    def pull_move(self, chain_index: int, draw: Optional[float] = None) -> MoveOutcome:
         """
         Attempt to perform a pull move for the amino acid at the specified chain index.
         The move is only performed if it is possible.
@@ -168,6 +310,12 @@ class Lattice:
 
         Args:
             chain_index (int): The chain index of the amino acid to move.
+            draw (Optional[float], optional): Unused, the site L is found without choice on the square lattice.
+                Kept for the signature of `CubicLattice.pull_move`, which chooses among several sites.
+
+        Returns:
+            MoveOutcome: The outcome of the move, with the residues displaced while propagating
+            the pull, not applied if nothing moved.
         """
         res_iminus2, res_iminus1, res_i, res_iplus1 = get_pull_aa_to_check(self, chain_index)
         pos_L, found_L = find_L_positions(self, res_i, res_iplus1)
@@ -177,19 +325,60 @@ class Lattice:
 
             if found_C:
                 if status_C == "C is res_iminus1":
-                    self.corner_move(chain_index)
+                    return self.corner_move(chain_index)._replace(kind="pull")
                 elif status_C == "empty":
-                    empty_pos = [(res_i["x"], res_i["y"]), (res_iminus1["x"], res_iminus1["y"])]
-                    execute_pull_move(self, chain_index, res_i, res_iminus1, pos_L, pos_C)
-                    if res_i["chain_index"] >= 3:
+                    conf = self.sequence.conformation
+                    empty_pos = [(conf.x[res_i], conf.y[res_i]), (conf.x[res_iminus1], conf.y[res_iminus1])]
+                    displaced = execute_pull_move(self, chain_index, res_i, res_iminus1, pos_L, pos_C)
+                    if chain_index >= 3:
                         loop_index = chain_index - 1
-                        propagate_pull(self, loop_index, empty_pos)
+                        displaced += propagate_pull(self, loop_index, empty_pos)
+                    self.journal.extend(displaced)
+                    return move_outcome("pull", displaced)
+        return move_outcome("pull", [])
 
-    def translation_check_and_apply(self) -> None:
+    def translation_check_and_apply(self) -> Tuple[int, int]:
         """
         Check if the protein has reached the edge of the lattice and translate the chain to the center if needed.
+        The translation is not journaled, so pending moves must be committed first.
+        A sparse lattice is unbounded and is never translated.
+
+        Returns:
+            Tuple[int, int]: The applied translation (dx, dy), (0, 0) if the chain was not moved.
         """
+        if self.sparse:
+            return 0, 0
         check_x, dx = need_translation_x(self)
         check_y, dy = need_translation_y(self)
         if check_x or check_y:
             translate_chain(self, dx, dy)
+            return dx, dy
+        return 0, 0
+
+
+def make_lattice(sequence: seq.Sequence, conformation: Optional[seq.Conformation] = None, sparse: Optional[bool] = None,
+                 rng: Optional[RandomStream] = None, dimension: Optional[int] = None) -> Lattice:
+    """
+    Build the lattice of a sequence: a square `Lattice`, or a `cubic_lattice.CubicLattice` for a dimension
+    other than 2.
+
+    Args:
+        sequence (seq.Sequence): The sequence of amino acids.
+        conformation (Optional[seq.Conformation], optional): The conformation to place on the lattice.
+            Defaults to None, in which case a random valid conformation is generated.
+        sparse (Optional[bool], optional): Whether to store the occupancy sparsely. Defaults to None, for sparse
+            from SPARSE_GRID_MIN_LENGTH residues on the square lattice, and always on other lattices.
+        rng (Optional[RandomStream], optional): The random stream of the random initialization and of the moves.
+            Defaults to None, for a new stream.
+        dimension (Optional[int], optional): The dimension of the lattice. Defaults to None, for the dimension of
+            the conformation, or 2 without conformation.
+
+    Returns:
+        Lattice: The lattice.
+    """
+    if dimension is None:
+        dimension = conformation.dimension if conformation is not None else 2
+    if dimension != 2:
+        from cubic_lattice import CubicLattice
+        return CubicLattice(sequence, conformation, sparse, rng, dimension)
+    return Lattice(sequence, conformation, sparse, rng)
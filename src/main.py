@@ -1,12 +1,20 @@
 """
-Main script to perform REMC search and visualize the results.
+Main script to perform REMC search, or population annealing with --annealing, and visualize the results.
+
+The plotting libraries are only imported to show or render the final conformation, so that `--help`, `--no_plot`
+runs and the worker processes start without loading them.
 """
 
 import sequence as seq
 import argparse
-from variables import *
-from visualisation import *
-from REMC_search import *
+from variables import (T_MIN, T_MAX, STEP, MAX_ITERATIONS, PROBABILITY, MC_BACKEND, DIMENSION, LADDER_TUNING, LADDER_TARGET_ACCEPTANCE,
+                       SEGMENT_SWEEPS, EXCHANGE_INTERVAL, COLD_BUDGET_FACTOR, WALL_TIME, MAX_ROUNDS, STAGNATION_ROUNDS,
+                       CHECKPOINT_INTERVAL, TELEMETRY_INTERVAL, PA_T_MAX, PA_T_MIN, PA_POPULATION, PA_TEMPERATURES, PA_SWEEPS, PA_WORKERS)
+from REMC_search import REMC_search, resume_REMC_search
+from population_annealing import population_annealing
+from ladder_tuning import LadderTuner
+from scheduling import ExchangeSchedule
+from telemetry import ConsoleObserver, JsonlObserver
 
 # Main program
 if __name__ == "__main__":
@@ -16,18 +24,91 @@ if __name__ == "__main__":
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument('--hpsequence', type = str, help = 'HP sequence')
     group.add_argument('--aasequence', type = str, help = 'AA sequence')
-    parser.add_argument('--optimal_energy', type = int, help = 'Target Energy', required=True)
+    group.add_argument('--resume', type = str, help = 'Continue the search saved in this checkpoint, with its settings (only the stop conditions, --parallel and the checkpoint options apply)')
+    parser.add_argument('--optimal_energy', type = int, help = 'Target Energy')
+    parser.add_argument('--wall_time', type = float, default = WALL_TIME, help = 'Wall-clock budget of the search, in seconds')
+    parser.add_argument('--max_rounds', type = int, default = MAX_ROUNDS, help = 'Maximum number of exchange rounds')
+    parser.add_argument('--stagnation', type = int, default = STAGNATION_ROUNDS, help = 'Stop after this many rounds without improvement')
+    parser.add_argument('--parallel', action = 'store_true', help = 'Run each replica in its own worker process')
+    parser.add_argument('--rejection_free', action = 'store_true', help = 'Draw among the legal moves weighted by their acceptance probability')
+    parser.add_argument('--backend', choices = ['python', 'compiled'], default = MC_BACKEND, help = 'Run the MC steps in Python or in the Numba-compiled kernel')
+    parser.add_argument('--dimension', type = int, choices = [2, 3], default = DIMENSION, help = 'Fold the sequence on the square (2) or the cubic (3) lattice')
+    parser.add_argument('--annealing', action = 'store_true', help = 'Run a population annealing from PA_T_MAX down to PA_T_MIN instead of the REMC search')
+    parser.add_argument('--population', type = int, default = PA_POPULATION, help = 'Number of walkers of the population annealing')
+    parser.add_argument('--temperatures', type = int, default = PA_TEMPERATURES, help = 'Number of temperatures of the population annealing')
+    parser.add_argument('--sweeps', type = int, default = PA_SWEEPS, help = 'Sweeps of n attempted moves of each walker at each temperature of the population annealing')
+    parser.add_argument('--workers', type = int, default = PA_WORKERS, help = 'Number of worker processes running the sweeps of the population annealing')
+    parser.add_argument('--adaptive_ladder', choices = ['acceptance', 'flux'], default = LADDER_TUNING, help = 'Tune the temperature ladder during a warm-up, to equalize the exchange acceptance or maximize the round-trip flux')
+    parser.add_argument('--target_acceptance', type = float, default = LADDER_TARGET_ACCEPTANCE, help = 'Exchange acceptance aimed at when resizing the ladder')
+    parser.add_argument('--resize_ladder', action = 'store_true', help = 'Let the adaptive ladder add or remove replicas to reach the target acceptance')
+    parser.add_argument('--segment_sweeps', type = float, help = 'Length of the MC segments at the hottest temperature, in sweeps of n attempted moves (default: MAX_ITERATIONS steps per segment)')
+    parser.add_argument('--exchange_interval', type = int, help = 'Number of MC segments between two exchange attempts')
+    parser.add_argument('--cold_factor', type = float, help = 'Segment length at the coldest temperature relative to the hottest one')
+    parser.add_argument('--seed', type = int, help = 'Seed of the random streams, for reproducible runs')
+    parser.add_argument('--checkpoint', type = str, help = 'File to save the state of the search to, periodically and when it stops (default with --resume: the resumed checkpoint)')
+    parser.add_argument('--checkpoint_interval', type = float, default = CHECKPOINT_INTERVAL, help = 'Minimum time between two checkpoints, in seconds')
+    parser.add_argument('--quiet', action = 'store_true', help = 'Do not print the progress of the search')
+    parser.add_argument('--telemetry', type = str, help = 'JSONL file to write the counters and timings of the search to, periodically and when it stops')
+    parser.add_argument('--telemetry_interval', type = float, default = TELEMETRY_INTERVAL, help = 'Minimum time between two snapshots of the counters, in seconds')
+    parser.add_argument('--no_plot', action = 'store_true', help = 'Do not show the final conformation, e.g. on a machine without display')
+    parser.add_argument('--plot_file', type = str, help = 'Write the final conformation to this PNG or SVG file instead of showing it')
 
     args = parser.parse_args()
-    
-    # Create the sequence object
-    if args.aasequence:
-        sequence = seq.Sequence(sequence = args.aasequence)
+    observers = [] if args.quiet else [ConsoleObserver()]
+    if args.telemetry is not None:
+        observers.append(JsonlObserver(args.telemetry))
+    if args.annealing and (args.resume is not None or args.checkpoint is not None):
+        parser.error('--annealing does not support --resume nor --checkpoint')
+    if args.resume is not None:
+        # Continue the saved search, with new stop conditions if given
+        stop_conditions = {name: value for name, value in (('energy_optimal', args.optimal_energy), ('wall_time', args.wall_time),
+                           ('max_rounds', args.max_rounds), ('stagnation_rounds', args.stagnation)) if value is not None}
+        result = resume_REMC_search(args.resume, parallel = args.parallel, checkpoint_path = args.checkpoint, checkpoint_interval = args.checkpoint_interval, observers = observers, telemetry_interval = args.telemetry_interval, **stop_conditions)
     else:
-        sequence = seq.Sequence(hp_sequence = args.hpsequence)
+        if not args.annealing and args.optimal_energy is None and args.wall_time is None and args.max_rounds is None and args.stagnation is None:
+            parser.error('at least one stop condition is required: --optimal_energy, --wall_time, --max_rounds or --stagnation')
+
+        # Create the sequence object
+        if args.aasequence:
+            sequence = seq.Sequence(sequence = args.aasequence)
+        else:
+            sequence = seq.Sequence(hp_sequence = args.hpsequence)
+
+        if args.dimension != 2 and (args.rejection_free or args.backend == 'compiled'):
+            parser.error('--rejection_free and --backend compiled only run on the square lattice (--dimension 2)')
+
+        if args.annealing:
+            # Run the population annealing, which stops at the end of its schedule
+            result = population_annealing(sequence, PA_T_MAX, PA_T_MIN, args.temperatures, population = args.population, sweeps = args.sweeps, probability = PROBABILITY, workers = args.workers, seed = args.seed, rejection_free = args.rejection_free, backend = args.backend, dimension = args.dimension, energy_optimal = args.optimal_energy, wall_time = args.wall_time, observers = observers)
+        else:
+            ladder_tuner = None
+            if args.adaptive_ladder is not None:
+                ladder_tuner = LadderTuner(args.adaptive_ladder, target_acceptance = args.target_acceptance, resize = args.resize_ladder)
+            elif args.resize_ladder:
+                parser.error('--resize_ladder requires --adaptive_ladder')
+
+            schedule = None
+            if args.segment_sweeps is not None or args.exchange_interval is not None or args.cold_factor is not None:
+                schedule = ExchangeSchedule(
+                    SEGMENT_SWEEPS if args.segment_sweeps is None else args.segment_sweeps,
+                    EXCHANGE_INTERVAL if args.exchange_interval is None else args.exchange_interval,
+                    COLD_BUDGET_FACTOR if args.cold_factor is None else args.cold_factor)
 
-    # Run the REMC search
-    result = REMC_search(sequence, T_MIN, T_MAX, STEP, energy_optimal = args.optimal_energy, max_iteration = MAX_ITERATIONS, probability = PROBABILITY)
+            # Run the REMC search
+            result = REMC_search(sequence, T_MIN, T_MAX, STEP, energy_optimal = args.optimal_energy, max_iteration = MAX_ITERATIONS, probability = PROBABILITY, parallel = args.parallel, seed = args.seed, rejection_free = args.rejection_free, backend = args.backend, dimension = args.dimension, wall_time = args.wall_time, max_rounds = args.max_rounds, stagnation_rounds = args.stagnation, ladder_tuner = ladder_tuner, schedule = schedule, checkpoint_path = args.checkpoint, checkpoint_interval = args.checkpoint_interval, observers = observers, telemetry_interval = args.telemetry_interval)
+    for observer in observers:
+        if isinstance(observer, JsonlObserver):
+            observer.close()
     print("FINAL ENERGY", result.energy)
+    print("STOP REASON", result.reason)
+    print("DISTINCT GROUND STATES", result.distinct_ground_states)
+    if args.annealing and result.free_energies:
+        print("FREE ENERGY", result.free_energies[-1])
+        print("POPULATION DIVERSITY", result.diversity[-1])
     # Visualize the conformation
-    visualize_lattice_graph(result)
+    if result.lattice is not None and args.plot_file is not None:
+        from render import render_lattice
+        render_lattice(result.lattice, args.plot_file)
+    elif result.lattice is not None and not args.no_plot:
+        from visualisation import visualize_lattice_graph
+        visualize_lattice_graph(result.lattice)
@@ -0,0 +1,361 @@
+"""
+Compiled backend of the Monte Carlo search: whole MC segments run in one native call.
+
+The kernel reproduces step for step the moves, energy changes and Metropolis criterion of
+`mc_search.run` on the dense lattice, working on the coordinate buffers and occupancy grid of
+the lattice in place. It is compiled with Numba when it is installed, and otherwise runs as
+plain Python, identical but slow, so that it can always be checked against the reference path,
+see `tests/test_mc_kernel.py`.
+"""
+
+import math
+from typing import Dict, Optional, Tuple
+import numpy as np
+from moves.move_utils import MOVE_KINDS, NEIGHBOR_OFFSETS, DIAGONAL_OFFSETS
+from variables import K_B
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """
+        Stand-in for `numba.njit` when Numba is not installed, leaving the function as is.
+        """
+        if args and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+BACKENDS = ("python", "compiled")
+
+# Index of each kind of move in the statistics of the kernel, in the order of MOVE_KINDS
+END, CORNER, CKS, PULL = range(4)
+
+
+@njit(cache=True)
+def _displace(grid, x, y, journal, size, chain_index, x_new, y_new):
+    """
+    Move a residue to an empty cell and journal the displacement.
+
+    Returns:
+        int: The new size of the journal.
+    """
+    journal[size, 0] = chain_index
+    journal[size, 1] = x[chain_index - 1]
+    journal[size, 2] = y[chain_index - 1]
+    journal[size, 3] = x_new
+    journal[size, 4] = y_new
+    grid[x_new, y_new] = chain_index
+    grid[x[chain_index - 1], y[chain_index - 1]] = 0
+    x[chain_index - 1] = x_new
+    y[chain_index - 1] = y_new
+    return size + 1
+
+
+@njit(cache=True)
+def _revert(grid, x, y, journal, size):
+    """
+    Undo the journaled displacements, in reverse order.
+    """
+    for k in range(size - 1, -1, -1):
+        grid[journal[k, 3], journal[k, 4]] = 0
+        grid[journal[k, 1], journal[k, 2]] = journal[k, 0]
+        x[journal[k, 0] - 1] = journal[k, 1]
+        y[journal[k, 0] - 1] = journal[k, 2]
+
+
+@njit(cache=True)
+def _replay(grid, x, y, journal, size):
+    """
+    Apply again the journaled displacements, in order, after `_revert`.
+    """
+    for k in range(size):
+        grid[journal[k, 1], journal[k, 2]] = 0
+        grid[journal[k, 3], journal[k, 4]] = journal[k, 0]
+        x[journal[k, 0] - 1] = journal[k, 3]
+        y[journal[k, 0] - 1] = journal[k, 4]
+
+
+@njit(cache=True)
+def _contacts(grid, x, y, hydrophobic, journal, size, moved):
+    """
+    Count the hydrophobic contacts involving at least one journaled residue, each contact once.
+    """
+    contacts = 0
+    for k in range(size):
+        chain_index = journal[k, 0]
+        if not hydrophobic[chain_index - 1]:
+            continue
+        i, j = x[chain_index - 1], y[chain_index - 1]
+        for di, dj in NEIGHBOR_OFFSETS:
+            other = grid[i + di, j + dj]
+            # Contacts between two moved residues are counted once, from the lower index
+            if other and hydrophobic[other - 1] and abs(other - chain_index) > 1 \
+                    and not (moved[other] and other < chain_index):
+                contacts += 1
+    return contacts
+
+
+@njit(cache=True)
+def _corner(grid, x, y, journal, chain_index):
+    """
+    Corner move, as `Lattice.corner_move`.
+    """
+    r = chain_index - 1
+    if abs(x[r - 1] - x[r + 1]) != 1 or abs(y[r - 1] - y[r + 1]) != 1:
+        return 0
+    if x[r] == x[r - 1]:
+        x_new, y_new = x[r + 1], y[r - 1]
+    else:
+        x_new, y_new = x[r - 1], y[r + 1]
+    if grid[x_new, y_new] != 0:
+        return 0
+    return _displace(grid, x, y, journal, 0, chain_index, x_new, y_new)
+
+
+@njit(cache=True)
+def _is_u(x, y, a, b, c, d):
+    """
+    Whether four residues form a U, as `are_U`.
+    """
+    return abs(x[a] - x[b]) + abs(y[a] - y[b]) == 1 and abs(x[b] - x[c]) + abs(y[b] - y[c]) == 1 \
+        and abs(x[c] - x[d]) + abs(y[c] - y[d]) == 1 and abs(x[d] - x[a]) + abs(y[d] - y[a]) == 1
+
+
+@njit(cache=True)
+def _flip_u(grid, x, y, journal, a, b, c, d):
+    """
+    Flip the residues b and c of the U a-b-c-d over a-d, if both cells are empty, as `validate_U`
+    followed by `execute_u_move`.
+    """
+    x1, y1 = 2 * x[a] - x[b], 2 * y[a] - y[b]
+    x2, y2 = 2 * x[d] - x[c], 2 * y[d] - y[c]
+    if grid[x1, y1] != 0 or grid[x2, y2] != 0:
+        return 0
+    size = _displace(grid, x, y, journal, 0, b + 1, x1, y1)
+    return _displace(grid, x, y, journal, size, c + 1, x2, y2)
+
+
+@njit(cache=True)
+def _cks(grid, x, y, journal, chain_index, n):
+    """
+    Crankshaft move, as `Lattice.cks_move`.
+    """
+    if chain_index >= n - 1:  # `validate_U` rejects both U of the last residues
+        return 0
+    r = chain_index - 1
+    if _is_u(x, y, r - 1, r, r + 1, r + 2):
+        size = _flip_u(grid, x, y, journal, r - 1, r, r + 1, r + 2)
+        if size:
+            return size
+    if chain_index != 2 and _is_u(x, y, r - 2, r - 1, r, r + 1):
+        return _flip_u(grid, x, y, journal, r - 2, r - 1, r, r + 1)
+    return 0
+
+
+@njit(cache=True)
+def _pull(grid, x, y, journal, chain_index):
+    """
+    Pull move towards the start of the chain, as `Lattice.pull_move`, including its fallback to a
+    corner move and the propagation of the pull.
+    """
+    r = chain_index - 1
+    # L: the first empty diagonal of residue r, in the order of `find_empty_diagonal`,
+    # that is an empty neighbour of residue r + 1
+    found = False
+    lx, ly = 0, 0
+    for di, dj in DIAGONAL_OFFSETS:
+        cx, cy = x[r] + di, y[r] + dj
+        if grid[cx, cy] == 0 and abs(cx - x[r + 1]) + abs(cy - y[r + 1]) == 1:
+            lx, ly = cx, cy
+            found = True
+            break
+    if not found:
+        return 0
+    # C: the first empty neighbour of L that is also an empty neighbour of residue r
+    found = False
+    cx, cy = 0, 0
+    for di, dj in NEIGHBOR_OFFSETS:
+        nx, ny = lx + di, ly + dj
+        if grid[nx, ny] == 0 and abs(nx - x[r]) + abs(ny - y[r]) == 1:
+            cx, cy = nx, ny
+            found = True
+            break
+    if not found:
+        if abs(lx - x[r - 1]) + abs(ly - y[r - 1]) == 1:  # C is residue r - 1
+            return _corner(grid, x, y, journal, chain_index)
+        return 0
+    # The two cells left, in the order they are filled while propagating the pull
+    free_x0, free_y0 = x[r], y[r]
+    free_x1, free_y1 = x[r - 1], y[r - 1]
+    size = _displace(grid, x, y, journal, 0, chain_index, lx, ly)
+    size = _displace(grid, x, y, journal, size, chain_index - 1, cx, cy)
+    loop_index = chain_index - 1
+    while chain_index >= 3 and loop_index >= 2:
+        a, b = loop_index - 1, loop_index - 2
+        if abs(x[a] - x[b]) + abs(y[a] - y[b]) == 1:
+            break
+        old_x, old_y = x[b], y[b]
+        size = _displace(grid, x, y, journal, size, b + 1, free_x0, free_y0)
+        free_x0, free_y0 = free_x1, free_y1
+        free_x1, free_y1 = old_x, old_y
+        loop_index -= 1
+    return size
+
+
+@njit(cache=True)
+def _end(grid, x, y, journal, chain_index, n, draw):
+    """
+    End move, as `Lattice.end_move` with the new position chosen by `draw`.
+    """
+    ref = 1 if chain_index == 1 else n - 2
+    count = 0
+    cells = np.empty((4, 2), dtype=np.int64)
+    for di, dj in NEIGHBOR_OFFSETS:
+        cx, cy = x[ref] + di, y[ref] + dj
+        if grid[cx, cy] == 0:
+            cells[count, 0] = cx
+            cells[count, 1] = cy
+            count += 1
+    if count == 0:
+        return 0
+    k = int(draw * count)
+    return _displace(grid, x, y, journal, 0, chain_index, cells[k, 0], cells[k, 1])
+
+
+@njit(cache=True)
+def _recenter(grid, x, y, n, lattice_size):
+    """
+    Translate the chain to the center of the grid if it reached an edge, as `Lattice.translation_check_and_apply`.
+    """
+    min_x, max_x, min_y, max_y = x[0], x[0], y[0], y[0]
+    for r in range(1, n):
+        min_x, max_x = min(min_x, x[r]), max(max_x, x[r])
+        min_y, max_y = min(min_y, y[r]), max(max_y, y[r])
+    center = lattice_size // 2
+    dx = center - (min_x + max_x) // 2 if max_x >= lattice_size - 2 or min_x < 1 else 0
+    dy = center - (min_y + max_y) // 2 if max_y >= lattice_size - 2 or min_y < 1 else 0
+    if dx == 0 and dy == 0:
+        return
+    for r in range(n):
+        grid[x[r], y[r]] = 0
+    for r in range(n):
+        x[r] += dx
+        y[r] += dy
+        grid[x[r], y[r]] = r + 1
+
+
+@njit(cache=True)
+def run_segment(grid, x, y, hydrophobic, residues, move_draws, acceptance_draws, temperature, probability,
+                energy, target_energy, has_target, move_stats, energies, accepted):
+    """
+    Run an MC segment, one step per entry of `residues`, updating the lattice in place.
+
+    Args:
+        grid (np.ndarray): The dense occupancy grid of the lattice, holding chain indices.
+        x (np.ndarray): The x-coordinates of the residues (int64).
+        y (np.ndarray): The y-coordinates of the residues (int64).
+        hydrophobic (np.ndarray): The hydrophobic mask of the residues (uint8).
+        residues (np.ndarray): The chain index of the residue to move at each step.
+        move_draws (np.ndarray): The uniform choosing the kind of move at each step.
+        acceptance_draws (np.ndarray): The uniform of the Metropolis criterion at each step.
+        temperature (float): The temperature of the search.
+        probability (float): The probability of performing a pull move.
+        energy (int): The energy of the starting conformation.
+        target_energy (int): The energy at which the segment stops, if `has_target`.
+        has_target (bool): Whether the segment stops at `target_energy`.
+        move_stats (np.ndarray): The proposed, applied and accepted moves of each kind, as a (4, 3)
+            array in the order of MOVE_KINDS, incremented in place.
+        energies (np.ndarray): Filled with the energy after each step.
+        accepted (np.ndarray): Filled with 1 for the steps whose move was accepted, 0 otherwise.
+
+    Returns:
+        Tuple[int, int]: The energy of the final conformation and the number of steps performed.
+    """
+    n = x.shape[0]
+    lattice_size = grid.shape[0]
+    journal = np.empty((n, 5), dtype=np.int64)
+    moved = np.zeros(n + 1, dtype=np.uint8)
+    corner_bound = probability + (1 - probability) / 2
+    steps = 0
+    for i in range(residues.shape[0]):
+        if has_target and energy == target_energy:
+            break
+        steps += 1
+        accepted[i] = 0
+        chain_index = residues[i]
+        draw = move_draws[i]
+        if chain_index == 1 or chain_index == n:
+            kind = END
+            size = _end(grid, x, y, journal, chain_index, n, draw)
+        elif draw < probability:
+            kind = PULL
+            size = _pull(grid, x, y, journal, chain_index)
+        elif draw < corner_bound:
+            kind = CORNER
+            size = _corner(grid, x, y, journal, chain_index)
+        else:
+            kind = CKS
+            size = _cks(grid, x, y, journal, chain_index, n)
+        move_stats[kind, 0] += 1
+        if size:
+            move_stats[kind, 1] += 1
+            # Energy change from the contacts of the moved residues, after then before the move
+            for k in range(size):
+                moved[journal[k, 0]] = 1
+            delta = -_contacts(grid, x, y, hydrophobic, journal, size, moved)
+            _revert(grid, x, y, journal, size)
+            delta += _contacts(grid, x, y, hydrophobic, journal, size, moved)
+            for k in range(size):
+                moved[journal[k, 0]] = 0
+            if delta <= 0 or acceptance_draws[i] < math.exp(-delta / (K_B * temperature)):
+                _replay(grid, x, y, journal, size)
+                energy += delta
+                move_stats[kind, 2] += 1
+                accepted[i] = 1
+                _recenter(grid, x, y, n, lattice_size)
+        energies[i] = energy
+    return energy, steps
+
+
+def run_lattice_segment(lattice, residues: np.ndarray, move_draws: np.ndarray, acceptance_draws: np.ndarray,
+                        temperature: float, probability: float, target_energy: Optional[int] = None) -> Tuple[int, Dict[str, Dict[str, int]], np.ndarray, np.ndarray]:
+    """
+    Run an MC segment with the kernel on a dense lattice, whose grid and coordinates are updated in place.
+
+    Args:
+        lattice: The lattice to search from, with its energy computed.
+        residues (np.ndarray): The chain index of the residue to move at each step.
+        move_draws (np.ndarray): The uniform choosing the kind of move at each step.
+        acceptance_draws (np.ndarray): The uniform of the Metropolis criterion at each step.
+        temperature (float): The temperature of the search.
+        probability (float): The probability of performing a pull move.
+        target_energy (Optional[int], optional): The energy at which the segment stops. Defaults to None.
+
+    Returns:
+        Tuple[int, Dict[str, Dict[str, int]], np.ndarray, np.ndarray]: The number of steps performed,
+        the proposed, applied and accepted moves of each kind, and for each step performed, the
+        energy after it and whether its move was accepted.
+
+    Raises:
+        ValueError: If the lattice is sparse, as the kernel only works on a dense grid.
+    """
+    if lattice.sparse:
+        raise ValueError("The compiled backend requires a dense lattice")
+    conformation = lattice.sequence.conformation
+    x = np.frombuffer(conformation.x, dtype=np.int64)
+    y = np.frombuffer(conformation.y, dtype=np.int64)
+    hydrophobic = np.frombuffer(conformation.hydrophobic, dtype=np.uint8)
+    move_stats = np.zeros((len(MOVE_KINDS), 3), dtype=np.int64)
+    energies = np.zeros(len(residues), dtype=np.int64)
+    accepted = np.zeros(len(residues), dtype=np.uint8)
+    energy, steps = run_segment(lattice.lattice, x, y, hydrophobic, np.asarray(residues, dtype=np.int64),
+                                np.asarray(move_draws, dtype=np.float64), np.asarray(acceptance_draws, dtype=np.float64),
+                                float(temperature), float(probability), int(lattice.energy),
+                                0 if target_energy is None else int(target_energy), target_energy is not None,
+                                move_stats, energies, accepted)
+    lattice.energy = int(energy)
+    stats = {kind: dict(zip(("proposed", "applied", "accepted"), move_stats[k].tolist())) for k, kind in enumerate(MOVE_KINDS)}
+    return int(steps), stats, energies[:steps], accepted[:steps]
@@ -0,0 +1,351 @@
+"""
+Enumeration of the legal moves of a lattice, kept up to date locally after each accepted move,
+and rejection-free (n-fold way) selection among them.
+"""
+
+import math
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+import lattice as lat
+from moves.move_utils import Displacement, MoveOutcome, find_empty_neighbors
+from variables import K_B
+
+# Cells around a residue whose occupancy decides whether its neighbours can move, and cells around a
+# displaced residue whose occupancy decides the energy change of the move
+FEASIBILITY_CELLS = tuple((dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+CONTACT_CELLS = ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1))
+
+
+class Move(NamedTuple):
+    """
+    A legal move, with the residues it displaces and the energy change it causes.
+    `position` is the target of an end move and None for the other kinds.
+    `proposal` is the probability that `mc_search.make_move` proposes this move in one MC step.
+    """
+    kind: str
+    chain_index: int
+    position: Optional[Tuple[int, int]]
+    displaced: Tuple[Displacement, ...]
+    delta_energy: int
+    proposal: float
+
+
+def acceptance_probability(delta_energy: float, temperature: float) -> float:
+    """
+    Probability that `mc_search.accept_conformation` accepts a move with a given energy change.
+
+    Args:
+        delta_energy (float): The energy change of the move.
+        temperature (float): The temperature of the search.
+
+    Returns:
+        float: The acceptance probability of the move.
+    """
+    if delta_energy <= 0:
+        return 1.0
+    return math.exp(-delta_energy / (K_B * temperature))
+
+
+class RateTree:
+    """
+    Sums of the rates of the residues over a binary tree, so that updating a rate and drawing a residue in
+    proportion to its rate both take O(log n).
+
+    Each node holds the sum of its two children, recomputed from them rather than adjusted by differences,
+    so that the sums only depend on the current rates and carry no rounding drift from past updates.
+
+    Attributes:
+        size (int): The number of leaves, a power of two at least the number of rates.
+        nodes (List[float]): The sums of the tree, the root at 1 and the rate of index i at leaf size + i.
+    """
+
+    def __init__(self, length: int) -> None:
+        """
+        Initialize a tree of zero rates.
+
+        Args:
+            length (int): The number of rates, indexed from 0.
+        """
+        self.size = 1
+        while self.size < length:
+            self.size *= 2
+        self.nodes = [0.0] * (2 * self.size)
+
+    @property
+    def total(self) -> float:
+        """
+        The sum of all rates.
+        """
+        return self.nodes[1]
+
+    def set(self, index: int, rate: float) -> None:
+        """
+        Set the rate of an index and update the sums above it.
+
+        Args:
+            index (int): The index of the rate.
+            rate (float): The new rate.
+        """
+        nodes = self.nodes
+        node = self.size + index
+        nodes[node] = rate
+        node //= 2
+        while node:
+            nodes[node] = nodes[2 * node] + nodes[2 * node + 1]
+            node //= 2
+
+    def find(self, draw: float) -> Tuple[int, float]:
+        """
+        Find the index whose share of the cumulated rates holds a draw.
+
+        Args:
+            draw (float): A value in [0, total).
+
+        Returns:
+            Tuple[int, float]: The index, and what is left of the draw past the rates of the indices before it.
+        """
+        nodes = self.nodes
+        node = 1
+        while node < self.size:
+            node *= 2
+            if draw >= nodes[node]:
+                draw -= nodes[node]
+                node += 1
+        return node - self.size, draw
+
+
+class MoveGenerator:
+    """
+    The legal moves of every residue of a lattice.
+
+    The moves of a residue are enumerated by applying each candidate to the lattice and reverting it.
+    Each residue also registers the residues and cells its moves depend on: the residues up to three
+    positions before and two after it and the residues its moves displace, the cells around the
+    residues up to two positions away from it, where the corner, U, L and C positions and the end
+    move targets lie, and the cells next to the old and new positions of the displaced residues,
+    whose occupants decide the energy change. After an accepted move, only the residues whose
+    footprint contains a moved residue or one of the cells it left or entered are enumerated again.
+    A translation of the chain shifts every position, so all residues are enumerated again.
+    The rates of the residues are summed in a `RateTree`, so that only the rates of the residues
+    enumerated again are updated, and a selection costs O(log n).
+
+    Attributes:
+        lattice (lat.Lattice): The lattice whose moves are enumerated.
+        probability (float): The probability of proposing a pull move, as in `mc_search`.
+        moves (List[List[Move]]): The legal moves of each residue, indexed by chain index.
+        rates (List[float]): The total rate of the moves of each residue at `temperature`, indexed by chain index.
+        rate_tree (RateTree): The sums of the rates, indexed by chain index.
+        temperature (Optional[float]): The temperature the rates were computed at.
+        evaluations (int): The number of energy changes computed while enumerating moves.
+    """
+
+    def __init__(self, lattice: lat.Lattice, probability: float) -> None:
+        """
+        Enumerate the legal moves of a lattice.
+
+        Args:
+            lattice (lat.Lattice): The lattice, with no pending move in its journal.
+            probability (float): The probability of proposing a pull move.
+        """
+        self.lattice = lattice
+        self.probability = probability
+        n = lattice.sequence.length
+        self.moves: List[List[Move]] = [[] for _ in range(n + 1)]
+        self.rates: List[float] = [0.0] * (n + 1)
+        self.rate_tree = RateTree(n + 1)
+        self.temperature: Optional[float] = None
+        self.evaluations = 0
+        self._footprint_residues: List[Set[int]] = [set() for _ in range(n + 1)]
+        self._footprint_cells: List[Set[Tuple[int, int]]] = [set() for _ in range(n + 1)]
+        self._residue_watchers: List[Set[int]] = [set() for _ in range(n + 1)]
+        self._cell_watchers: Dict[Tuple[int, int], Set[int]] = {}
+        self.refresh()
+
+    def __len__(self) -> int:
+        """
+        Return the number of legal moves.
+
+        Returns:
+            int: The number of legal moves over all residues.
+        """
+        return sum(len(moves) for moves in self.moves)
+
+    def legal_moves(self, chain_index: int) -> List[Move]:
+        """
+        Return the legal moves of a residue.
+
+        Args:
+            chain_index (int): The chain index of the residue.
+
+        Returns:
+            List[Move]: The legal moves of the residue.
+        """
+        return self.moves[chain_index]
+
+    def refresh(self) -> None:
+        """
+        Enumerate the legal moves of every residue again.
+        """
+        for chain_index in range(1, self.lattice.sequence.length + 1):
+            self._enumerate(chain_index)
+
+    def update(self, displaced: List[Displacement], shift: Tuple[int, int] = (0, 0)) -> None:
+        """
+        Update the legal moves after a move has been applied and committed.
+
+        Args:
+            displaced (List[Displacement]): The residues displaced by the move.
+            shift (Tuple[int, int], optional): The translation applied after the move. Defaults to (0, 0).
+        """
+        if shift != (0, 0):
+            self.refresh()
+            return
+        stale: Set[int] = set()
+        for chain_index, old, new in displaced:
+            stale |= self._residue_watchers[chain_index]
+            stale |= self._cell_watchers.get(old, set())
+            stale |= self._cell_watchers.get(new, set())
+        for chain_index in stale:
+            self._enumerate(chain_index)
+
+    def select(self, temperature: float) -> Optional[Tuple[Move, int]]:
+        """
+        Draw a move with probability proportional to its rate, i.e. its proposal probability times
+        its acceptance probability, along with the number of MC steps it stands for.
+
+        The number of steps of the Metropolis search until a move is accepted follows a geometric
+        distribution of parameter the total rate, and is drawn as such.
+
+        Args:
+            temperature (float): The temperature of the search.
+
+        Returns:
+            Optional[Tuple[Move, int]]: The move and the number of MC steps elapsed, None if no move can be accepted.
+        """
+        if temperature != self.temperature:
+            self.temperature = temperature
+            for chain_index in range(1, len(self.moves)):
+                self._rate(chain_index)
+        total = self.rate_tree.total
+        if total <= 0:
+            return None
+        chain_index, draw = self.rate_tree.find(self.lattice.rng.random() * total)
+        chain_index = min(chain_index, len(self.rates) - 1)
+        while self.rates[chain_index] <= 0:  # guard against rounding at the upper end
+            chain_index -= 1
+            draw = self.rates[chain_index]
+        moves = self.moves[chain_index]
+        move = moves[-1]
+        for candidate in moves:
+            draw -= candidate.proposal * acceptance_probability(candidate.delta_energy, temperature)
+            if draw < 0:
+                move = candidate
+                break
+        if total >= 1:
+            return move, 1
+        steps = 1 + int(math.log(1.0 - self.lattice.rng.random()) / math.log(1.0 - total))
+        return move, steps
+
+    def apply(self, move: Move) -> MoveOutcome:
+        """
+        Apply a move to the lattice. The move is journaled, to be committed or reverted by the caller.
+
+        Args:
+            move (Move): The move to apply.
+
+        Returns:
+            MoveOutcome: The outcome of the move.
+        """
+        if move.kind == "end":
+            return self.lattice.end_move(move.chain_index, move.position)
+        return getattr(self.lattice, f"{move.kind}_move")(move.chain_index)
+
+    def validate(self) -> None:
+        """
+        Check the legal moves against a full enumeration of a copy of the lattice.
+
+        Raises:
+            RuntimeError: If the moves of a residue are out of date.
+        """
+        reference = MoveGenerator(self.lattice.copy(), self.probability)
+        for chain_index in range(1, len(self.moves)):
+            if self.moves[chain_index] != reference.moves[chain_index]:
+                raise RuntimeError(f"Legal moves of residue {chain_index} are out of date")
+
+    def _enumerate(self, chain_index: int) -> None:
+        """
+        Enumerate the legal moves of a residue and register its footprint.
+
+        Args:
+            chain_index (int): The chain index of the residue.
+        """
+        lattice = self.lattice
+        n = lattice.sequence.length
+        conf = lattice.sequence.conformation
+        if chain_index in (1, n):
+            res_ref = 2 if chain_index == 1 else n - 1
+            targets = find_empty_neighbors(lattice, conf.x[res_ref - 1], conf.y[res_ref - 1])
+            candidates = [("end", position, 1 / (n * len(targets))) for position in targets]
+        else:
+            vshd = (1 - self.probability) / (2 * n)
+            candidates = [("corner", None, vshd), ("cks", None, vshd), ("pull", None, self.probability / n)]
+
+        moves = []
+        residues = set(range(max(1, chain_index - 3), min(n, chain_index + 2) + 1))
+        positions = set()  # old and new positions of the displaced residues
+        for kind, position, proposal in candidates:
+            move = Move(kind, chain_index, position, (), 0, proposal)
+            displaced = self.apply(move).displaced
+            if displaced:
+                delta_energy = lattice.calculate_delta_energy(displaced)
+                self.evaluations += 1
+                moves.append(move._replace(displaced=displaced, delta_energy=delta_energy))
+                moved = [index for index, _, _ in displaced]
+                residues.update(moved)
+                residues.add(max(1, min(moved) - 1))
+                for _, old, new in displaced:
+                    positions.add(old)
+                    positions.add(new)
+            lattice.revert()
+        self.moves[chain_index] = moves
+
+        cells = {(x + dx, y + dy) for x, y in positions for dx, dy in CONTACT_CELLS}
+        for index in range(max(1, chain_index - 2), min(n, chain_index + 2) + 1):
+            x, y = conf.x[index - 1], conf.y[index - 1]
+            cells.update((x + dx, y + dy) for dx, dy in FEASIBILITY_CELLS)
+        self._register(chain_index, residues, cells)
+        if self.temperature is not None:
+            self._rate(chain_index)
+
+    def _register(self, chain_index: int, residues: Set[int], cells: Set[Tuple[int, int]]) -> None:
+        """
+        Replace the footprint of a residue.
+
+        Args:
+            chain_index (int): The chain index of the residue.
+            residues (Set[int]): The residues its moves depend on.
+            cells (Set[Tuple[int, int]]): The cells its moves depend on.
+        """
+        for index in self._footprint_residues[chain_index] - residues:
+            self._residue_watchers[index].discard(chain_index)
+        for index in residues - self._footprint_residues[chain_index]:
+            self._residue_watchers[index].add(chain_index)
+        for cell in self._footprint_cells[chain_index] - cells:
+            watchers = self._cell_watchers[cell]
+            watchers.discard(chain_index)
+            if not watchers:
+                del self._cell_watchers[cell]
+        for cell in cells - self._footprint_cells[chain_index]:
+            self._cell_watchers.setdefault(cell, set()).add(chain_index)
+        self._footprint_residues[chain_index] = residues
+        self._footprint_cells[chain_index] = cells
+
+    def _rate(self, chain_index: int) -> None:
+        """
+        Compute the total rate of the moves of a residue at the current temperature.
+
+        Args:
+            chain_index (int): The chain index of the residue.
+        """
+        self.rates[chain_index] = sum(move.proposal * acceptance_probability(move.delta_energy, self.temperature)
+                                      for move in self.moves[chain_index])
+        self.rate_tree.set(chain_index, self.rates[chain_index])
@@ -2,7 +2,8 @@
 Utility functions for handling corner movements in a lattice-based system.
 """
 
-from typing import Tuple, Dict
+from typing import Tuple, List
+from moves.move_utils import Displacement
 
 def find_potential_corner(lattice, chain_index: int) -> Tuple[int, int]:
     """
@@ -15,47 +16,51 @@ def find_potential_corner(lattice, chain_index: int) -> Tuple[int, int]:
     Returns:
         Tuple[int, int]: The new (x, y) coordinates for the potential corner position.
     """
-    if lattice.sequence.aa_coord[chain_index - 1]["x"] == lattice.sequence.aa_coord[chain_index - 2]["x"]:
-        y_new = lattice.sequence.aa_coord[chain_index - 2]["y"]
-        x_new = lattice.sequence.aa_coord[chain_index]["x"]
+    x, y = lattice.sequence.conformation.x, lattice.sequence.conformation.y
+    if x[chain_index - 1] == x[chain_index - 2]:
+        y_new = y[chain_index - 2]
+        x_new = x[chain_index]
     else:
-        x_new = lattice.sequence.aa_coord[chain_index - 2]["x"]
-        y_new = lattice.sequence.aa_coord[chain_index]["y"]
+        x_new = x[chain_index - 2]
+        y_new = y[chain_index]
     return x_new, y_new
 
 
-def get_corner_aa_to_check(lattice, chain_index: int) -> Tuple[Dict[str, int], Dict[str, int], Dict[str, int]]:
+def get_corner_aa_to_check(lattice, chain_index: int) -> Tuple[int, int, int]:
     """
-    Retrieve residue coordinates needed to check for potential corner moves.
+    Retrieve residue indices needed to check for potential corner moves.
 
     Args:
         lattice: The lattice object containing sequence and grid information.
         chain_index (int): The index of the amino acid in the chain.
 
     Returns:
-        Tuple[Dict[str, int], Dict[str, int], Dict[str, int]]: The coordinates of the amino acid at `chain_index - 1`, 
-                                                               `chain_index - 2`, and `chain_index` respectively.
+        Tuple[int, int, int]: The indices of the amino acid at `chain_index - 1`, 
+                              `chain_index - 2`, and `chain_index` respectively.
     """
-    res_i = lattice.sequence.aa_coord[chain_index - 1]
-    res_iminus1 = lattice.sequence.aa_coord[chain_index - 2]
-    res_iplus1 = lattice.sequence.aa_coord[chain_index]
+    res_i = chain_index - 1
+    res_iminus1 = chain_index - 2
+    res_iplus1 = chain_index
     return res_i, res_iminus1, res_iplus1
 
 
-def execute_corner_move(lattice, chain_index: int, res_i: Dict[str, int], x_new: int, y_new: int) -> None:
+def execute_corner_move(lattice, chain_index: int, res_i: int, x_new: int, y_new: int) -> List[Displacement]:
     """
     Execute the corner move by updating the lattice grid and amino acid coordinates.
 
     Args:
         lattice: The lattice object containing sequence and grid information.
         chain_index (int): The index of the amino acid to be moved.
-        res_i (Dict[str, int]): The current coordinates of the amino acid.
+        res_i (int): The index of the amino acid to be moved in the sequence.
         x_new (int): The new x-coordinate for the amino acid.
         y_new (int): The new y-coordinate for the amino acid.
 
     Returns:
-        None
+        List[Displacement]: The residue displaced by the move.
     """
+    conf = lattice.sequence.conformation
+    old_pos = (conf.x[res_i], conf.y[res_i])
     lattice.lattice[x_new, y_new] = chain_index
-    lattice.lattice[res_i["x"], res_i["y"]] = 0
+    lattice.lattice[old_pos] = 0
     lattice.sequence.aa_coord_update(chain_index - 1, x_new, y_new)  # Update the coordinates of the amino acid in the sequence
+    return [(chain_index, old_pos, (x_new, y_new))]
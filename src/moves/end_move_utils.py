@@ -2,8 +2,8 @@
 Functions for handling end moves in a lattice-based amino acid chain system. 
 """
 
-from typing import List, Tuple
-import random as rd
+from typing import List, Optional, Tuple
+from moves.move_utils import Displacement
 
 def is_end_move_possible(lattice, chain_index: int) -> int:
     """
@@ -30,7 +30,8 @@ def is_end_move_possible(lattice, chain_index: int) -> int:
         raise ValueError("Impossible move. The amino acid is not at the end of the chain")
 
 
-def execute_end_move(lattice, possible_pos: List[Tuple[int, int]], chain_index: int, old_x: int, old_y: int) -> None:
+def execute_end_move(lattice, possible_pos: List[Tuple[int, int]], chain_index: int, old_x: int, old_y: int,
+                     draw: Optional[float] = None) -> List[Displacement]:
     """
     Execute a move for an amino acid at the end of the chain to a new position in the lattice.
 
@@ -40,12 +41,15 @@ def execute_end_move(lattice, possible_pos: List[Tuple[int, int]], chain_index:
         chain_index (int): The index of the amino acid to be moved.
         old_x (int): The current x-coordinate of the amino acid.
         old_y (int): The current y-coordinate of the amino acid.
+        draw (Optional[float], optional): The uniform choosing the new position. Defaults to None,
+            for a draw from the random stream of the lattice.
 
     Returns:
-        None
+        List[Displacement]: The residue displaced by the move.
     """
-    new_pos = rd.choice(possible_pos)
+    new_pos = possible_pos[int(draw * len(possible_pos))] if draw is not None else lattice.rng.choice(possible_pos)
     x_new, y_new = new_pos[0], new_pos[1]
     lattice.lattice[old_x, old_y] = 0
     lattice.lattice[x_new, y_new] = chain_index
-    lattice.sequence.aa_coord_update(chain_index - 1, x_new, y_new)  # Update the coordinates of the amino acid in the sequence
\ No newline at end of file
+    lattice.sequence.aa_coord_update(chain_index - 1, x_new, y_new)  # Update the coordinates of the amino acid in the sequence
+    return [(chain_index, (old_x, old_y), (x_new, y_new))]
@@ -2,64 +2,125 @@
 General utility functions for handling movements in a lattice-based system.
 """
 
-from typing import Dict, List, Tuple
+from typing import List, NamedTuple, Tuple
 import numpy as np
 
-def is_hydrophobic(res: Dict[str, str]) -> bool:
+# A residue relocated by a move: (chain_index, (x_old, y_old), (x_new, y_new))
+Displacement = Tuple[int, Tuple[int, int], Tuple[int, int]]
+
+MOVE_KINDS = ("end", "corner", "cks", "pull")
+
+# Offsets of the cells adjacent to a cell of the square lattice, and of its diagonal cells, in the order
+# the moves scan them, which fixes the trajectory of a seed (see `occupancy.FlatGrid` for any dimension)
+NEIGHBOR_OFFSETS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+DIAGONAL_OFFSETS = ((-1, -1), (1, 1), (-1, 1), (1, -1))
+
+
+class MoveOutcome(NamedTuple):
+    """
+    The result of a move attempt: whether the lattice changed, the kind of move attempted,
+    and the residues it displaced.
+    """
+    applied: bool
+    kind: str
+    displaced: Tuple[Displacement, ...] = ()
+
+    @property
+    def residues(self) -> Tuple[int, ...]:
+        """
+        The chain indices of the displaced residues.
+        """
+        return tuple(chain_index for chain_index, _, _ in self.displaced)
+
+    @property
+    def old_cells(self) -> Tuple[Tuple[int, int], ...]:
+        """
+        The cells the displaced residues left.
+        """
+        return tuple(old for _, old, _ in self.displaced)
+
+    @property
+    def new_cells(self) -> Tuple[Tuple[int, int], ...]:
+        """
+        The cells the displaced residues entered.
+        """
+        return tuple(new for _, _, new in self.displaced)
+
+
+def move_outcome(kind: str, displaced: List[Displacement]) -> MoveOutcome:
+    """
+    Build the outcome of a move attempt from the residues it displaced.
+
+    Args:
+        kind (str): The kind of move attempted, one of MOVE_KINDS.
+        displaced (List[Displacement]): The residues displaced, empty if nothing moved.
+
+    Returns:
+        MoveOutcome: The outcome of the move attempt.
+    """
+    return MoveOutcome(bool(displaced), kind, tuple(displaced))
+
+
+def is_hydrophobic(conf, res: int) -> bool:
     """
     Check if a given amino acid is hydrophobic.
 
     Args:
-        res (Dict[str, str]): A dictionary containing information about an amino acid, 
-                              with 'type' being a key indicating its hydrophobicity.
+        conf: The conformation holding the coordinates and hydrophobicity of the chain.
+        res (int): The index of the amino acid.
 
     Returns:
         bool: True if the amino acid is hydrophobic (indicated by 'H'), False otherwise.
     """
-    return res['type'] == 'H'
+    return conf.hydrophobic[res] == 1
 
 
-def are_topological_neighbors(res1: Dict[str, int], res2: Dict[str, int]) -> bool:
+def are_topological_neighbors(conf, res1: int, res2: int) -> bool:
     """
     Check if two amino acids are topological neighbors, meaning they are adjacent 
     on a grid (either horizontally or vertically).
 
     Args:
-        res1 (Dict[str, int]): A dictionary representing the first amino acid.
-        res2 (Dict[str, int]): A dictionary representing the second amino acid.
+        conf: The conformation holding the coordinates of the chain.
+        res1 (int): The index of the first amino acid.
+        res2 (int): The index of the second amino acid.
 
     Returns:
         bool: True if the amino acids are topological neighbors, False otherwise.
     """
-    return abs(res1['x'] - res2['x']) + abs(res1['y'] - res2['y']) == 1
+    x, y = conf.x, conf.y
+    return abs(x[res1] - x[res2]) + abs(y[res1] - y[res2]) == 1
 
 
-def are_not_connected_neighbors(res1: Dict[str, int], res2: Dict[str, int]) -> bool:
+def are_not_connected_neighbors(res1: int, res2: int) -> bool:
     """
     Check if two amino acids are directly connected or not.
 
     Args:
-        res1 (Dict[str, int]): A dictionary representing the first amino acid.
-        res2 (Dict[str, int]): A dictionary representing the second amino acid.
+        res1 (int): The index of the first amino acid.
+        res2 (int): The index of the second amino acid.
 
     Returns:
         bool: True if the amino acids are connected, False otherwise.
     """
-    return abs(res1['index'] - res2['index']) > 1
+    return abs(res1 - res2) > 1
 
 
-def are_corner(res1: Dict[str, int], res2: Dict[str, int]) -> bool:
+def are_corner(conf, res1: int, res2: int) -> bool:
     """
     Check if two amino acids are positioned at a potential corner.
 
     Args:
-        res1 (Dict[str, int]): A dictionary representing the first amino acid.
-        res2 (Dict[str, int]): A dictionary representing the second amino acid.
+        conf: The conformation holding the coordinates of the chain.
+        res1 (int): The index of the first amino acid.
+        res2 (int): The index of the second amino acid.
 
     Returns:
         bool: True if the amino acids are in a corner, False otherwise.
     """
-    return (abs(res1['x'] - res2['x']) + abs(res1['y'] - res2['y']) == 2) and (res1['x'] != res2['x']) and (res1['y'] != res2['y'])
+    dx = conf.x[res1] - conf.x[res2]
+    dy = conf.y[res1] - conf.y[res2]
+    return abs(dx) == 1 and abs(dy) == 1
 
 
 def check_occupancy(lattice, i: int, j: int) -> bool:
@@ -87,17 +148,14 @@ def find_empty_diagonal(lattice, i: int, j: int) -> List[Tuple[int, int]]:
         j (int): The y-coordinate of the current position.
 
     Returns:
-        List[Tuple[int, int]]: A list of tuples representing the coordinates of the empty diagonal positions.
+        List[Tuple[int, int]]: A list of tuples representing the coordinates of the empty diagonal positions,
+        in the order of DIAGONAL_OFFSETS.
     """
+    grid = lattice.lattice
     possible_pos = []
-    if lattice.lattice[i-1, j-1] == 0:
-        possible_pos.append((i-1, j-1))
-    if lattice.lattice[i+1, j+1] == 0:
-        possible_pos.append((i+1, j+1))
-    if lattice.lattice[i-1, j+1] == 0:
-        possible_pos.append((i-1, j+1))
-    if lattice.lattice[i+1, j-1] == 0:
-        possible_pos.append((i+1, j-1))
+    for di, dj in DIAGONAL_OFFSETS:
+        if grid[i + di, j + dj] == 0:
+            possible_pos.append((i + di, j + dj))
     return possible_pos
 
 
@@ -111,77 +169,94 @@ def find_empty_neighbors(lattice, i: int, j: int) -> List[Tuple[int, int]]:
         j (int): The y-coordinate of the current position.
 
     Returns:
-        List[Tuple[int, int]]: A list of tuples representing the coordinates of the empty neighboring positions.
+        List[Tuple[int, int]]: A list of tuples representing the coordinates of the empty neighboring positions,
+        in the order of NEIGHBOR_OFFSETS.
     """
+    grid = lattice.lattice
     possible_pos = []
-    if lattice.lattice[i-1, j] == 0:
-        possible_pos.append((i-1, j))
-    if lattice.lattice[i+1, j] == 0:
-        possible_pos.append((i+1, j))
-    if lattice.lattice[i, j-1] == 0:
-        possible_pos.append((i, j-1))
-    if lattice.lattice[i, j+1] == 0:
-        possible_pos.append((i, j+1))
+    for di, dj in NEIGHBOR_OFFSETS:
+        if grid[i + di, j + dj] == 0:
+            possible_pos.append((i + di, j + dj))
     return possible_pos
 
 
-def relative_position(res1: Dict[str, int], res2: Dict[str, int]) -> Tuple[int, int]:
+def neighbor_positions(i: int, j: int) -> List[Tuple[int, int]]:
+    """
+    List the four positions adjacent (horizontally or vertically) to a given location.
+
+    Args:
+        i (int): The x-coordinate of the position.
+        j (int): The y-coordinate of the position.
+
+    Returns:
+        List[Tuple[int, int]]: The coordinates of the neighboring positions.
+    """
+    return [(i + di, j + dj) for di, dj in NEIGHBOR_OFFSETS]
+
+
+def relative_position(conf, res1: int, res2: int) -> Tuple[int, int]:
     """
     Calculate the relative position of one amino acid compared to another.
 
     Args:
-        res1 (Dict[str, int]): A dictionary representing the first amino acid.
-        res2 (Dict[str, int]): A dictionary representing the second amino acid.
+        conf: The conformation holding the coordinates of the chain.
+        res1 (int): The index of the first amino acid.
+        res2 (int): The index of the second amino acid.
 
     Returns:
         Tuple[int, int]: A tuple representing the relative position as (dx, dy).
     """
-    dx = res1['x'] - res2['x']
-    dy = res1['y'] - res2['y']
+    dx = conf.x[res1] - conf.x[res2]
+    dy = conf.y[res1] - conf.y[res2]
     return dx, dy
 
 
-def move(lattice, res_to_be_moved: Dict[str, int], place_to_move: Tuple[int, int]) -> None:
+def move(lattice, res_to_be_moved: int, place_to_move: Tuple[int, int]) -> None:
     """
     Move an amino acid to a new position in the lattice. 
     It only updates the lattice. We will update the amino acid's coordinates separately.
 
     Args:
         lattice: The lattice object containing the grid structure.
-        res_to_be_moved (Dict[str, int]): A dictionary representing the amino acid to be moved.
+        res_to_be_moved (int): The index of the amino acid to be moved.
         place_to_move (Tuple[int, int]): A tuple representing the coordinates of the new position.
 
     Returns:
         None
     """
-    lattice.lattice[place_to_move[0], place_to_move[1]] = res_to_be_moved["chain_index"]
+    lattice.lattice[place_to_move[0], place_to_move[1]] = res_to_be_moved + 1
 
 
-def free_position(lattice, res_to_free: Dict[str, int]) -> None:
+def free_position(lattice, res_to_free: int) -> None:
     """
     Free the position occupied by a given amino acid in the lattice.
 
     Args:
         lattice: The lattice object containing the grid structure.
-        res_to_free (Dict[str, int]): A dictionary representing the amino acid to be freed.
+        res_to_free (int): The index of the amino acid to be freed.
 
     Returns:
         None
     """
-    lattice.lattice[res_to_free["x"], res_to_free["y"]] = 0
+    conf = lattice.sequence.conformation
+    lattice.lattice[conf.x[res_to_free], conf.y[res_to_free]] = 0
 
 
 def translate_chain(lattice, x, y):
     # translate the lattice by x and y to recenter the conformation
-    lattice.lattice = np.roll(lattice.lattice, x, axis = 0)
-    lattice.lattice = np.roll(lattice.lattice, y, axis = 1)
-    # update the coordinates of the amino acids in the sequence object
-    for i in range(lattice.sequence.length):
-        lattice.sequence.aa_coord_update(i, lattice.sequence.aa_coord[i]["x"] + x, lattice.sequence.aa_coord[i]["y"] + y)
+    if lattice.sparse:
+        lattice.lattice.cells = {(i + x, j + y): chain_index for (i, j), chain_index in lattice.lattice.cells.items()}
+    else:
+        lattice.lattice = np.roll(lattice.lattice, x, axis = 0)
+        lattice.lattice = np.roll(lattice.lattice, y, axis = 1)
+    # update the coordinates of the amino acids in the conformation buffers
+    conf = lattice.sequence.conformation
+    np.frombuffer(conf.x, dtype=np.int64)[:] += x
+    np.frombuffer(conf.y, dtype=np.int64)[:] += y
 
 
 def need_translation_x(lattice):
-    list_x = [temp_dict["x"] for temp_dict in lattice.sequence.aa_coord]
+    list_x = lattice.sequence.conformation.x
     max_x = max(list_x)
     min_x = min(list_x)
     center = lattice.size // 2
@@ -193,7 +268,7 @@ def need_translation_x(lattice):
         return False, 0
 
 def need_translation_y(lattice):
-    list_y = [temp_dict["y"] for temp_dict in lattice.sequence.aa_coord]
+    list_y = lattice.sequence.conformation.y
     max_y = max(list_y)
     min_y = min(list_y)
     center = lattice.size // 2
@@ -202,4 +277,4 @@ def need_translation_y(lattice):
     if max_y >= lattice.size - 2 or min_y < 1:
         return True, dy
     else:
-        return False, 0
\ No newline at end of file
+        return False, 0
@@ -0,0 +1,297 @@
+"""
+Occupancy of the lattice: a sparse alternative to the dense grid for long chains, and a flat buffer
+addressed by site index for lattices of any dimension.
+"""
+
+from typing import Dict, Iterator, List, Tuple, Union
+import numpy as np
+
+# Side of the virtual box a sparse `FlatGrid` indexes its sites in, so that coordinates in
+# [-SPARSE_SIDE // 2, SPARSE_SIDE // 2) have distinct sites
+SPARSE_SIDE = 1 << 20
+
+
+class SparseGrid:
+    """
+    Occupancy of an unbounded square lattice, holding only the occupied cells.
+
+    It is indexed like the dense grid, `grid[x, y]` giving the chain index of the residue at (x, y)
+    and 0 for an empty cell, so that the moves work on both. Memory is proportional to the number of
+    residues rather than to the area of the box, and coordinates may grow without bound, so the chain
+    never needs to be recentered.
+
+    Attributes:
+        cells (Dict[Tuple[int, int], int]): The chain index of the residue in each occupied cell.
+    """
+
+    __slots__ = ("cells",)
+
+    def __init__(self) -> None:
+        """
+        Initialize an empty lattice.
+        """
+        self.cells: Dict[Tuple[int, int], int] = {}
+
+    def __getitem__(self, position: Tuple[int, int]) -> int:
+        """
+        Return the occupant of a cell.
+
+        Args:
+            position (Tuple[int, int]): The (x, y) coordinates of the cell.
+
+        Returns:
+            int: The chain index of the residue in the cell, 0 if it is empty.
+        """
+        return self.cells.get(position, 0)
+
+    def __setitem__(self, position: Tuple[int, int], chain_index: int) -> None:
+        """
+        Set the occupant of a cell.
+
+        Args:
+            position (Tuple[int, int]): The (x, y) coordinates of the cell.
+            chain_index (int): The chain index of the residue, 0 to empty the cell.
+        """
+        if chain_index:
+            self.cells[position] = chain_index
+        else:
+            self.cells.pop(position, None)
+
+    def __len__(self) -> int:
+        """
+        Return the number of occupied cells.
+
+        Returns:
+            int: The number of occupied cells.
+        """
+        return len(self.cells)
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        """
+        Iterate over the occupied cells.
+
+        Returns:
+            Iterator[Tuple[int, int]]: The coordinates of the occupied cells.
+        """
+        return iter(self.cells)
+
+    def __str__(self) -> str:
+        """
+        Return the string representation of the occupied bounding box.
+
+        Returns:
+            str: The string representation of the occupied bounding box.
+        """
+        return str(self.to_numpy())
+
+    def fill(self, value: int) -> None:
+        """
+        Empty every cell, as `np.ndarray.fill(0)` does for the dense grid.
+
+        Args:
+            value (int): Must be 0.
+
+        Raises:
+            ValueError: If the value is not 0, as a sparse lattice cannot fill every cell.
+        """
+        if value != 0:
+            raise ValueError("A sparse lattice can only be filled with 0")
+        self.cells.clear()
+
+    def copy(self) -> "SparseGrid":
+        """
+        Return a copy of the lattice.
+
+        Returns:
+            SparseGrid: The copied lattice.
+        """
+        new = SparseGrid()
+        new.cells = self.cells.copy()
+        return new
+
+    def to_numpy(self) -> np.ndarray:
+        """
+        Build the dense grid of the occupied bounding box.
+
+        Returns:
+            np.ndarray: The chain indices of the residues in the bounding box, 0 for empty cells.
+        """
+        if not self.cells:
+            return np.zeros((0, 0), dtype=int)
+        xs, ys = zip(*self.cells)
+        grid = np.zeros((max(xs) - min(xs) + 1, max(ys) - min(ys) + 1), dtype=int)
+        grid[np.array(xs) - min(xs), np.array(ys) - min(ys)] = list(self.cells.values())
+        return grid
+
+
+class _Cells(dict):
+    """
+    Occupied sites of a sparse `FlatGrid`, reading 0 for the empty ones without storing them.
+    """
+
+    __slots__ = ()
+
+    def __missing__(self, site: int) -> int:
+        return 0
+
+
+class FlatGrid:
+    """
+    Occupancy of a hypercubic lattice of any dimension as a flat buffer indexed by site.
+
+    The site of the cell at coordinates (c_0, ..., c_{d-1}) is sum((c_k + origin) * strides[k]), so that the
+    neighbours of a site are found by adding the precomputed `offsets` to it, one per axis and direction,
+    whatever the dimension, and its diagonal sites by adding the `diagonals`. `cells[site]` is the chain index
+    of the residue at the site, 0 if it is empty.
+
+    A dense grid holds a list of side ** dimension sites, and the chain must be kept away from its faces, as
+    offsets spill over to the next row there. A sparse grid holds only the occupied sites in a dictionary, over
+    a virtual box of side SPARSE_SIDE centered on the origin, so that its memory grows with the chain and the
+    chain never needs recentering.
+
+    Attributes:
+        dimension (int): The dimension of the lattice.
+        side (int): The number of sites along each axis.
+        origin (int): The shift of the coordinates, so that sites are non-negative.
+        sparse (bool): Whether only the occupied sites are stored.
+        strides (Tuple[int, ...]): The site offset of a step along each axis.
+        offsets (Tuple[int, ...]): The site offsets of the neighbours, -stride then +stride along each axis.
+        diagonals (Tuple[int, ...]): The site offsets of the diagonal sites, one step along each of two axes.
+        cells (Union[List[int], Dict[int, int]]): The chain index of the residue at each site.
+    """
+
+    __slots__ = ("dimension", "side", "origin", "sparse", "strides", "offsets", "diagonals", "cells")
+
+    def __init__(self, side: int, dimension: int, sparse: bool = False) -> None:
+        """
+        Initialize an empty lattice.
+
+        Args:
+            side (int): The number of sites along each axis of a dense grid, ignored for a sparse one.
+            dimension (int): The dimension of the lattice.
+            sparse (bool, optional): Whether to store only the occupied sites. Defaults to False.
+        """
+        self.dimension = dimension
+        self.sparse = sparse
+        self.side = SPARSE_SIDE if sparse else side
+        self.origin = SPARSE_SIDE // 2 if sparse else 0
+        self.strides = tuple(self.side ** (dimension - 1 - axis) for axis in range(dimension))
+        self.offsets = tuple(sign * stride for stride in self.strides for sign in (-1, 1))
+        self.diagonals = tuple(first + second for index, first in enumerate(self.offsets)
+                               for second in self.offsets[index // 2 * 2 + 2:])
+        self.cells: Union[List[int], Dict[int, int]] = _Cells() if sparse else [0] * self.side ** dimension
+
+    def site(self, position: Tuple[int, ...]) -> int:
+        """
+        Return the site of a cell.
+
+        Args:
+            position (Tuple[int, ...]): The coordinates of the cell.
+
+        Returns:
+            int: The site of the cell.
+        """
+        return sum((coordinate + self.origin) * stride for coordinate, stride in zip(position, self.strides))
+
+    def position(self, site: int) -> Tuple[int, ...]:
+        """
+        Return the coordinates of a site.
+
+        Args:
+            site (int): The site.
+
+        Returns:
+            Tuple[int, ...]: The coordinates of the cell.
+        """
+        return tuple(site // stride % self.side - self.origin for stride in self.strides)
+
+    def __getitem__(self, position: Tuple[int, ...]) -> int:
+        """
+        Return the occupant of a cell, like the dense grid.
+
+        Args:
+            position (Tuple[int, ...]): The coordinates of the cell.
+
+        Returns:
+            int: The chain index of the residue in the cell, 0 if it is empty.
+        """
+        return self.cells[self.site(position)]
+
+    def __setitem__(self, position: Tuple[int, ...], chain_index: int) -> None:
+        """
+        Set the occupant of a cell.
+
+        Args:
+            position (Tuple[int, ...]): The coordinates of the cell.
+            chain_index (int): The chain index of the residue, 0 to empty the cell.
+        """
+        self.put(self.site(position), chain_index)
+
+    def put(self, site: int, chain_index: int) -> None:
+        """
+        Set the occupant of a site.
+
+        Args:
+            site (int): The site.
+            chain_index (int): The chain index of the residue, 0 to empty the site.
+        """
+        if chain_index or not self.sparse:
+            self.cells[site] = chain_index
+        else:
+            self.cells.pop(site, None)
+
+    def fill(self, value: int) -> None:
+        """
+        Empty every site.
+
+        Args:
+            value (int): Must be 0.
+
+        Raises:
+            ValueError: If the value is not 0.
+        """
+        if value != 0:
+            raise ValueError("A lattice can only be filled with 0")
+        if self.sparse:
+            self.cells.clear()
+        else:
+            self.cells = [0] * len(self.cells)
+
+    def copy(self) -> "FlatGrid":
+        """
+        Return a copy of the lattice.
+
+        Returns:
+            FlatGrid: The copied lattice.
+        """
+        new = FlatGrid.__new__(FlatGrid)
+        for name in FlatGrid.__slots__:
+            setattr(new, name, getattr(self, name))
+        new.cells = self.cells.copy()
+        return new
+
+    def __str__(self) -> str:
+        """
+        Return the string representation of the occupied bounding box.
+
+        Returns:
+            str: The string representation of the occupied bounding box.
+        """
+        return str(self.to_numpy())
+
+    def to_numpy(self) -> np.ndarray:
+        """
+        Build the dense grid of the occupied bounding box.
+
+        Returns:
+            np.ndarray: The chain indices of the residues in the bounding box, 0 for empty cells.
+        """
+        occupied = [(site, chain_index) for site, chain_index in
+                    (self.cells.items() if self.sparse else enumerate(self.cells)) if chain_index]
+        if not occupied:
+            return np.zeros((0,) * self.dimension, dtype=int)
+        coords = np.array([self.position(site) for site, _ in occupied])
+        coords -= coords.min(axis=0)
+        grid = np.zeros(coords.max(axis=0) + 1, dtype=int)
+        grid[tuple(coords.T)] = [chain_index for _, chain_index in occupied]
+        return grid
@@ -0,0 +1,497 @@
+"""
+Population annealing search: a large population of walkers, cooled together through a schedule of temperatures
+and resampled by their Boltzmann weights at each temperature, as an alternative to the replica exchange of
+`REMC_search` that scales with the number of walkers and of cores.
+
+The annealing runs from PA_T_MAX, where the chain is mostly unfolded, down to PA_T_MIN, a wider range than the
+T_MAX and T_MIN of the REMC search, so that the population is resampled in steps small enough for the Boltzmann
+weights to hold and large enough for the annealing to cool the walkers.
+"""
+
+import math
+import multiprocessing as mp
+import signal
+import time
+import numpy as np
+import sequence as seq
+import lattice as lat
+import MC_search as mc
+from canonical import EnergyCache, GroundStateRegistry, canonical_key
+from energy import batch_energy
+from initialization import random_conformations
+from random_streams import RandomStream
+from stopping import StopCriteria
+from telemetry import Telemetry, ConsoleObserver, Observer
+from variables import (K_B, PROBABILITY, PA_T_MAX, PA_T_MIN, PA_POPULATION, PA_TEMPERATURES, PA_SWEEPS, PA_WORKERS,
+                       REJECTION_FREE, MC_BACKEND, DIMENSION, WALL_TIME)
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+def annealing_schedule(Tmax: float, Tmin: float, nb_temperatures: int) -> List[float]:
+    """
+    Generate the temperatures of an annealing, evenly spaced in inverse temperature from the hottest to the coldest,
+    so that the steps are shorter where the population changes the least.
+
+    Args:
+        Tmax (float): The first, hottest temperature.
+        Tmin (float): The last, coldest temperature.
+        nb_temperatures (int): The number of temperatures.
+
+    Returns:
+        List[float]: The temperatures, from Tmax down to Tmin.
+
+    Raises:
+        ValueError: If the number of temperatures is not positive, or a temperature is not positive.
+    """
+    if nb_temperatures < 1:
+        raise ValueError(f"The annealing needs at least one temperature, got {nb_temperatures}")
+    if Tmin <= 0 or Tmax <= 0:
+        raise ValueError(f"The temperatures must be positive, got {Tmax} and {Tmin}")
+    if nb_temperatures == 1:
+        return [float(Tmin)]
+    betas = np.linspace(1 / Tmax, 1 / Tmin, nb_temperatures)
+    return [float(1 / beta) for beta in betas]
+
+
+def resample(energies: np.ndarray, delta_beta: float, rng: np.random.Generator) -> Tuple[np.ndarray, float]:
+    """
+    Draw the walkers of the population at the next temperature, each walker being copied in proportion to its
+    Boltzmann weight exp(-delta_beta * E), by systematic resampling, which keeps the size of the population and
+    adds the least noise.
+
+    Args:
+        energies (np.ndarray): The energy of each walker.
+        delta_beta (float): The step in inverse temperature, 1 / (K_B * T_next) - 1 / (K_B * T).
+        rng (np.random.Generator): The generator of the resampling.
+
+    Returns:
+        Tuple[np.ndarray, float]: The index of the walker each new walker is copied from, in increasing order,
+        and the log of the mean weight, the log of the ratio of the partition functions at the two temperatures.
+    """
+    exponent = -delta_beta * np.asarray(energies, dtype=float)
+    shift = exponent.max()
+    weights = np.exp(exponent - shift)
+    log_mean_weight = float(shift + math.log(weights.mean()))
+    cumulative = np.cumsum(weights)
+    cumulative /= cumulative[-1]
+    size = len(weights)
+    positions = (rng.random() + np.arange(size)) / size
+    ancestors = np.minimum(np.searchsorted(cumulative, positions, side="right"), size - 1)
+    return ancestors, log_mean_weight
+
+
+def family_entropy(families: np.ndarray) -> float:
+    """
+    Compute the entropy of the families of a population, a walker belonging to the family of the initial walker
+    it descends from. It is ln R for a population of R walkers of distinct families, and drops as a few families
+    take over the population.
+
+    Args:
+        families (np.ndarray): The index of the initial walker each walker descends from.
+
+    Returns:
+        float: The entropy -sum(nu * ln(nu)) of the fractions nu of the population in each family.
+    """
+    counts = np.bincount(families)
+    fractions = counts[counts > 0] / len(families)
+    return float(-(fractions * np.log(fractions)).sum())
+
+
+class WalkerChunk:
+    """
+    The MC sweeps of a contiguous chunk of the population, run on one lattice the walkers are loaded on in turn,
+    with the Metropolis acceptance of `mc_search`.
+
+    Walker i draws its moves at temperature step k from a stream seeded by (k, i) only, so that the population
+    evolves the same whatever the number of chunks it is split into.
+
+    Attributes:
+        sequence (seq.Sequence): The sequence folded.
+        probability (float): The probability of performing a pull move.
+        sweeps (int): The sweeps of n attempted moves of each walker at each temperature.
+        entropy (int): The entropy of the seed of the annealing.
+        rejection_free (bool): Whether the walkers draw among their legal moves without rejections.
+        backend (str): Whether the walkers run their sweeps in Python or in the compiled kernel.
+        energy_cache (EnergyCache): The cache of the energies of the walkers, looked up when a walker is loaded.
+        lattice (Optional[lat.Lattice]): The lattice the walkers are loaded on, built for the first walker.
+        move_stats (Dict[str, Dict[str, int]]): The moves proposed, applied and accepted by kind, over all walkers.
+        steps (int): The MC steps performed, over all walkers.
+    """
+
+    def __init__(self, sequence: seq.Sequence, probability: float, sweeps: int, entropy: int,
+                 rejection_free: bool = REJECTION_FREE, backend: str = MC_BACKEND) -> None:
+        """
+        Initialize the chunk.
+
+        Args:
+            sequence (seq.Sequence): The sequence folded.
+            probability (float): The probability of performing a pull move.
+            sweeps (int): The sweeps of n attempted moves of each walker at each temperature.
+            entropy (int): The entropy of the seed of the annealing.
+            rejection_free (bool, optional): Whether the walkers draw among their legal moves without rejections.
+                Defaults to REJECTION_FREE.
+            backend (str, optional): "python" or "compiled", see `mc_search.run_compiled`. Defaults to MC_BACKEND.
+        """
+        self.sequence = sequence
+        self.probability = probability
+        self.sweeps = sweeps
+        self.entropy = entropy
+        self.rejection_free = rejection_free
+        self.backend = backend
+        self.energy_cache = EnergyCache()
+        self.lattice: Optional[lat.Lattice] = None
+        self.move_stats: Dict[str, Dict[str, int]] = {}
+        self.steps = 0
+
+    def sweep(self, step: int, temperature: float, first: int, coordinates: np.ndarray,
+              energies: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Run the sweeps of every walker of the chunk at one temperature.
+
+        Args:
+            step (int): The index of the temperature in the schedule.
+            temperature (float): The temperature.
+            first (int): The index in the population of the first walker of the chunk.
+            coordinates (np.ndarray): The (m, n, d) coordinates of the m walkers of the chunk.
+            energies (np.ndarray): Their energies.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The coordinates and energies of the walkers after their sweeps.
+        """
+        coordinates = coordinates.copy()
+        energies = energies.copy()
+        for j in range(len(coordinates)):
+            conformation = seq.Conformation.from_numpy(self.sequence.hp_sequence, coordinates[j])
+            stream = RandomStream(np.random.SeedSequence(self.entropy, spawn_key=(step, first + j)))
+            if self.lattice is None:
+                self.lattice = lat.make_lattice(self.sequence, conformation, sparse=False if self.backend == "compiled" else None, rng=stream)
+            else:
+                self.lattice.load(conformation, int(energies[j]))
+            search = mc.mc_search(self.lattice, temperature, self.probability, self.sweeps * self.sequence.length,
+                                  trajectory_mode="off", rejection_free=self.rejection_free, rng=stream,
+                                  backend=self.backend, energy_cache=self.energy_cache)
+            search.run()
+            coordinates[j] = search.lattice.sequence.conformation.to_numpy()
+            energies[j] = search.lattice.energy
+            self.steps += search.time
+            for kind, stats in search.move_stats.items():
+                totals = self.move_stats.setdefault(kind, {"proposed": 0, "applied": 0, "accepted": 0})
+                for name, count in stats.items():
+                    totals[name] += count
+        return coordinates, energies
+
+    def counters(self) -> Tuple[Dict[str, Dict[str, int]], int, Dict[str, object]]:
+        """
+        Return the counters of the chunk.
+
+        Returns:
+            Tuple[Dict[str, Dict[str, int]], int, Dict[str, object]]: The move statistics, the MC steps and the
+            statistics of the energy cache.
+        """
+        return self.move_stats, self.steps, self.energy_cache.stats()
+
+
+def _chunk_worker(conn, chunk: WalkerChunk) -> None:
+    """
+    Serve the commands sent by a `WalkerPool` for one chunk of the population until it is closed.
+
+    Commands are (name, payload) tuples:
+    - ("sweep", (step, temperature, first, coordinates, energies)): run `WalkerChunk.sweep` and send back the
+      coordinates and energies of the walkers.
+    - ("close", None): send back the counters of the chunk, see `WalkerChunk.counters`, and stop.
+
+    SIGINT is ignored, so that an annealing interrupted in the parent process can still finish its temperature
+    and close the pool.
+
+    Args:
+        conn: The worker end of the pipe connected to the pool.
+        chunk (WalkerChunk): The chunk hosted by the worker.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        command, payload = conn.recv()
+        if command == "sweep":
+            conn.send(chunk.sweep(*payload))
+        elif command == "close":
+            conn.send(chunk.counters())
+            break
+    conn.close()
+
+
+class WalkerPool:
+    """
+    Pool of persistent worker processes, each running the sweeps of a contiguous chunk of the population.
+
+    The population is held in the parent process as arrays of coordinates and energies, which are resampled
+    there and split into one chunk per worker at each temperature. Only these arrays travel between processes.
+    With a single worker, the chunk runs in the parent process.
+
+    Attributes:
+        chunk (WalkerChunk): The settings of the sweeps, and the chunk run in the parent process with a single worker.
+        workers (int): The number of chunks the population is split into.
+    """
+
+    def __init__(self, chunk: WalkerChunk, workers: int = 1) -> None:
+        """
+        Start the workers, each with its own copy of the chunk.
+
+        Args:
+            chunk (WalkerChunk): The settings of the sweeps.
+            workers (int, optional): The number of worker processes. Defaults to 1, to run in the parent process.
+        """
+        self.chunk = chunk
+        self.workers = max(1, workers)
+        self._connections = []
+        self._processes = []
+        self._counters = []
+        if self.workers > 1:
+            for _ in range(self.workers):
+                parent_conn, child_conn = mp.Pipe()
+                process = mp.Process(target=_chunk_worker, args=(child_conn, chunk), daemon=True)
+                process.start()
+                child_conn.close()
+                self._connections.append(parent_conn)
+                self._processes.append(process)
+
+    def __enter__(self) -> "WalkerPool":
+        """
+        Return the pool, to be closed when leaving the `with` block.
+        """
+        return self
+
+    def __exit__(self, *exc) -> None:
+        """
+        Close the pool.
+        """
+        self.close()
+
+    def sweep(self, step: int, temperature: float, coordinates: np.ndarray, energies: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Run the sweeps of the whole population at one temperature, the chunks concurrently.
+
+        Args:
+            step (int): The index of the temperature in the schedule.
+            temperature (float): The temperature.
+            coordinates (np.ndarray): The (R, n, d) coordinates of the R walkers.
+            energies (np.ndarray): Their energies.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The coordinates and energies of the walkers after their sweeps.
+        """
+        if not self._connections:
+            return self.chunk.sweep(step, temperature, 0, coordinates, energies)
+        bounds = np.linspace(0, len(coordinates), len(self._connections) + 1).astype(int)
+        for conn, first, last in zip(self._connections, bounds[:-1], bounds[1:]):
+            conn.send(("sweep", (step, temperature, int(first), coordinates[first:last], energies[first:last])))
+        results = [conn.recv() for conn in self._connections]
+        return np.concatenate([result[0] for result in results]), np.concatenate([result[1] for result in results])
+
+    def counters(self) -> Dict[str, object]:
+        """
+        Gather the counters of the chunks, once the pool is closed.
+
+        Returns:
+            Dict[str, object]: The MC steps, the moves attempted, applied, not applicable (`noop`) and accepted by
+            kind of move, and the statistics of the energy caches, summed over the chunks.
+        """
+        moves: Dict[str, Dict[str, int]] = {}
+        cache: Dict[str, object] = {name: 0 for name in ("size", "maxsize", "hits", "misses", "evictions")}
+        steps = 0
+        for move_stats, chunk_steps, cache_stats in self._counters or [self.chunk.counters()]:
+            steps += chunk_steps
+            for kind, stats in move_stats.items():
+                totals = moves.setdefault(kind, {"attempted": 0, "applied": 0, "noop": 0, "accepted": 0})
+                totals["attempted"] += stats["proposed"]
+                totals["applied"] += stats["applied"]
+                totals["noop"] += stats["proposed"] - stats["applied"]
+                totals["accepted"] += stats["accepted"]
+            for name in cache:
+                cache[name] += cache_stats[name]
+        lookups = cache["hits"] + cache["misses"]
+        cache["hit_rate"] = cache["hits"] / lookups if lookups else 0.0
+        return {"steps": steps, "moves": moves, "cache": cache}
+
+    def close(self) -> None:
+        """
+        Stop the workers and bring the counters of their chunks back to the parent process.
+        """
+        for conn in self._connections:
+            conn.send(("close", None))
+            self._counters.append(conn.recv())
+            conn.close()
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
+
+
+class AnnealingResult(NamedTuple):
+    """
+    The outcome of a population annealing: the best conformation found, on a lattice, its energy, why the annealing
+    stopped (one of `stopping.STOP_REASONS`, "max_rounds" once the schedule is done), the number of temperatures
+    annealed through, the wall-clock time spent, in seconds, the size of the population, the temperatures annealed
+    through, the estimate of the dimensionless free energy beta * F at each of them, relative to the first one, the
+    diversity of the population at each of them (see `population_annealing`), the time spent in each phase, the
+    distinct conformations of the best energy found, up to GROUND_STATE_LIMIT, and their number.
+    """
+    lattice: Optional[lat.Lattice]
+    energy: float
+    reason: str
+    steps: int
+    seconds: float
+    population: int
+    temperatures: List[float]
+    free_energies: List[float]
+    diversity: List[Dict[str, float]]
+    timings: Dict[str, float]
+    ground_states: Tuple[seq.Conformation, ...] = ()
+    distinct_ground_states: int = 0
+
+
+def population_annealing(
+    sequence: seq.Sequence,
+    Tmax: float = PA_T_MAX,
+    Tmin: float = PA_T_MIN,
+    nb_temperatures: int = PA_TEMPERATURES,
+    population: int = PA_POPULATION,
+    sweeps: int = PA_SWEEPS,
+    probability: float = PROBABILITY,
+    workers: int = PA_WORKERS,
+    seed: Optional[int] = None,
+    rejection_free: bool = REJECTION_FREE,
+    backend: str = MC_BACKEND,
+    dimension: int = DIMENSION,
+    energy_optimal: Optional[float] = None,
+    wall_time: Optional[float] = WALL_TIME,
+    observers: Optional[List[Observer]] = None
+) -> AnnealingResult:
+    """
+    Perform a population annealing search to find the lattice conformation with the lowest energy.
+
+    A population of walkers starts from independent random conformations at Tmax. At each temperature of the
+    schedule, see `annealing_schedule`, the population is first resampled by the Boltzmann weights of the
+    walkers for the step in inverse temperature, see `resample`, then every walker runs `sweeps` sweeps of the
+    moves of `mc_search` at the new temperature. The sweeps run in `workers` processes, each on a chunk of the
+    population, and the result does not depend on their number.
+
+    The weights are exp(-(beta_next - beta) * E), of inverse temperature beta = 1 / (K_B * T), as the exchanges
+    of `REMC_search`, for a step small enough that they vary by factors of order one across the population.
+    Their mean at each step estimates the ratio of the partition functions of the two temperatures, whose logs
+    add up to the estimate of the free energy beta * F at each temperature, relative to the first one.
+
+    The diversity of the population is measured at each temperature by the number of families left, the walkers
+    descending from the same initial walker, the entropy of the family sizes, see `family_entropy`, and the number
+    of distinct conformations, by canonical key, see `canonical`.
+
+    The annealing stops after the coldest temperature, or earlier when the target energy is reached, the
+    wall-clock budget is spent, or a SIGINT or SIGTERM is received, checked after each temperature.
+
+    Args:
+        sequence (seq.Sequence): The sequence to fold.
+        Tmax (float, optional): The first, hottest temperature. Defaults to PA_T_MAX.
+        Tmin (float, optional): The last, coldest temperature. Defaults to PA_T_MIN.
+        nb_temperatures (int, optional): The number of temperatures of the schedule. Defaults to PA_TEMPERATURES.
+        population (int, optional): The number of walkers. Defaults to PA_POPULATION.
+        sweeps (int, optional): The sweeps of n attempted moves of each walker at each temperature. Defaults to PA_SWEEPS.
+        probability (float, optional): The probability of performing a pull move. Defaults to PROBABILITY.
+        workers (int, optional): The number of worker processes running the sweeps. Defaults to PA_WORKERS, 1 to run
+            them in the calling process.
+        seed (Optional[int], optional): The seed of the annealing, for reproducible runs. Defaults to None.
+        rejection_free (bool, optional): Whether the walkers draw among their legal moves without rejections,
+            see `mc_search.run_rejection_free`. Defaults to REJECTION_FREE.
+        backend (str, optional): Whether the walkers run their sweeps in Python or in the compiled kernel,
+            see `mc_search.run_compiled`. Defaults to MC_BACKEND.
+        dimension (int, optional): 2 to fold the sequence on the square lattice, 3 on the cubic lattice. Defaults to DIMENSION.
+        energy_optimal (Optional[float], optional): The target energy to achieve. Defaults to None, to anneal
+            through the whole schedule.
+        wall_time (Optional[float], optional): The wall-clock budget of the annealing, in seconds. Defaults to WALL_TIME.
+        observers (Optional[List[Observer]], optional): The callables the events of the annealing are passed to.
+            Defaults to None, for a `ConsoleObserver` printing the progress. An empty list runs the annealing quietly.
+
+    Returns:
+        AnnealingResult: The best conformation found, with its energy, the free energy estimates and the diversity
+        of the population.
+
+    Raises:
+        ValueError: If the population or the number of sweeps is not positive, or the schedule is invalid, see
+            `annealing_schedule`.
+    """
+    if population < 1:
+        raise ValueError(f"The population needs at least one walker, got {population}")
+    if sweeps < 1:
+        raise ValueError(f"The walkers need at least one sweep per temperature, got {sweeps}")
+    temperatures = annealing_schedule(Tmax, Tmin, nb_temperatures)
+    criteria = StopCriteria(energy_optimal, wall_time, len(temperatures))
+    telemetry = Telemetry([ConsoleObserver()] if observers is None else observers)
+    ground_states = GroundStateRegistry()
+
+    # One stream for the initial conformations and one for the resampling, the walkers seeding their own
+    # streams from the entropy of the root and their place in the population, see `WalkerChunk`
+    root_seed = np.random.SeedSequence(seed)
+    initial_seed, resampling_seed = root_seed.spawn(2)
+    resampling_rng = np.random.default_rng(resampling_seed)
+    hydrophobic = np.frombuffer(sequence.conformation.hydrophobic, dtype=np.uint8)
+    coordinates = np.stack([conformation.to_numpy() for conformation in
+                            random_conformations(sequence, population, RandomStream(initial_seed), dimension)])
+    energies = batch_energy(coordinates, hydrophobic)
+    families = np.arange(population)
+
+    energy_best = float("inf")
+    coordinates_best = None
+    beta_free_energy = 0.0
+    free_energies: List[float] = []
+    diversity: List[Dict[str, float]] = []
+    chunk = WalkerChunk(sequence, probability, sweeps, root_seed.entropy, rejection_free, backend)
+    reason = None
+    with WalkerPool(chunk, workers) as pool:
+        with criteria.catch_signals():
+            criteria.start()
+            telemetry.emit("start", sequence=sequence.hp_sequence, length=sequence.length, dimension=dimension,
+                           population=population, workers=pool.workers, temperatures=temperatures, resumed=False,
+                           round=0, elapsed=0.0, energy_best=None)
+            for step, temperature in enumerate(temperatures):
+                start = time.perf_counter()
+                if step > 0:
+                    ancestors, log_ratio = resample(energies, (1 / temperature - 1 / temperatures[step - 1]) / K_B,
+                                                      resampling_rng)
+                    coordinates = coordinates[ancestors]
+                    energies = energies[ancestors]
+                    families = families[ancestors]
+                    beta_free_energy -= log_ratio
+                telemetry.timings["resampling"] += time.perf_counter() - start
+
+                start = time.perf_counter()
+                coordinates, energies = pool.sweep(step, temperature, coordinates, energies)
+                telemetry.timings["mc"] += time.perf_counter() - start
+
+                keys = [canonical_key(seq.Conformation.from_numpy(sequence.hp_sequence, walker)) for walker in coordinates]
+                best = int(np.argmin(energies))
+                for walker in np.flatnonzero(energies == energies[best]):
+                    ground_states.offer_conformation(seq.Conformation.from_numpy(sequence.hp_sequence, coordinates[walker]),
+                                                     int(energies[walker]), keys[walker])
+                if energies[best] < energy_best:
+                    energy_best = int(energies[best])
+                    coordinates_best = coordinates[best].copy()
+                    telemetry.emit("improvement", round=step, replica=best, energy=energy_best)
+                free_energies.append(beta_free_energy)
+                diversity.append({"families": int(len(np.unique(families))), "family_entropy": family_entropy(families),
+                                  "distinct_conformations": len(set(keys))})
+                telemetry.emit("anneal", step=step, temperature=temperature, elapsed=criteria.elapsed,
+                               energy_mean=float(energies.mean()), energy_best=energy_best,
+                               free_energy=beta_free_energy, **diversity[-1])
+                reason = criteria.check(energy_best, step + 1)
+                if reason is not None:
+                    break
+    lattice_best = None
+    if coordinates_best is not None:
+        lattice_best = lat.make_lattice(sequence, seq.Conformation.from_numpy(sequence.hp_sequence, coordinates_best), rng=RandomStream(0))
+        lattice_best.energy = energy_best
+    counters = pool.counters()
+    if telemetry.enabled:
+        telemetry.emit("stop", reason=reason, round=len(free_energies), elapsed=criteria.elapsed, energy_best=energy_best,
+                       timings=dict(telemetry.timings), population=population, free_energy=beta_free_energy,
+                       diversity=diversity[-1], moves=counters["moves"], steps=counters["steps"],
+                       cache=counters["cache"], ground_states=len(ground_states))
+    return AnnealingResult(lattice_best, energy_best, reason, len(free_energies), criteria.elapsed, population,
+                           temperatures[:len(free_energies)], free_energies, diversity, dict(telemetry.timings),
+                           tuple(ground_states.conformations), len(ground_states))
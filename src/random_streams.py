@@ -0,0 +1,159 @@
+"""
+Seedable random streams, one per replica, backed by NumPy generators and drawn in blocks.
+"""
+
+from typing import Dict, List, MutableSequence, Optional, Sequence, TypeVar, Union
+import numpy as np
+from variables import RANDOM_BLOCK_SIZE
+
+T = TypeVar("T")
+
+
+class RandomStream:
+    """
+    An independent random stream, exposing the draws of the `random` module used by the search.
+
+    Uniforms are drawn from a `numpy.random.Generator` in blocks of `block_size` and handed out
+    one at a time, so that a draw costs a list lookup instead of a call into the generator. Code
+    that needs many draws at once can also use `generator` directly. The stream, including its
+    pending block, is picklable, so a replica carries its stream into a worker process and back.
+    Its `state` is a small dictionary that restores it exactly, pending block included, without
+    holding the block itself.
+
+    Attributes:
+        generator (np.random.Generator): The generator of the stream.
+        block_size (int): The number of uniforms drawn at once.
+    """
+
+    __slots__ = ("generator", "block_size", "_block", "_next", "_block_state")
+
+    def __init__(self, seed: Union[None, int, np.random.SeedSequence] = None, block_size: int = RANDOM_BLOCK_SIZE) -> None:
+        """
+        Initialize the stream.
+
+        Args:
+            seed (Union[None, int, np.random.SeedSequence], optional): The seed of the stream. Defaults to None,
+                for fresh entropy from the operating system, see `numpy.random.SeedSequence`.
+            block_size (int, optional): The number of uniforms drawn at once. Defaults to RANDOM_BLOCK_SIZE.
+        """
+        if seed is None:
+            seed = np.random.SeedSequence()
+        self.generator = np.random.default_rng(seed)
+        self.block_size = block_size
+        self._block: List[float] = []
+        self._next = 0
+        # State of the generator when the pending block was drawn, to draw it again on restore
+        self._block_state: Optional[Dict] = None
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "RandomStream":
+        """
+        Build a stream from the state of another one.
+
+        Args:
+            state (Dict): The state, as returned by `state`.
+
+        Returns:
+            RandomStream: A stream drawing the same numbers as the stream the state was taken from.
+        """
+        stream = cls(0, state["block_size"])
+        stream.restore(state)
+        return stream
+
+    def state(self) -> Dict:
+        """
+        Return the state of the stream, as plain values that can be stored as JSON.
+
+        Returns:
+            Dict: The state of the generator and the position in the pending block.
+        """
+        return {
+            "generator": self.generator.bit_generator.state,
+            "block_state": self._block_state,
+            "block_size": self.block_size,
+            "block_length": len(self._block),
+            "next": self._next,
+        }
+
+    def restore(self, state: Dict) -> None:
+        """
+        Restore the stream to a state returned by `state`, drawing the pending block again.
+
+        Args:
+            state (Dict): The state of the stream.
+        """
+        self.block_size = state["block_size"]
+        self._block_state = state["block_state"]
+        self._block = []
+        if self._block_state is not None:
+            self.generator.bit_generator.state = self._block_state
+            self._block = self.generator.random(state["block_length"]).tolist()
+        self._next = state["next"]
+        self.generator.bit_generator.state = state["generator"]
+
+    def random(self) -> float:
+        """
+        Draw a uniform float in [0, 1).
+
+        Returns:
+            float: The drawn float.
+        """
+        if self._next == len(self._block):
+            self._block_state = self.generator.bit_generator.state
+            self._block = self.generator.random(self.block_size).tolist()
+            self._next = 0
+        value = self._block[self._next]
+        self._next += 1
+        return value
+
+    def randint(self, a: int, b: int) -> int:
+        """
+        Draw an integer in [a, b], both included.
+
+        Args:
+            a (int): The lowest value.
+            b (int): The highest value.
+
+        Returns:
+            int: The drawn integer.
+        """
+        return a + int(self.random() * (b - a + 1))
+
+    def choice(self, items: Sequence[T]) -> T:
+        """
+        Draw an item of a non-empty sequence.
+
+        Args:
+            items (Sequence[T]): The sequence.
+
+        Returns:
+            T: The drawn item.
+        """
+        return items[int(self.random() * len(items))]
+
+    def shuffle(self, items: MutableSequence) -> None:
+        """
+        Shuffle a sequence in place.
+
+        Args:
+            items (MutableSequence): The sequence.
+        """
+        for i in range(len(items) - 1, 0, -1):
+            j = int(self.random() * (i + 1))
+            items[i], items[j] = items[j], items[i]
+
+
+def spawn_streams(seed: Union[None, int, np.random.SeedSequence], k: int) -> List[RandomStream]:
+    """
+    Spawn independent random streams from one root seed, e.g. one per replica.
+
+    Args:
+        seed (Union[None, int, np.random.SeedSequence]): The root seed. None for a seed drawn from the operating
+            system. A `SeedSequence` can be passed to spawn more streams later, each call giving new streams.
+        k (int): The number of streams.
+
+    Returns:
+        List[RandomStream]: The k streams.
+    """
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return [RandomStream(child) for child in root.spawn(k)]
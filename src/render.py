@@ -0,0 +1,404 @@
+"""
+Headless rendering of conformations to PNG or SVG images, and of trajectories to GIF or MP4 animations.
+
+The chains are drawn straight from their coordinates on an off-screen Matplotlib canvas, without a display
+or a graph of the chain, and animations are written frame by frame, so that only the current frame is held
+in memory whatever the length of the trajectory.
+
+Example:
+    python src/render.py results.jsonl --output_dir plots --format svg
+    python src/render.py trajectory.jsonl --animation trajectory.gif --every 10
+"""
+
+import argparse
+import json
+import os
+import re
+from typing import Dict, Iterable, Optional, Tuple, Union
+import numpy as np
+from matplotlib import animation
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import GifImagePlugin, Image
+import sequence as seq
+from trajectory import read_trajectory
+from variables import RENDER_SIZE, RENDER_DPI, ANIMATION_FPS
+
+IMAGE_FORMATS = ("png", "svg")
+ANIMATION_FORMATS = ("gif", "mp4")
+# Colors of the residues, as in the interactive view
+RESIDUE_COLORS = {"H": "green", "P": "red"}
+# Direction a step along z is drawn in by the oblique projection of conformations on the cubic lattice
+DEPTH_AXIS = (0.35, 0.35)
+
+Coordinates = Union[np.ndarray, seq.Conformation]
+
+
+def planar(coordinates: Coordinates) -> np.ndarray:
+    """
+    Project coordinates on the plane of the figure: (x, y) coordinates are kept, (x, y, z) coordinates are
+    drawn in oblique projection, each step along z shifting the residue by DEPTH_AXIS.
+
+    Args:
+        coordinates (Coordinates): The coordinates of the residues, as an array of shape (n, 2) or (n, 3) or a conformation.
+
+    Returns:
+        np.ndarray: The (n, 2) positions of the residues in the figure.
+    """
+    if isinstance(coordinates, seq.Conformation):
+        coordinates = coordinates.to_numpy()
+    coordinates = np.asarray(coordinates)
+    if coordinates.shape[1] == 2:
+        return coordinates
+    return coordinates[:, :2] + np.outer(coordinates[:, 2], DEPTH_AXIS)
+
+
+def file_format(path: str, formats: Tuple[str, ...]) -> str:
+    """
+    Find the format of a file from its extension.
+
+    Args:
+        path (str): The path of the file.
+        formats (Tuple[str, ...]): The supported formats.
+
+    Returns:
+        str: The format.
+
+    Raises:
+        ValueError: If the extension is not one of the formats.
+    """
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    if extension not in formats:
+        raise ValueError(f"Unsupported file extension: {path}, expected one of {formats}")
+    return extension
+
+
+class ConformationRenderer:
+    """
+    Off-screen figure drawing the conformations of a chain, reused from one drawing to the next: only the
+    positions of the residues, the limits and the title change between two frames.
+
+    Attributes:
+        figure (Figure): The figure, attached to an Agg canvas.
+        hp_sequence (str): The HP sequence of the chain drawn.
+        labels (bool): Whether the residues are numbered.
+    """
+
+    def __init__(self, hp_sequence: str, size: float = RENDER_SIZE, dpi: int = RENDER_DPI, labels: bool = False) -> None:
+        """
+        Initialize the figure.
+
+        Args:
+            hp_sequence (str): The HP sequence of the chain.
+            size (float, optional): The width and height of the figure, in inches. Defaults to RENDER_SIZE.
+            dpi (int, optional): The resolution of the figure, in pixels per inch. Defaults to RENDER_DPI.
+            labels (bool, optional): Whether to number the residues. Defaults to False.
+        """
+        self.figure = Figure(figsize=(size, size), dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self._axes = self.figure.add_axes((0.02, 0.02, 0.96, 0.9))
+        self._axes.set_aspect("equal")
+        self._axes.axis("off")
+        self._bonds, = self._axes.plot([], [], color="black", linewidth=1.5, zorder=1)
+        self._residues = self._axes.scatter([], [], edgecolors="black", linewidths=0.5, zorder=2)
+        self._title = self.figure.suptitle("", y=0.96)
+        self._texts = []
+        self.labels = labels
+        self.hp_sequence = ""
+        self.set_sequence(hp_sequence)
+
+    def set_sequence(self, hp_sequence: str) -> None:
+        """
+        Change the chain drawn, e.g. to render the results of many sequences with one figure.
+
+        Args:
+            hp_sequence (str): The HP sequence of the chain.
+        """
+        if hp_sequence == self.hp_sequence:
+            return
+        self.hp_sequence = hp_sequence
+        self._residues.set_offsets(np.zeros((len(hp_sequence), 2)))
+        self._residues.set_facecolors([RESIDUE_COLORS[residue] for residue in hp_sequence])
+        for text in self._texts:
+            text.remove()
+        self._texts = [self._axes.text(0, 0, str(i + 1), ha="center", va="center", zorder=3)
+                       for i in range(len(hp_sequence))] if self.labels else []
+
+    def draw(self, coordinates: Coordinates, title: Optional[str] = None, span: Optional[float] = None) -> float:
+        """
+        Draw a conformation, centered in the figure, in oblique projection on the cubic lattice.
+
+        Args:
+            coordinates (Coordinates): The coordinates of the residues, as an array of shape (n, 2) or (n, 3) or a conformation.
+            title (Optional[str], optional): The title of the figure. Defaults to none.
+            span (Optional[float], optional): The width of lattice shown, at least the extent of the chain plus one
+                site on each side. Defaults to that extent.
+
+        Returns:
+            float: The width of lattice shown, to keep the same scale across the frames of an animation.
+        """
+        if isinstance(coordinates, seq.Conformation):
+            coordinates = coordinates.to_numpy()
+        # Residues are drawn smaller on the cubic lattice, whose projected sites are closer to each other
+        scale = 0.55 if np.shape(coordinates)[1] == 2 else 0.4
+        coordinates = planar(coordinates)
+        low, high = coordinates.min(axis=0), coordinates.max(axis=0)
+        center = (low + high) / 2
+        span = max(float((high - low).max()) + 2, span or 0)
+        self._axes.set_xlim(center[0] - span / 2, center[0] + span / 2)
+        self._axes.set_ylim(center[1] - span / 2, center[1] + span / 2)
+        self._bonds.set_data(coordinates[:, 0], coordinates[:, 1])
+        self._residues.set_offsets(coordinates)
+        # Size of a lattice site, in points
+        site = self._axes.get_position().width * self.figure.get_figwidth() * 72 / span
+        self._residues.set_sizes([(scale * site) ** 2])
+        for text, (x, y) in zip(self._texts, coordinates):
+            text.set_position((x, y))
+            text.set_fontsize(min(8.0, 0.3 * site))
+        self._title.set_text(title or "")
+        return span
+
+    def save(self, path: str) -> None:
+        """
+        Write the current drawing to an image file.
+
+        Args:
+            path (str): The path of the image, whose extension is one of IMAGE_FORMATS.
+        """
+        self.figure.savefig(path, format=file_format(path, IMAGE_FORMATS))
+
+    def pixels(self) -> np.ndarray:
+        """
+        Rasterize the current drawing.
+
+        Returns:
+            np.ndarray: The RGB pixels of the figure, of shape (height, width, 3).
+        """
+        self.figure.canvas.draw()
+        return np.asarray(self.figure.canvas.buffer_rgba())[..., :3]
+
+
+class GifStream:
+    """
+    Animated GIF written one frame at a time, each frame with its own color table.
+    """
+
+    def __init__(self, path: str, fps: float = ANIMATION_FPS, loop: int = 0) -> None:
+        """
+        Open the file.
+
+        Args:
+            path (str): The path of the animation.
+            fps (float, optional): The number of frames per second. Defaults to ANIMATION_FPS.
+            loop (int, optional): The number of times the animation is repeated, 0 for ever. Defaults to 0.
+        """
+        self._file = open(path, "wb")
+        self._params = {"duration": 1000 / fps, "loop": loop}
+        self._started = False
+
+    def write(self, renderer: ConformationRenderer) -> None:
+        """
+        Append the current drawing of a renderer.
+
+        Args:
+            renderer (ConformationRenderer): The renderer.
+        """
+        image = Image.fromarray(renderer.pixels(), "RGB").quantize()
+        if not self._started:
+            header, _ = GifImagePlugin.getheader(image, info=dict(self._params))
+            self._file.write(b"".join(header))
+            self._started = True
+        for data in GifImagePlugin.getdata(image, include_color_table=True, duration=self._params["duration"]):
+            self._file.write(data)
+
+    def close(self) -> None:
+        """
+        End the animation and close the file.
+        """
+        if self._started:
+            self._file.write(b";")
+        self._file.close()
+
+
+class MovieStream:
+    """
+    MP4 animation piped frame by frame to ffmpeg.
+    """
+
+    def __init__(self, path: str, renderer: ConformationRenderer, fps: float = ANIMATION_FPS) -> None:
+        """
+        Start ffmpeg.
+
+        Args:
+            path (str): The path of the animation.
+            renderer (ConformationRenderer): The renderer whose figure is recorded.
+            fps (float, optional): The number of frames per second. Defaults to ANIMATION_FPS.
+
+        Raises:
+            RuntimeError: If ffmpeg is not installed.
+        """
+        if not animation.writers.is_available("ffmpeg"):
+            raise RuntimeError("MP4 animations need ffmpeg, write a GIF instead or install ffmpeg")
+        self._writer = animation.FFMpegWriter(fps=fps)
+        self._writer.setup(renderer.figure, path, dpi=renderer.figure.dpi)
+
+    def write(self, renderer: ConformationRenderer) -> None:
+        """
+        Append the current drawing of the renderer.
+
+        Args:
+            renderer (ConformationRenderer): The renderer.
+        """
+        self._writer.grab_frame()
+
+    def close(self) -> None:
+        """
+        Wait for ffmpeg to write the animation.
+        """
+        self._writer.finish()
+
+
+def frame_title(step: Optional[int] = None, energy: Optional[float] = None, name: Optional[str] = None) -> str:
+    """
+    Build the title of a drawing.
+
+    Args:
+        step (Optional[int], optional): The MC step of the conformation. Defaults to none.
+        energy (Optional[float], optional): The energy of the conformation. Defaults to none.
+        name (Optional[str], optional): The name of the sequence. Defaults to none.
+
+    Returns:
+        str: The title.
+    """
+    parts = [] if name is None else [name]
+    if step is not None:
+        parts.append(f"step {step}")
+    if energy is not None:
+        parts.append(f"energy {energy:g}")
+    return "   ".join(parts)
+
+
+def render_conformation(coordinates: Coordinates, hp_sequence: str, path: str, energy: Optional[float] = None,
+                        title: Optional[str] = None, labels: bool = False) -> None:
+    """
+    Render a conformation to a PNG or SVG image.
+
+    Args:
+        coordinates (Coordinates): The coordinates of the residues, as an array of shape (n, 2) or (n, 3) or a conformation.
+        hp_sequence (str): The HP sequence of the chain.
+        path (str): The path of the image, whose extension is one of IMAGE_FORMATS.
+        energy (Optional[float], optional): The energy shown in the title. Defaults to none.
+        title (Optional[str], optional): The name shown in the title. Defaults to none.
+        labels (bool, optional): Whether to number the residues. Defaults to False.
+    """
+    renderer = ConformationRenderer(hp_sequence, labels=labels)
+    renderer.draw(coordinates, frame_title(energy=energy, name=title))
+    renderer.save(path)
+
+
+def render_lattice(lattice, path: str, title: Optional[str] = None, labels: bool = False) -> None:
+    """
+    Render the conformation of a lattice to a PNG or SVG image.
+
+    Args:
+        lattice (lat.Lattice): The lattice.
+        path (str): The path of the image, whose extension is one of IMAGE_FORMATS.
+        title (Optional[str], optional): The name shown in the title. Defaults to none.
+        labels (bool, optional): Whether to number the residues. Defaults to False.
+    """
+    render_conformation(lattice.sequence.conformation, lattice.sequence.hp_sequence, path, energy=lattice.energy,
+                        title=title, labels=labels)
+
+
+def render_animation(frames: Iterable[Tuple[int, Optional[float], Coordinates]], hp_sequence: str, path: str,
+                     every: int = 1, fps: float = ANIMATION_FPS, labels: bool = False) -> int:
+    """
+    Render a trajectory to a GIF or MP4 animation, drawing and writing one frame at a time.
+
+    The frames can come from `Trajectory.replay` or from `trajectory.read_trajectory`, in which case neither
+    the trajectory nor the animation is ever held in memory. The scale only grows along the animation, so that
+    the chain does not seem to jump when it unfolds.
+
+    Args:
+        frames (Iterable[Tuple[int, Optional[float], Coordinates]]): The step, energy and coordinates of each frame.
+        hp_sequence (str): The HP sequence of the chain.
+        path (str): The path of the animation, whose extension is one of ANIMATION_FORMATS.
+        every (int, optional): Keep one frame out of this many, from the first one. Defaults to 1.
+        fps (float, optional): The number of frames per second. Defaults to ANIMATION_FPS.
+        labels (bool, optional): Whether to number the residues. Defaults to False.
+
+    Returns:
+        int: The number of frames written.
+
+    Raises:
+        ValueError: If `every` is not positive.
+    """
+    if every < 1:
+        raise ValueError(f"every must be positive, got {every}")
+    renderer = ConformationRenderer(hp_sequence, labels=labels)
+    stream = GifStream(path, fps) if file_format(path, ANIMATION_FORMATS) == "gif" else MovieStream(path, renderer, fps)
+    written, span = 0, None
+    try:
+        for k, (step, energy, coordinates) in enumerate(frames):
+            if k % every == 0:
+                span = renderer.draw(coordinates, frame_title(step, energy), span)
+                stream.write(renderer)
+                written += 1
+    finally:
+        stream.close()
+    return written
+
+
+def render_results(path: str, output_dir: str, image_format: str = "png", labels: bool = False) -> int:
+    """
+    Render the best conformation of every job of a batch result file, e.g. for visual checks of a large batch.
+
+    The file is read one line at a time, and the images are named after the index and id of each job.
+
+    Args:
+        path (str): The JSONL file written by `batch.py`.
+        output_dir (str): The directory the images are written to, created if needed.
+        image_format (str, optional): One of IMAGE_FORMATS. Defaults to "png".
+        labels (bool, optional): Whether to number the residues. Defaults to False.
+
+    Returns:
+        int: The number of images written. Jobs without a conformation, e.g. failed ones, are skipped.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    renderer = None
+    written = 0
+    with open(path) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record: Dict[str, object] = json.loads(line)
+            if record.get("conformation") is None:
+                continue
+            if renderer is None:
+                renderer = ConformationRenderer(record["hp_sequence"], labels=labels)
+            renderer.set_sequence(record["hp_sequence"])
+            renderer.draw(record["conformation"], frame_title(energy=record["energy"], name=str(record["id"])))
+            name = re.sub(r"[^\w.-]+", "_", f"{record['index']}_{record['id']}")
+            renderer.save(os.path.join(output_dir, f"{name}.{image_format}"))
+            written += 1
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Render batch results to images, or a trajectory to an animation, without a display')
+    parser.add_argument('path', type = str, help = 'JSONL file written by batch.py, or by trajectory.write_trajectory with --animation')
+    parser.add_argument('--output_dir', type = str, default = 'plots', help = 'Directory the images of the batch results are written to')
+    parser.add_argument('--format', choices = IMAGE_FORMATS, default = 'png', help = 'Format of the images of the batch results')
+    parser.add_argument('--animation', type = str, help = 'Render the trajectory in path to this GIF or MP4 file')
+    parser.add_argument('--every', type = int, default = 1, help = 'Keep one frame of the trajectory out of this many')
+    parser.add_argument('--fps', type = float, default = ANIMATION_FPS, help = 'Frames per second of the animation')
+    parser.add_argument('--labels', action = 'store_true', help = 'Number the residues')
+    args = parser.parse_args()
+
+    if args.animation is not None:
+        header, frames = read_trajectory(args.path)
+        count = render_animation(frames, header["hp_sequence"], args.animation, every = args.every, fps = args.fps, labels = args.labels)
+        print(count, "frames written to", args.animation)
+    else:
+        count = render_results(args.path, args.output_dir, args.format, labels = args.labels)
+        print(count, "images written to", args.output_dir)
@@ -0,0 +1,143 @@
+"""
+Parallel execution of the replicas of a REMC search, each replica living in its own worker process.
+"""
+
+import multiprocessing as mp
+import signal
+from typing import Dict, List
+import MC_search as mc
+
+
+def _replica_worker(conn, replicate: mc.mc_search) -> None:
+    """
+    Serve the commands sent by a `ReplicaPool` for one replica until it is closed.
+
+    Commands are (name, payload) tuples:
+    - ("run", max_iteration): run one MC segment of max_iteration steps and send back (energy, step, time, conformation,
+      move_stats, energy_evaluations).
+    - ("temperature", temperature): set the temperature of the replica, after an exchange.
+    - ("state", None): send back the state of the replica, see `mc_search.state`, e.g. for a checkpoint.
+    - ("close", None): send back the trajectory, move statistics and random stream of the replica and stop.
+
+    The replica draws from its own random stream, which travels with it, so that it runs exactly
+    as it would in the parent process. SIGINT, which a terminal sends to the whole process group, is
+    ignored, so that a search interrupted in the parent process can still finish its round and close the pool.
+
+    Args:
+        conn: The worker end of the pipe connected to the pool.
+        replicate (mc.mc_search): The replica hosted by the worker.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        command, payload = conn.recv()
+        if command == "run":
+            replicate.max_iteration = payload
+            replicate.run()
+            conn.send((replicate.lattice.energy, replicate.step, replicate.time, replicate.lattice.sequence.conformation,
+                       replicate.move_stats, replicate.energy_evaluations))
+        elif command == "temperature":
+            replicate.temperature = payload
+        elif command == "state":
+            conn.send(replicate.state())
+        elif command == "close":
+            conn.send((replicate.trajectory, replicate.move_stats, replicate.rng))
+            break
+    conn.close()
+
+
+class ReplicaPool:
+    """
+    Pool of persistent worker processes, one per replica, running MC segments concurrently.
+
+    The replicas passed to the pool are mirrors of the worker copies: after each segment they
+    receive the energy, step counts, conformation and counters of their worker, so that exchanges
+    can be evaluated in the parent process, and the exchanged temperatures are sent back to the workers.
+    Only these compact payloads travel between processes.
+
+    Attributes:
+        replicates (List[mc.mc_search]): The replicas mirrored in the parent process.
+    """
+
+    def __init__(self, replicates: List[mc.mc_search]) -> None:
+        """
+        Start one worker process per replica.
+
+        Args:
+            replicates (List[mc.mc_search]): The replicas to host, each with its own random stream.
+        """
+        self.replicates = replicates
+        self._connections = []
+        self._processes = []
+        for replicate in replicates:
+            parent_conn, child_conn = mp.Pipe()
+            process = mp.Process(target=_replica_worker, args=(child_conn, replicate), daemon=True)
+            process.start()
+            child_conn.close()
+            self._connections.append(parent_conn)
+            self._processes.append(process)
+
+    def __enter__(self) -> "ReplicaPool":
+        """
+        Return the pool, to be closed when leaving the `with` block.
+        """
+        return self
+
+    def __exit__(self, *exc) -> None:
+        """
+        Close the pool.
+        """
+        self.close()
+
+    def run(self) -> None:
+        """
+        Run one MC segment in every worker concurrently, then update the mirrored replicas.
+        Each worker runs as many steps as the `max_iteration` of its mirrored replica.
+        """
+        for replicate, conn in zip(self.replicates, self._connections):
+            conn.send(("run", replicate.max_iteration))
+        for replicate, conn in zip(self.replicates, self._connections):
+            energy, step, time, conformation, move_stats, energy_evaluations = conn.recv()
+            replicate.lattice.load(conformation, energy)
+            replicate.step = step
+            replicate.time = time
+            replicate.move_stats = move_stats
+            replicate.energy_evaluations = energy_evaluations
+
+    def set_temperature(self, index: int, temperature: float) -> None:
+        """
+        Set the temperature of a replica in its worker, e.g. after an exchange.
+
+        Args:
+            index (int): The index of the replica.
+            temperature (float): The new temperature of the replica.
+        """
+        self._connections[index].send(("temperature", temperature))
+
+    def states(self) -> List[Dict[str, object]]:
+        """
+        Fetch the state of every replica from its worker, whose random stream and move statistics are not mirrored.
+
+        Returns:
+            List[Dict[str, object]]: The state of each replica, see `mc_search.state`.
+        """
+        for conn in self._connections:
+            conn.send(("state", None))
+        return [conn.recv() for conn in self._connections]
+
+    def close(self) -> None:
+        """
+        Stop the workers and bring the trajectories, move statistics and random streams of the replicas back
+        to the parent process, so that the replicas can go on running there or in a new pool.
+        """
+        for replicate, conn in zip(self.replicates, self._connections):
+            conn.send(("close", None))
+            replicate.trajectory, replicate.move_stats, rng = conn.recv()
+            replicate.rng = replicate.lattice.rng = rng
+            if replicate.move_generator is not None:
+                # The mirrored lattice was loaded segment after segment, its legal moves are stale
+                replicate.move_generator.refresh()
+            conn.close()
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
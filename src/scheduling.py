@@ -0,0 +1,83 @@
+"""
+Scheduling of the MC work of the replicas of a REMC search between exchange attempts.
+"""
+
+from typing import Dict
+from variables import SEGMENT_SWEEPS, EXCHANGE_INTERVAL, COLD_BUDGET_FACTOR
+
+
+class ExchangeSchedule:
+    """
+    How much MC work each replica performs between two exchange attempts.
+
+    Work is counted in sweeps, one sweep being as many attempted moves as the chain has residues, so
+    that schedules carry over between sequences of different lengths. Every round, each replica runs
+    one MC segment, whose length depends on the temperature it currently holds: the coldest replica
+    runs `cold_factor` times the segment of the hottest one, the factor varying linearly along the
+    ladder in between. Exchanges are attempted every `exchange_interval` segments, so the frequency
+    of exchanges is set independently of the length of the segments.
+
+    Attributes:
+        segment_sweeps (float): The length of a segment at the hottest temperature, in sweeps.
+        exchange_interval (int): The number of segments between two exchange attempts.
+        cold_factor (float): The ratio of the segment length at the coldest temperature to that at the hottest one.
+    """
+
+    def __init__(self, segment_sweeps: float = SEGMENT_SWEEPS, exchange_interval: int = EXCHANGE_INTERVAL,
+                 cold_factor: float = COLD_BUDGET_FACTOR) -> None:
+        """
+        Initialize the schedule.
+
+        Args:
+            segment_sweeps (float, optional): The length of a segment at the hottest temperature, in sweeps.
+                Defaults to SEGMENT_SWEEPS.
+            exchange_interval (int, optional): The number of segments between two exchange attempts.
+                Defaults to EXCHANGE_INTERVAL.
+            cold_factor (float, optional): The ratio of the segment length at the coldest temperature to that
+                at the hottest one. Defaults to COLD_BUDGET_FACTOR.
+
+        Raises:
+            ValueError: If a length, the interval or the factor is not positive.
+        """
+        if segment_sweeps <= 0 or exchange_interval < 1 or cold_factor <= 0:
+            raise ValueError("The segment length, exchange interval and cold factor must be positive")
+        self.segment_sweeps = segment_sweeps
+        self.exchange_interval = exchange_interval
+        self.cold_factor = cold_factor
+
+    def state(self) -> Dict[str, float]:
+        """
+        Return the settings of the schedule, as plain values that can be stored as JSON.
+
+        Returns:
+            Dict[str, float]: The keyword arguments rebuilding the schedule.
+        """
+        return {"segment_sweeps": self.segment_sweeps, "exchange_interval": self.exchange_interval, "cold_factor": self.cold_factor}
+
+    def steps(self, slot: int, nb_slots: int, length: int) -> int:
+        """
+        Compute the number of MC steps of the next segment of the replica at a given temperature.
+
+        Args:
+            slot (int): The index of the temperature, 0 for the coldest.
+            nb_slots (int): The number of temperatures of the ladder.
+            length (int): The number of residues of the chain.
+
+        Returns:
+            int: The number of MC steps, at least 1.
+        """
+        heat = slot / (nb_slots - 1) if nb_slots > 1 else 1.0
+        factor = self.cold_factor + (1 - self.cold_factor) * heat
+        return max(1, round(self.segment_sweeps * length * factor))
+
+    def exchange_due(self, segments: int) -> bool:
+        """
+        Check whether exchanges are attempted after a given number of segments.
+
+        Args:
+            segments (int): The number of segments run by each replica so far.
+
+        Returns:
+            bool: True if exchanges are due.
+        """
+        return segments % self.exchange_interval == 0
@@ -1,6 +1,186 @@
-from typing import List, Optional, Dict
+from array import array
+from collections.abc import Mapping
+from copy import copy
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
 from variables import AA_DICT
 
+
+class Conformation:
+    """
+    Compact, array-backed coordinates of a chain on the lattice.
+
+    The residue at index `i` (chain index `i + 1`) sits at `(x[i], y[i])` on the square lattice,
+    and at `(x[i], y[i], z[i])` on the cubic lattice.
+
+    Attributes:
+        x (array): The x-coordinates of the residues.
+        y (array): The y-coordinates of the residues.
+        z (Optional[array]): The z-coordinates of the residues, None on the square lattice.
+        hydrophobic (bytes): 1 for hydrophobic residues, 0 for polar ones. Shared between copies.
+    """
+
+    __slots__ = ("x", "y", "z", "hydrophobic")
+
+    def __init__(self, hp_sequence: str, dimension: int = 2) -> None:
+        """
+        Initialize the conformation with every residue at the origin.
+
+        Args:
+            hp_sequence (str): The hydrophobic polar sequence.
+            dimension (int, optional): 2 for the square lattice, 3 for the cubic lattice. Defaults to 2.
+
+        Raises:
+            ValueError: If the dimension is neither 2 nor 3.
+        """
+        if dimension not in (2, 3):
+            raise ValueError(f"Unsupported dimension: {dimension}, expected 2 or 3")
+        self.x = array("q", bytes(8 * len(hp_sequence)))
+        self.y = array("q", bytes(8 * len(hp_sequence)))
+        self.z = array("q", bytes(8 * len(hp_sequence))) if dimension == 3 else None
+        self.hydrophobic = bytes(aa == "H" for aa in hp_sequence)
+
+    def __len__(self) -> int:
+        """
+        Return the number of residues.
+
+        Returns:
+            int: The length of the chain.
+        """
+        return len(self.x)
+
+    @property
+    def dimension(self) -> int:
+        """
+        The dimension of the lattice, 2 or 3.
+        """
+        return 2 if self.z is None else 3
+
+    @property
+    def axes(self) -> Tuple[array, ...]:
+        """
+        The coordinate buffers, one per axis.
+        """
+        return (self.x, self.y) if self.z is None else (self.x, self.y, self.z)
+
+    def position(self, index: int) -> Tuple[int, ...]:
+        """
+        Return the coordinates of a residue.
+
+        Args:
+            index (int): The index of the residue.
+
+        Returns:
+            Tuple[int, ...]: The coordinates of the residue, one per axis.
+        """
+        if self.z is None:
+            return self.x[index], self.y[index]
+        return self.x[index], self.y[index], self.z[index]
+
+    def set_position(self, index: int, position: Tuple[int, ...]) -> None:
+        """
+        Set the coordinates of a residue.
+
+        Args:
+            index (int): The index of the residue.
+            position (Tuple[int, ...]): The new coordinates of the residue, one per axis.
+        """
+        for axis, coordinate in zip(self.axes, position):
+            axis[index] = coordinate
+
+    def copy(self) -> "Conformation":
+        """
+        Return a copy of the conformation. Only the coordinate buffers are copied.
+
+        Returns:
+            Conformation: The copied conformation.
+        """
+        new = Conformation.__new__(Conformation)
+        new.x = self.x[:]
+        new.y = self.y[:]
+        new.z = self.z[:] if self.z is not None else None
+        new.hydrophobic = self.hydrophobic
+        return new
+
+    @classmethod
+    def from_numpy(cls, hp_sequence: str, coords: np.ndarray) -> "Conformation":
+        """
+        Build a conformation from an array of coordinates.
+
+        Args:
+            hp_sequence (str): The hydrophobic polar sequence.
+            coords (np.ndarray): An (n, 2) array of (x, y) coordinates, or an (n, 3) array of (x, y, z) coordinates.
+
+        Returns:
+            Conformation: The conformation holding the given coordinates.
+        """
+        coords = np.asarray(coords, dtype=np.int64).reshape(len(hp_sequence), -1)
+        new = cls(hp_sequence, coords.shape[1])
+        for axis, buffer in enumerate(new.axes):
+            np.frombuffer(buffer, dtype=np.int64)[:] = coords[:, axis]
+        return new
+
+    def to_numpy(self) -> np.ndarray:
+        """
+        Return the coordinates as an array.
+
+        Returns:
+            np.ndarray: An (n, 2) array of (x, y) coordinates, or an (n, 3) array of (x, y, z) coordinates.
+        """
+        return np.stack([np.frombuffer(buffer, dtype=np.int64) for buffer in self.axes], axis=1)
+
+
+class ResidueView(Mapping):
+    """
+    Read-only dictionary-style view on one amino acid of a sequence, with the keys
+    `type`, `index`, `chain_index`, `x` and `y`, and `z` on the cubic lattice.
+    """
+
+    __slots__ = ("_sequence", "_index")
+    _KEYS = ("type", "index", "chain_index", "x", "y")
+
+    def __init__(self, sequence: "Sequence", index: int) -> None:
+        """
+        Initialize the view.
+
+        Args:
+            sequence (Sequence): The sequence holding the amino acid.
+            index (int): The index of the amino acid in the sequence.
+        """
+        self._sequence = sequence
+        self._index = index
+
+    def __getitem__(self, key: str):
+        """
+        Return the current value of a property of the amino acid.
+
+        Args:
+            key (str): One of `type`, `index`, `chain_index`, `x`, `y` or `z`.
+
+        Raises:
+            KeyError: If the key is unknown.
+        """
+        if key == "x":
+            return self._sequence.conformation.x[self._index]
+        if key == "y":
+            return self._sequence.conformation.y[self._index]
+        if key == "z" and self._sequence.conformation.z is not None:
+            return self._sequence.conformation.z[self._index]
+        if key == "type":
+            return self._sequence.hp_sequence[self._index]
+        if key == "index":
+            return self._index
+        if key == "chain_index":
+            return self._index + 1
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._KEYS if self._sequence.conformation.z is None else self._KEYS + ("z",))
+
+    def __len__(self) -> int:
+        return len(self._KEYS) + (self._sequence.conformation.z is not None)
+
+
 class Sequence:
     """
     A class to represent a sequence of amino acids and their properties in a lattice-based protein structure.
@@ -9,7 +189,7 @@ class Sequence:
         sequence (str): The amino acid sequence.
         hp_sequence (str): The hydrophobic polar sequence.
         length (int): The length of the amino acid sequence.
-        aa_coord (List[Dict[str, Optional[int]]]): A list of dictionaries containing the coordinates and properties of each amino acid.
+        conformation (Conformation): The coordinates and hydrophobicity of each amino acid.
     """
 
     def __init__(self, sequence: Optional[str] = None, hp_sequence: Optional[str] = None) -> None:
@@ -30,12 +210,12 @@ class Sequence:
             self.sequence = sequence
             self.length = len(sequence)
             self.hp_sequence = self.HP_convert()
-            self.aa_coord = self.aa_coord_generator()
+            self.conformation = Conformation(self.hp_sequence)
         elif hp_sequence is not None and sequence is None:
             self.hp_sequence = hp_sequence
             self.sequence = hp_sequence
             self.length = len(hp_sequence)
-            self.aa_coord = self.aa_coord_generator()
+            self.conformation = Conformation(self.hp_sequence)
 
     def __str__(self) -> str:
         """
@@ -55,24 +235,16 @@ class Sequence:
         """
         return "".join(AA_DICT[aa] for aa in self.sequence)
 
-    def aa_coord_generator(self) -> List[Dict[str, Optional[int]]]:
+    @property
+    def aa_coord(self) -> List["ResidueView"]:
         """
-        Generate the initial coordinates for each amino acid in the sequence.
+        Dictionary-style views on the amino acids, kept for backward compatibility.
+        The move utilities work on `conformation` directly.
 
         Returns:
-            List[Dict[str, Optional[int]]]: A list of dictionaries with initial coordinates and properties for each amino acid.
-        """
-        aa_coord = []
-        for i, aa in enumerate(self.hp_sequence):
-            dict_aa = {
-                "type": aa,
-                "index": i,
-                "chain_index": i + 1,
-                "x": None,
-                "y": None
-            }
-            aa_coord.append(dict_aa)
-        return aa_coord
+            List[ResidueView]: One read-only view per amino acid, in chain order.
+        """
+        return [ResidueView(self, i) for i in range(self.length)]
 
     def aa_coord_update(self, index: int, x: int, y: int) -> None:
         """
@@ -83,5 +255,16 @@ class Sequence:
             x (int): The new x-coordinate.
             y (int): The new y-coordinate.
         """
-        self.aa_coord[index]["x"] = x
-        self.aa_coord[index]["y"] = y
+        self.conformation.x[index] = x
+        self.conformation.y[index] = y
+
+    def copy(self) -> "Sequence":
+        """
+        Return a copy of the sequence with its own amino acid coordinates.
+
+        Returns:
+            Sequence: The copied sequence.
+        """
+        new = copy(self)
+        new.conformation = self.conformation.copy()
+        return new
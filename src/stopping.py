@@ -0,0 +1,125 @@
+"""
+Stop conditions of the REMC search, so that every run ends with its best conformation within a budget.
+"""
+
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+# The reasons a search can stop for, in the order they are checked
+STOP_REASONS = ("interrupted", "target_energy", "wall_time", "max_rounds", "stagnation")
+
+
+class StopCriteria:
+    """
+    Stop conditions of a search, checked after every exchange round.
+
+    The search stops at the first condition met: a termination signal received, the target energy
+    reached, the wall-clock budget spent, the maximum number of rounds performed, or no improvement
+    of the best energy in a given number of rounds. A condition set to None is never met.
+
+    Attributes:
+        target_energy (Optional[float]): The energy at which the search stops.
+        wall_time (Optional[float]): The wall-clock budget, in seconds.
+        max_rounds (Optional[int]): The maximum number of exchange rounds.
+        stagnation_rounds (Optional[int]): The number of rounds without improvement after which the search stops.
+        interrupted (Optional[str]): The name of the signal that interrupted the search, None if none did.
+        best_energy (float): The best energy seen so far.
+        best_round (int): The round at which the best energy was last improved.
+    """
+
+    def __init__(self, target_energy: Optional[float] = None, wall_time: Optional[float] = None,
+                 max_rounds: Optional[int] = None, stagnation_rounds: Optional[int] = None) -> None:
+        """
+        Initialize the stop conditions.
+
+        Args:
+            target_energy (Optional[float], optional): The energy at which the search stops. Defaults to None.
+            wall_time (Optional[float], optional): The wall-clock budget, in seconds. Defaults to None.
+            max_rounds (Optional[int], optional): The maximum number of exchange rounds. Defaults to None.
+            stagnation_rounds (Optional[int], optional): The number of rounds without improvement of the best
+                energy after which the search stops. Defaults to None.
+        """
+        self.target_energy = target_energy
+        self.wall_time = wall_time
+        self.max_rounds = max_rounds
+        self.stagnation_rounds = stagnation_rounds
+        self.interrupted: Optional[str] = None
+        self.best_energy = float("inf")
+        self.best_round = 0
+        self._start = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        """
+        The wall-clock time since the start of the search, in seconds.
+        """
+        return time.perf_counter() - self._start
+
+    def start(self, elapsed: float = 0.0) -> None:
+        """
+        Start the clock and forget the best energy and any interruption.
+
+        Args:
+            elapsed (float, optional): The time already spent, in seconds, e.g. before the search was resumed
+                from a checkpoint. Defaults to 0.0.
+        """
+        self._start = time.perf_counter() - elapsed
+        self.interrupted = None
+        self.best_energy = float("inf")
+        self.best_round = 0
+
+    def check(self, energy: float, rounds: int) -> Optional[str]:
+        """
+        Record the best energy after a round and check the stop conditions.
+
+        Args:
+            energy (float): The best energy found so far.
+            rounds (int): The number of exchange rounds performed.
+
+        Returns:
+            Optional[str]: The reason to stop, one of STOP_REASONS, None to go on.
+        """
+        if energy < self.best_energy:
+            self.best_energy = energy
+            self.best_round = rounds
+        if self.interrupted is not None:
+            return "interrupted"
+        if self.target_energy is not None and self.best_energy <= self.target_energy:
+            return "target_energy"
+        if self.wall_time is not None and self.elapsed >= self.wall_time:
+            return "wall_time"
+        if self.max_rounds is not None and rounds >= self.max_rounds:
+            return "max_rounds"
+        if self.stagnation_rounds is not None and rounds - self.best_round >= self.stagnation_rounds:
+            return "stagnation"
+        return None
+
+    @contextmanager
+    def catch_signals(self) -> Iterator["StopCriteria"]:
+        """
+        Turn SIGINT and SIGTERM into a request to stop after the current round, within the `with` block.
+
+        A second signal interrupts the search right away with KeyboardInterrupt. Signals can only be caught
+        in the main thread: elsewhere, the block runs with the handlers untouched.
+
+        Returns:
+            Iterator[StopCriteria]: The stop conditions.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            yield self
+            return
+
+        def handler(signum: int, frame) -> None:
+            if self.interrupted is not None:
+                raise KeyboardInterrupt
+            self.interrupted = signal.Signals(signum).name
+
+        previous = {signum: signal.signal(signum, handler) for signum in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            yield self
+        finally:
+            for signum, previous_handler in previous.items():
+                signal.signal(signum, previous_handler)
@@ -0,0 +1,221 @@
+"""
+Telemetry of the REMC search and of population annealing: counters of the replicas and of the ladder, timings of the phases of the search,
+and the observers the events of a search are dispatched to.
+"""
+
+import json
+import time
+from typing import Callable, Dict, IO, Iterable, List, Optional, Union
+
+# The events of a search, each dispatched as a record with an "event" key:
+# - "start": the search starts or resumes, with the sequence and the ladder.
+# - "round": a round of MC segments ended, with the energy of each replica and the best energy.
+# - "improvement": a replica found a conformation with a better energy than the best one.
+# - "exchange": exchanges were accepted, with the pairs of temperature indices exchanged.
+# - "retune": the ladder was retuned, with its statistics before retuning.
+# - "checkpoint": a checkpoint was written.
+# - "counters": periodic snapshot of the counters and timings, see `Telemetry`, with the counters of the
+#   energy cache and the number of distinct ground states, see `canonical`.
+# - "anneal": a population annealing reached a temperature, with the free energy estimate and the diversity of
+#   the population, see `population_annealing`.
+# - "stop": the search stopped, with the reason and the final counters and timings.
+EVENTS = ("start", "round", "improvement", "exchange", "retune", "checkpoint", "counters", "anneal", "stop")
+# The events written by a `JsonlObserver` by default, leaving out the ones sent every round
+JSON_EVENTS = ("start", "improvement", "retune", "checkpoint", "counters", "anneal", "stop")
+# The phases the wall-clock time of a search is split into, "resampling" for population annealing only
+PHASES = ("mc", "exchange", "resampling", "checkpoint", "observers")
+
+Observer = Callable[[Dict[str, object]], None]
+
+
+def replica_counters(replicate) -> Dict[str, object]:
+    """
+    Gather the counters of a replica.
+
+    Args:
+        replicate (mc.mc_search): The replica.
+
+    Returns:
+        Dict[str, object]: The temperature, energy, MC steps, moves applied (`steps`), energy evaluations and,
+        for each kind of move, the number of moves attempted, applied, not applicable (`noop`) and accepted.
+    """
+    return {
+        "temperature": replicate.temperature,
+        "energy": replicate.lattice.energy,
+        "time": replicate.time,
+        "steps": replicate.step,
+        "energy_evaluations": replicate.energy_evaluations,
+        "moves": {kind: {"attempted": stats["proposed"], "applied": stats["applied"],
+                         "noop": stats["proposed"] - stats["applied"], "accepted": stats["accepted"]}
+                  for kind, stats in replicate.move_stats.items()},
+    }
+
+
+def pair_counters(ladder) -> List[Dict[str, object]]:
+    """
+    Gather the exchange counters of each pair of neighbouring temperatures of a ladder.
+
+    Args:
+        ladder (ReplicaLadder): The ladder.
+
+    Returns:
+        List[Dict[str, object]]: The temperatures, attempts and accepts of each pair, from the lowest temperatures.
+    """
+    return [{"temperatures": [ladder.temperatures[k], ladder.temperatures[k + 1]], "attempts": ladder.attempts[k],
+             "accepts": ladder.accepts[k]} for k in range(len(ladder.attempts))]
+
+
+class Telemetry:
+    """
+    Dispatch of the events of a search to its observers, and wall-clock time of each phase of the search.
+
+    Without observers, the telemetry is disabled: `emit` returns at once, and the search skips building
+    the records, so that a quiet search only pays for a few clock reads per round.
+
+    Attributes:
+        observers (List[Observer]): The callables each record is passed to.
+        enabled (bool): Whether there is any observer.
+        timings (Dict[str, float]): The time spent in each of PHASES, in seconds.
+    """
+
+    def __init__(self, observers: Iterable[Observer] = ()) -> None:
+        """
+        Initialize the telemetry.
+
+        Args:
+            observers (Iterable[Observer], optional): The callables each record is passed to. Defaults to none.
+        """
+        self.observers = list(observers)
+        self.enabled = bool(self.observers)
+        self.timings = {phase: 0.0 for phase in PHASES}
+
+    def emit(self, event: str, **fields) -> None:
+        """
+        Pass a record to every observer, counting the time they take in the "observers" phase.
+
+        Args:
+            event (str): One of EVENTS.
+            **fields: The content of the record.
+        """
+        if not self.enabled:
+            return
+        start = time.perf_counter()
+        record = dict(event=event, **fields)
+        for observer in self.observers:
+            observer(record)
+        self.timings["observers"] += time.perf_counter() - start
+
+
+class ConsoleObserver:
+    """
+    Observer printing the progress of a search in a readable form.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the observer.
+        """
+        self.length = None
+
+    def __call__(self, record: Dict[str, object]) -> None:
+        """
+        Print a record.
+
+        Args:
+            record (Dict[str, object]): The record of an event.
+        """
+        event = record["event"]
+        if event == "start":
+            self.length = record["length"]
+            if record["resumed"]:
+                print("resumed after", record["round"], "rounds and", round(record["elapsed"], 3), "s, energy best", record["energy_best"])
+        elif event == "improvement":
+            print("energy best", record["energy"], "is associated with lattice", record["replica"])
+        elif event == "round":
+            for replica, energy in enumerate(record["energies"]):
+                print("replica", replica, "energy", energy)
+            print("energy best", record["energy_best"], "target energy", record["target_energy"])
+        elif event == "exchange":
+            for k, l in record["pairs"]:
+                print("exchange between", k, "and", l, "successful")
+        elif event == "retune":
+            print("ladder statistics before retuning", record["statistics"])
+            print("ladder retuned", record["cycles_done"], "/", record["cycles"], record["temperatures"], "frozen" if record["frozen"] else "")
+        elif event == "checkpoint":
+            print("checkpoint written to", record["path"], "after", record["round"], "rounds,", record["bytes"], "bytes")
+        elif event == "anneal":
+            print("temperature", round(record["temperature"], 3), "energy mean", round(record["energy_mean"], 3), "energy best", record["energy_best"],
+                  "free energy", round(record["free_energy"], 3), "families", record["families"],
+                  "distinct conformations", record["distinct_conformations"])
+        elif event == "stop" and "population" in record:
+            print("stopped after", record["round"], "temperatures and", round(record["elapsed"], 3), "s:", record["reason"])
+            print("time spent", {phase: round(seconds, 3) for phase, seconds in record["timings"].items()})
+            print("population diversity", record["diversity"])
+            print("energy cache", record["cache"])
+            print("distinct ground states", record["ground_states"])
+            rates = {kind: moves["accepted"] / moves["attempted"] if moves["attempted"] else 0.0 for kind, moves in record["moves"].items()}
+            print("move acceptance rates", rates)
+            print("population performed", record["steps"], "MC steps")
+        elif event == "stop":
+            print("stopped after", record["round"], "rounds and", round(record["elapsed"], 3), "s:", record["reason"])
+            print("time spent", {phase: round(seconds, 3) for phase, seconds in record["timings"].items()})
+            print("ladder statistics", record["ladder"])
+            print("energy cache", record["cache"])
+            print("distinct ground states", record["ground_states"])
+            for i, counters in enumerate(record["replicas"]):
+                rates = {kind: moves["accepted"] / moves["attempted"] if moves["attempted"] else 0.0 for kind, moves in counters["moves"].items()}
+                print("replica", i, "move acceptance rates", rates)
+                sweeps = round(counters["time"] / self.length, 2) if self.length else None
+                print("replica", i, "performed", counters["time"], "MC steps,", sweeps, "sweeps,", counters["energy_evaluations"], "energy evaluations")
+
+
+class JsonlObserver:
+    """
+    Observer writing records as JSON lines, e.g. the periodic "counters" snapshots of a search.
+
+    Attributes:
+        events (Optional[tuple]): The events written, None for all of them.
+    """
+
+    def __init__(self, output: Union[str, IO[str]], events: Optional[Iterable[str]] = JSON_EVENTS) -> None:
+        """
+        Initialize the observer.
+
+        Args:
+            output (Union[str, IO[str]]): The path of the file to write, replaced if it exists, or an open text file.
+            events (Optional[Iterable[str]], optional): The events written, None for all of them. Defaults to JSON_EVENTS.
+        """
+        self._owned = isinstance(output, str)
+        self._file = open(output, "w") if self._owned else output
+        self.events = tuple(events) if events is not None else None
+
+    def __call__(self, record: Dict[str, object]) -> None:
+        """
+        Write a record on its own line, with the time it was written at.
+
+        Args:
+            record (Dict[str, object]): The record of an event.
+        """
+        if self.events is None or record["event"] in self.events:
+            self._file.write(json.dumps(dict(record, time=time.time()), default=_to_json) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        """
+        Close the file, if the observer opened it.
+        """
+        if self._owned:
+            self._file.close()
+
+
+def _to_json(value):
+    """
+    Convert the NumPy scalars that may hide in a record to Python values, for `json.dumps`.
+
+    Args:
+        value: A value `json` cannot serialize.
+
+    Returns:
+        The equivalent Python value, or its string representation.
+    """
+    return value.item() if hasattr(value, "item") else str(value)
@@ -0,0 +1,306 @@
+"""
+Bounded-memory recording of the conformations visited by a Monte Carlo search.
+"""
+
+import json
+import math
+from collections import deque
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+import numpy as np
+import lattice as lat
+import sequence as seq
+from moves.move_utils import Displacement
+from variables import TRAJECTORY_SIZE, TRAJECTORY_STRIDE, TRAJECTORY_KEYFRAME_INTERVAL
+
+MODES = ("full", "off", "ring", "stride", "delta")
+
+
+class Snapshot(NamedTuple):
+    """
+    A full conformation recorded at a given step.
+    """
+    step: int
+    energy: Optional[float]
+    conformation: seq.Conformation
+
+
+class Delta(NamedTuple):
+    """
+    The residues moved since the previous frame, followed by the translation of the whole chain.
+    Each move is stored as (chain_index, x_new, y_new), or (chain_index, x_new, y_new, z_new) on the cubic lattice.
+    """
+    step: int
+    energy: Optional[float]
+    moves: Tuple[Tuple[int, ...], ...]
+    shift: Tuple[int, ...]
+
+
+class Trajectory:
+    """
+    Trajectory of a Monte Carlo search, recorded according to one of the following modes:
+
+    - "full": every accepted conformation is kept.
+    - "off": nothing is kept.
+    - "ring": only the last `size` accepted conformations are kept.
+    - "stride": the current conformation is kept every `stride` MC steps.
+    - "delta": every accepted conformation is kept as the residues that moved, with a full
+      conformation every `keyframe_interval` frames.
+
+    Any recorded conformation can be rebuilt as a lattice by indexing the trajectory.
+
+    Attributes:
+        mode (str): The recording mode.
+        stride (int): The number of MC steps between two samples in "stride" mode.
+        keyframe_interval (int): The number of deltas between two full conformations in "delta" mode.
+        frames (Union[List, deque]): The recorded snapshots and deltas.
+        next_sample (float): The step at which the next sample is due in "stride" mode, infinite otherwise.
+    """
+
+    def __init__(self, mode: str = "full", size: int = TRAJECTORY_SIZE, stride: int = TRAJECTORY_STRIDE,
+                 keyframe_interval: int = TRAJECTORY_KEYFRAME_INTERVAL) -> None:
+        """
+        Initialize an empty trajectory.
+
+        Args:
+            mode (str, optional): The recording mode. Defaults to "full".
+            size (int, optional): The number of conformations kept in "ring" mode. Defaults to TRAJECTORY_SIZE.
+            stride (int, optional): The number of MC steps between two samples in "stride" mode. Defaults to TRAJECTORY_STRIDE.
+            keyframe_interval (int, optional): The number of deltas between two full conformations in "delta" mode.
+                Defaults to TRAJECTORY_KEYFRAME_INTERVAL.
+
+        Raises:
+            ValueError: If the mode is unknown.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown trajectory mode: {mode}, expected one of {MODES}")
+        self.mode = mode
+        self.stride = stride
+        self.keyframe_interval = keyframe_interval
+        self.frames: Union[List, deque] = deque(maxlen=size) if mode == "ring" else []
+        self.next_sample = math.inf
+        self._sequence: Optional[seq.Sequence] = None
+        self._deltas_since_keyframe = 0
+
+    def __len__(self) -> int:
+        """
+        Return the number of recorded frames.
+
+        Returns:
+            int: The number of recorded frames.
+        """
+        return len(self.frames)
+
+    def __getitem__(self, k: int) -> lat.Lattice:
+        """
+        Rebuild the lattice recorded in a given frame.
+
+        Args:
+            k (int): The index of the frame, negative indices counting from the end.
+
+        Returns:
+            lat.Lattice: A new lattice holding the recorded conformation and energy.
+        """
+        k = self._normalize_index(k)
+        new = lat.make_lattice(self._sequence, conformation=self.conformation_at(k))
+        new.energy = self.frames[k].energy
+        return new
+
+    def __iter__(self) -> Iterator[lat.Lattice]:
+        """
+        Iterate over the recorded lattices, rebuilt one at a time.
+
+        Returns:
+            Iterator[lat.Lattice]: The recorded lattices in chronological order.
+        """
+        for k in range(len(self.frames)):
+            yield self[k]
+
+    @property
+    def steps(self) -> List[int]:
+        """
+        The MC steps at which the frames were recorded.
+        """
+        return [frame.step for frame in self.frames]
+
+    @property
+    def energies(self) -> List[Optional[float]]:
+        """
+        The energies of the recorded frames.
+        """
+        return [frame.energy for frame in self.frames]
+
+    def start(self, lattice: lat.Lattice, step: int = 0) -> None:
+        """
+        Clear the trajectory and record the starting conformation of the search.
+
+        Args:
+            lattice (lat.Lattice): The lattice the search starts from.
+            step (int, optional): The current MC step. Defaults to 0.
+        """
+        self._sequence = lattice.sequence
+        self.frames.clear()
+        if self.mode == "stride":
+            self.next_sample = step + self.stride
+        if self.mode != "off":
+            self._keyframe(lattice, step)
+
+    def record(self, lattice: lat.Lattice, step: int, displaced: Optional[List[Displacement]] = None,
+               shift: Tuple[int, ...] = (0, 0)) -> None:
+        """
+        Record a change of conformation. Nothing is recorded in "off" and "stride" modes.
+
+        Args:
+            lattice (lat.Lattice): The lattice after the change.
+            step (int): The current MC step.
+            displaced (Optional[List[Displacement]], optional): The residues displaced by the accepted move,
+                applied before `shift`. Defaults to None, for changes that are not a move (e.g. an exchange),
+                which are recorded as a full conformation.
+            shift (Tuple[int, ...], optional): The translation applied after the move, along each axis. Defaults to (0, 0).
+        """
+        if self.mode in ("off", "stride"):
+            return
+        if self.mode == "delta" and displaced is not None and self._deltas_since_keyframe < self.keyframe_interval:
+            moves = tuple((chain_index, *new) for chain_index, _, new in displaced)
+            self.frames.append(Delta(step, lattice.energy, moves, shift))
+            self._deltas_since_keyframe += 1
+        else:
+            self._keyframe(lattice, step)
+
+    def sample(self, lattice: lat.Lattice, step: int) -> None:
+        """
+        Record the current conformation if a sample is due in "stride" mode.
+
+        Args:
+            lattice (lat.Lattice): The current lattice.
+            step (int): The current MC step.
+        """
+        if step >= self.next_sample:
+            self._keyframe(lattice, step)
+            self.next_sample += self.stride
+
+    def conformation_at(self, k: int) -> seq.Conformation:
+        """
+        Rebuild the conformation recorded in a given frame, replaying deltas from the closest full conformation.
+
+        Args:
+            k (int): The index of the frame, negative indices counting from the end.
+
+        Returns:
+            seq.Conformation: A copy of the recorded conformation.
+        """
+        k = self._normalize_index(k)
+        start = k
+        while not isinstance(self.frames[start], Snapshot):
+            start -= 1
+        conformation = self.frames[start].conformation.copy()
+        for index in range(start + 1, k + 1):
+            _apply_delta(conformation, self.frames[index])
+        return conformation
+
+    def replay(self) -> Iterator[Tuple[int, Optional[float], seq.Conformation]]:
+        """
+        Iterate over the recorded conformations in chronological order, applying each delta once to a single
+        working conformation instead of rebuilding every frame from its keyframe.
+
+        Returns:
+            Iterator[Tuple[int, Optional[float], seq.Conformation]]: The step, energy and conformation of each frame.
+            The conformation is updated in place by the next frame, and must be copied to be kept.
+        """
+        conformation = None
+        for frame in self.frames:
+            if isinstance(frame, Snapshot):
+                conformation = frame.conformation.copy()
+            else:
+                _apply_delta(conformation, frame)
+            yield frame.step, frame.energy, conformation
+
+    def _keyframe(self, lattice: lat.Lattice, step: int) -> None:
+        """
+        Record the full conformation of a lattice.
+
+        Args:
+            lattice (lat.Lattice): The lattice to record.
+            step (int): The current MC step.
+        """
+        self.frames.append(Snapshot(step, lattice.energy, lattice.sequence.conformation.copy()))
+        self._deltas_since_keyframe = 0
+
+    def _normalize_index(self, k: int) -> int:
+        """
+        Convert a possibly negative frame index to a positive one.
+
+        Args:
+            k (int): The index of the frame.
+
+        Returns:
+            int: The positive index of the frame.
+
+        Raises:
+            IndexError: If the index is out of range.
+        """
+        if k < 0:
+            k += len(self.frames)
+        if not 0 <= k < len(self.frames):
+            raise IndexError("trajectory index out of range")
+        return k
+
+
+def _apply_delta(conformation: seq.Conformation, delta: Delta) -> None:
+    """
+    Apply in place the moves and translation of a delta to a conformation.
+
+    Args:
+        conformation (seq.Conformation): The conformation of the previous frame.
+        delta (Delta): The changes since the previous frame.
+    """
+    for chain_index, *new in delta.moves:
+        conformation.set_position(chain_index - 1, new)
+    if any(delta.shift):
+        for buffer, shift in zip(conformation.axes, delta.shift):
+            np.frombuffer(buffer, dtype=np.int64)[:] += shift
+
+
+def write_trajectory(path: str, trajectory: Trajectory) -> int:
+    """
+    Write the conformations of a trajectory as JSON lines, to render or analyse them later.
+
+    The first line holds the HP sequence and the number of frames, each following line the step, energy
+    and coordinates of a frame, (x, y) or (x, y, z) per residue.
+
+    Args:
+        path (str): The path of the file, replaced if it exists.
+        trajectory (Trajectory): The trajectory, started on a lattice.
+
+    Returns:
+        int: The number of frames written.
+    """
+    with open(path, "w") as file:
+        file.write(json.dumps({"hp_sequence": trajectory._sequence.hp_sequence, "frames": len(trajectory)}) + "\n")
+        for step, energy, conformation in trajectory.replay():
+            file.write(json.dumps({"step": step, "energy": energy, "coordinates": conformation.to_numpy().tolist()}) + "\n")
+    return len(trajectory)
+
+
+def read_trajectory(path: str) -> Tuple[Dict[str, object], Iterator[Tuple[int, Optional[float], np.ndarray]]]:
+    """
+    Read a trajectory written by `write_trajectory`, one frame at a time.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        Tuple[Dict[str, object], Iterator[Tuple[int, Optional[float], np.ndarray]]]: The first line of the file,
+        and an iterator over the step, energy and coordinates of the frames, of shape (n, 2) or (n, 3), which reads the
+        file as it goes and closes it once exhausted.
+    """
+    file = open(path)
+    header = json.loads(file.readline())
+
+    def frames() -> Iterator[Tuple[int, Optional[float], np.ndarray]]:
+        with file:
+            for line in file:
+                if line.strip():
+                    frame = json.loads(line)
+                    yield frame["step"], frame["energy"], np.asarray(frame["coordinates"], dtype=np.int64)
+
+    return header, frames()
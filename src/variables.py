@@ -31,18 +31,83 @@ SI_1 = "HPHPPHHPHPPHPHHPPHPH"
 SI_2 = "HHPPHPPHPPHPPHPPHPPHPPHH"
 SI_4 = "PPPHHPPHHPPPPPHHHHHHHPPHHPPPPHHPPHPP"
 SI_3 = "PPHPPHHPPPPHHPPPPHHPPPPHH"
+# First 48-residue sequence of the 3D cubic lattice benchmark of Yue et al. (1995), of lowest energy -32
+SI3D_1 = "HPHHPPHHHHPHHHPPHHPPHPHHHPHPHHPPHHPPPHPPPPPPPPHH"
 
 # Lattice variables
 GRID_SIZE_FACTOR = 2
+SAW_OUTWARD_BIAS = 3.0  # preference of the initial random walks for steps away from their start
+SPARSE_GRID_MIN_LENGTH = 100  # chains from this length are stored in a sparse, unbounded lattice
+DIMENSION = 2  # 2 for the square lattice, 3 for the cubic lattice
+CUBIC_GRID_MARGIN = 3  # empty sites kept between the chain and the faces of a dense lattice of `CubicLattice`
 
 # Monte Carlo search variables
 NB_ITER = 500
 TEMP = 160  # to adjust
 RHO = 0.5
+VALIDATE_ENERGY = False  # recompute the full energy after every move to check the incremental one
+REJECTION_FREE = False  # draw among the legal moves weighted by acceptance instead of proposing blind moves
+MC_BACKEND = "python"  # "python", or "compiled" to run whole MC segments in one Numba call
+
+RANDOM_BLOCK_SIZE = 4096  # number of uniforms drawn at once by a random stream
+
+# Trajectory recording variables
+TRAJECTORY_MODE = "ring"  # "full", "off", "ring", "stride" or "delta"
+TRAJECTORY_SIZE = 100  # number of conformations kept in "ring" mode
+TRAJECTORY_STRIDE = 1000  # number of MC steps between two recorded conformations in "stride" mode
+TRAJECTORY_KEYFRAME_INTERVAL = 1000  # number of deltas between two full conformations in "delta" mode
 
 # Replicat exchange Monte Carlo search variables
+K_B = 0.0019872  # Boltzmann constant in kcal/(mol K): temperatures are in kelvin, an H-H contact weighs -1 kcal/mol
 T_MIN = 160
 T_MAX = 220
 STEP = 10
 MAX_ITERATIONS = 20000
 PROBABILITY = 0.5
+
+# Exchange schedule variables, used when the work between exchanges is counted in sweeps (--segment_sweeps)
+SEGMENT_SWEEPS = 100  # length of an MC segment at the hottest temperature, in sweeps of n attempted moves
+EXCHANGE_INTERVAL = 1  # number of MC segments between two exchange attempts
+COLD_BUDGET_FACTOR = 1.0  # segment length at the coldest temperature relative to the hottest one
+
+# Population annealing variables
+PA_POPULATION = 1000  # number of walkers of the population
+PA_T_MAX = 1000  # first, hottest temperature of the annealing, where the chain is mostly unfolded
+PA_T_MIN = 125  # last, coldest temperature of the annealing
+PA_TEMPERATURES = 40  # number of temperatures of the annealing schedule, from PA_T_MAX down to PA_T_MIN
+PA_SWEEPS = 10  # MC sweeps of n attempted moves run by every walker at each temperature
+PA_WORKERS = 1  # number of worker processes running the sweeps of the population
+
+# Stop conditions of the REMC search, None to disable
+WALL_TIME = None  # wall-clock budget, in seconds
+MAX_ROUNDS = None  # maximum number of exchange rounds
+STAGNATION_ROUNDS = None  # number of rounds without improvement of the best energy
+
+# Conformation cache variables
+ENERGY_CACHE_SIZE = 10000  # number of conformations whose energy is kept by the LRU cache of a search
+GROUND_STATE_LIMIT = 100  # number of distinct lowest-energy conformations kept by a search
+
+# Batch mode variables
+BATCH_TIMEOUT_MARGIN = 60  # time a job may run past its wall-clock budget before it is stopped, in seconds
+BATCH_KILL_GRACE = 10  # time a stopped job has to return its best conformation before it is killed, in seconds
+
+# Telemetry variables
+TELEMETRY_INTERVAL = 10  # minimum wall-clock time between two snapshots of the counters of a search, in seconds
+
+# Startup variables
+STARTUP_TARGET = 0.5  # cold-start time aimed at for `main.py --help` and for the imports of a worker process, in seconds
+
+# Rendering variables
+RENDER_SIZE = 6  # width and height of the rendered images, in inches
+RENDER_DPI = 100  # resolution of the rendered images and animations, in pixels per inch
+ANIMATION_FPS = 10  # frames per second of the rendered animations
+
+# Checkpoint variables
+CHECKPOINT_INTERVAL = 10  # minimum wall-clock time between two checkpoints, in seconds
+
+# Adaptive temperature ladder variables
+LADDER_TUNING = None  # None for a fixed ladder, "acceptance" or "flux" to tune it during a warm-up
+LADDER_TARGET_ACCEPTANCE = 0.3  # exchange acceptance aimed at between neighbouring temperatures
+LADDER_WARMUP_ROUNDS = 50  # exchange rounds of statistics gathered before each retuning
+LADDER_TUNING_CYCLES = 4  # number of retunings before the ladder is frozen
+LADDER_MAX_REPLICAS = 32  # upper bound on the number of replicas when the ladder is resized
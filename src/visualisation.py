@@ -6,6 +6,7 @@ import matplotlib.pyplot as plt
 import networkx as nx
 import numpy as np
 from typing import Dict
+from render import planar
 
 
 def create_lattice_graph(lattice) -> nx.Graph:
@@ -38,7 +39,7 @@ def create_lattice_graph(lattice) -> nx.Graph:
 
 def visualize_lattice_graph(lattice) -> None:
     """
-    Visualize the lattice graph using Matplotlib.
+    Visualize the lattice graph using Matplotlib, in oblique projection on the cubic lattice.
 
     Args:
         lattice: The lattice object containing sequence and grid information.
@@ -49,7 +50,8 @@ def visualize_lattice_graph(lattice) -> None:
     G = create_lattice_graph(lattice)
 
     # Define node positions for visualization
-    pos = {node: (lattice.sequence.aa_coord[node - 1]['x'], lattice.sequence.aa_coord[node - 1]['y']) for node in G.nodes}
+    positions = planar(lattice.sequence.conformation)
+    pos = {node: tuple(positions[node - 1]) for node in G.nodes}
 
     # Define node colors based on hydrophobicity
     node_colors = ['green' if G.nodes[node]['type'] == 'H' else 'red' for node in G.nodes]
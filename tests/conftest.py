@@ -0,0 +1,8 @@
+"""
+Shared setup of the tests: the modules of `src` are imported by their plain names, as the scripts there do.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
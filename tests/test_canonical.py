@@ -0,0 +1,69 @@
+"""
+Canonical keys identify the images of a fold by the symmetries of the lattice, and index an LRU cache of energies.
+"""
+
+import itertools
+import numpy as np
+import pytest
+import lattice as lat
+import sequence as seq
+from canonical import EnergyCache, canonical_key
+from initialization import random_conformations
+from random_streams import RandomStream
+from variables import SI_4, SI3D_1
+
+
+def symmetries(dimension: int):
+    """
+    Return the matrices of the rotations and reflections of the lattice: the signed permutations of its axes,
+    8 on the square lattice and 48 on the cubic one.
+    """
+    matrices = []
+    for permutation in itertools.permutations(range(dimension)):
+        for signs in itertools.product((1, -1), repeat=dimension):
+            matrix = np.zeros((dimension, dimension), dtype=np.int64)
+            matrix[range(dimension), permutation] = signs
+            matrices.append(matrix)
+    return matrices
+
+
+@pytest.mark.parametrize("hp_sequence, dimension, count", [(SI_4, 2, 8), (SI3D_1, 3, 48)])
+def test_key_is_invariant_under_the_lattice_symmetries(hp_sequence, dimension, count):
+    matrices = symmetries(dimension)
+    assert len(matrices) == count
+    conformations = random_conformations(seq.Sequence(hp_sequence=hp_sequence), 5, RandomStream(3), dimension)
+    for conformation in conformations:
+        coordinates = conformation.to_numpy()
+        key = canonical_key(conformation)
+        for matrix in matrices:
+            image = coordinates @ matrix.T + np.arange(1, dimension + 1) * 7
+            assert canonical_key(seq.Conformation.from_numpy(hp_sequence, image)) == key
+    assert len({canonical_key(conformation) for conformation in conformations}) == len(conformations)
+
+
+def test_key_of_a_palindromic_sequence_is_invariant_under_reversal():
+    hp_sequence = "HPPHHPHPPHHPHPPH" + "HPPHPHHPPHPHHPPH"
+    for conformation in random_conformations(seq.Sequence(hp_sequence=hp_sequence), 5, RandomStream(4)):
+        coordinates = conformation.to_numpy()
+        key = canonical_key(conformation)
+        for matrix in symmetries(2):
+            image = coordinates[::-1] @ matrix.T
+            assert canonical_key(seq.Conformation.from_numpy(hp_sequence, image)) == key
+        # Read from its last residue, the chain of a sequence that is not a palindrome is another fold
+        other = "P" + hp_sequence[1:]
+        assert canonical_key(seq.Conformation.from_numpy(other, coordinates[::-1])) \
+            != canonical_key(seq.Conformation.from_numpy(other, coordinates))
+
+
+def test_cache_returns_energies_of_symmetric_folds_and_evicts_the_least_recent():
+    sequence = seq.Sequence(hp_sequence=SI_4)
+    conformations = random_conformations(sequence, 3, RandomStream(5))
+    cache = EnergyCache(maxsize=2)
+    lattices = [lat.make_lattice(sequence, conformation) for conformation in conformations]
+    assert [cache.energy(lattice) for lattice in lattices[:2]] == [lattice.calculate_energy() for lattice in lattices[:2]]
+    mirror = seq.Conformation.from_numpy(SI_4, conformations[0].to_numpy() * np.array([-1, 1]) + 100)
+    assert cache.get(canonical_key(mirror)) == lattices[0].calculate_energy()
+    cache.energy(lattices[2])
+    assert cache.evictions == 1
+    assert cache.get(canonical_key(conformations[1])) is None
+    assert (cache.hits, cache.misses) == (1, 4)
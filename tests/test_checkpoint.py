@@ -0,0 +1,64 @@
+"""
+A search stopped after k rounds and resumed from its checkpoint ends exactly as a search run for N rounds at once.
+"""
+
+import numpy as np
+import pytest
+import sequence as seq
+from REMC_search import REMC_search, resume_REMC_search
+from checkpoint import load_checkpoint
+from ladder_tuning import LadderTuner
+from scheduling import ExchangeSchedule
+from variables import SI_1
+
+ROUNDS = 14
+SPLIT = 7
+
+# The options of each mode, built anew for each search, as the tuner and schedule hold the state of their search
+MODES = {
+    "plain": lambda: dict(),
+    "rejection_free": lambda: dict(rejection_free=True),
+    "schedule": lambda: dict(schedule=ExchangeSchedule(5, 2, 1.5)),
+    "resize": lambda: dict(ladder_tuner=LadderTuner("acceptance", warmup_rounds=4, cycles=2, resize=True, target_acceptance=0.6)),
+    "cubic": lambda: dict(dimension=3),
+}
+
+
+def final_checkpoint(path, split, parallel, **options):
+    """
+    Run a search for ROUNDS rounds, at once or stopped after `split` rounds and resumed, and load its last checkpoint.
+    """
+    sequence = seq.Sequence(hp_sequence=SI_1)
+    settings = dict(max_iteration=300, seed=5, parallel=parallel, checkpoint_path=str(path), checkpoint_interval=0, observers=[])
+    if split is None:
+        result = REMC_search(sequence, 160, 220, 5, max_rounds=ROUNDS, **settings, **options)
+    else:
+        REMC_search(sequence, 160, 220, 5, max_rounds=split, **settings, **options)
+        result = resume_REMC_search(str(path), parallel=parallel, observers=[], max_rounds=ROUNDS)
+    checkpoint = load_checkpoint(str(path))
+    # Only the elapsed time and the stop condition given on resume may differ
+    checkpoint.meta.pop("elapsed")
+    checkpoint.meta["config"].pop("max_rounds")
+    return result, checkpoint
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_resumed_search_matches_continuous_search(tmp_path, mode):
+    continuous, expected = final_checkpoint(tmp_path / "continuous.npz", None, False, **MODES[mode]())
+    resumed, actual = final_checkpoint(tmp_path / "resumed.npz", SPLIT, False, **MODES[mode]())
+    assert resumed.rounds == continuous.rounds == ROUNDS
+    assert resumed.energy == continuous.energy
+    assert resumed.replica_steps == continuous.replica_steps
+    assert resumed.distinct_ground_states == continuous.distinct_ground_states
+    assert actual.meta == expected.meta
+    assert actual.arrays.keys() == expected.arrays.keys()
+    for name in expected.arrays:
+        assert np.array_equal(actual.arrays[name], expected.arrays[name]), name
+
+
+def test_resumed_parallel_search_matches_serial_search(tmp_path):
+    _, expected = final_checkpoint(tmp_path / "serial.npz", None, False, **MODES["resize"]())
+    _, actual = final_checkpoint(tmp_path / "parallel.npz", SPLIT, True, **MODES["resize"]())
+    assert actual.meta == expected.meta
+    for name in expected.arrays:
+        assert np.array_equal(actual.arrays[name], expected.arrays[name]), name
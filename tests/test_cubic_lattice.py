@@ -0,0 +1,53 @@
+"""
+The moves of the cubic lattice keep the chain valid and draw no randomness beyond the pre-drawn blocks of an MC run.
+"""
+
+import lattice as lat
+import MC_search as mc
+import sequence as seq
+from cubic_lattice import CubicLattice
+from random_streams import RandomStream
+from variables import SI3D_1
+
+
+class CountingStream(RandomStream):
+    """
+    Random stream counting the uniforms drawn one at a time, outside the blocks drawn from its generator.
+    """
+
+    def __init__(self, seed: int):
+        super().__init__(seed)
+        self.calls = 0
+
+    def random(self) -> float:
+        self.calls += 1
+        return super().random()
+
+
+def test_make_lattice_builds_cubic_lattice():
+    lattice = lat.make_lattice(seq.Sequence(hp_sequence=SI3D_1), rng=RandomStream(0), dimension=3)
+    assert isinstance(lattice, CubicLattice)
+    assert type(lat.make_lattice(seq.Sequence(hp_sequence=SI3D_1), rng=RandomStream(0))) is lat.Lattice
+
+
+def test_moves_draw_from_the_step(max_iteration=5000):
+    rng = CountingStream(3)
+    lattice = lat.make_lattice(seq.Sequence(hp_sequence=SI3D_1), rng=rng, dimension=3)
+    rng.calls = 0
+    search = mc.mc_search(lattice, 160, 0.5, max_iteration)
+    search.run()
+    assert rng.calls == 0
+    assert search.move_stats["cks"]["applied"] > 0 and search.move_stats["pull"]["applied"] > 0
+    assert lattice.calculate_energy() == lattice.energy
+
+
+def test_occupancy_holds_only_the_chain(max_iteration=2000):
+    sequence = seq.Sequence(hp_sequence=SI3D_1)
+    lattice = lat.make_lattice(sequence, rng=RandomStream(5), dimension=3)
+    initial = lattice.sequence.conformation.copy()
+    assert lattice.sparse and len(lattice.lattice.cells) == sequence.length
+    mc.mc_search(lattice, 160, 0.5, max_iteration).run()
+    assert len(lattice.lattice.cells) == sequence.length
+    lattice.reset()
+    assert lattice.sequence.conformation.axes == initial.axes
+    assert sorted(lattice.lattice.cells.values()) == list(range(1, sequence.length + 1))
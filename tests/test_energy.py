@@ -0,0 +1,37 @@
+"""
+The vectorized energy evaluators agree with `Lattice.calculate_energy`.
+"""
+
+import numpy as np
+import pytest
+import lattice as lat
+import sequence as seq
+from energy import batch_energy, grid_energy, lattice_energy, perturbed_serpentine
+from random_streams import RandomStream
+
+
+@pytest.mark.parametrize("length", [20, 50, 100, 200])
+def test_evaluators_match_calculate_energy(length):
+    lattice, stack = perturbed_serpentine(length, RandomStream(length))
+    hydrophobic = np.frombuffer(lattice.sequence.conformation.hydrophobic, dtype=np.uint8)
+    assert lattice_energy(lattice) == lattice.calculate_energy()
+    expected = [lat.Lattice(lattice.sequence, conformation=seq.Conformation.from_numpy(lattice.sequence.hp_sequence, coords)).calculate_energy()
+                for coords in stack]
+    assert batch_energy(stack, hydrophobic).tolist() == expected
+
+
+def test_grid_energy_counts_each_contact_once():
+    # A 2x2 square of hydrophobic residues has a single non-bonded contact, between residues 1 and 4
+    grid = np.array([[1, 4], [2, 3]])
+    assert grid_energy(grid, np.ones(4, dtype=np.uint8)) == -1
+
+
+def test_benchmark_leaves_the_random_module_untouched():
+    import random as rd
+    from energy import benchmark
+
+    rd.seed(1)
+    expected = rd.random()
+    rd.seed(1)
+    benchmark(lengths=(20,), repeat=1)
+    assert rd.random() == expected
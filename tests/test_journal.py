@@ -0,0 +1,50 @@
+"""
+The incremental energy of a move matches the full recomputation, and reverting the journal restores the lattice exactly.
+"""
+
+import numpy as np
+import pytest
+import lattice as lat
+import MC_search as mc
+import sequence as seq
+from random_streams import RandomStream
+from variables import SI_4, SI3D_1
+
+
+def snapshot(lattice: lat.Lattice):
+    """
+    Return the coordinates of the residues and the occupancy of the lattice, as plain values.
+    """
+    grid = lattice.lattice
+    if isinstance(grid, np.ndarray):
+        occupancy = grid.tolist()
+    else:
+        occupancy = dict(grid.cells) if isinstance(grid.cells, dict) else grid.cells[:]
+    return [axis.tolist() for axis in lattice.sequence.conformation.axes], occupancy
+
+
+@pytest.mark.parametrize("hp_sequence, dimension, sparse", [(SI_4, 2, False), (SI_4, 2, True), (SI3D_1, 3, True), (SI3D_1, 3, False)])
+def test_moves_update_energy_and_revert_exactly(hp_sequence, dimension, sparse, steps=3000):
+    rng = RandomStream(7)
+    lattice = lat.make_lattice(seq.Sequence(hp_sequence=hp_sequence), sparse=sparse, rng=rng, dimension=dimension)
+    search = mc.mc_search(lattice, 160, 0.5, steps)
+    energy = lattice.calculate_energy()
+    applied = 0
+    for _ in range(steps):
+        before = snapshot(lattice)
+        outcome = search.make_move(int(rng.generator.integers(1, lattice.sequence.length + 1)))
+        if not outcome.applied:
+            assert snapshot(lattice) == before
+            continue
+        applied += 1
+        delta = lattice.calculate_delta_energy(outcome.displaced)
+        assert lattice.calculate_energy() == energy + delta
+        if rng.random() < 0.5:
+            lattice.revert()
+            assert snapshot(lattice) == before
+            assert lattice.calculate_energy() == energy
+        else:
+            lattice.commit()
+            lattice.translation_check_and_apply()
+            energy += delta
+    assert applied > steps // 10
@@ -0,0 +1,50 @@
+"""
+Tuning the ladder in acceptance mode evens out the exchange acceptance of neighbouring temperatures.
+"""
+
+from types import SimpleNamespace
+import numpy as np
+from REMC_search import ReplicaLadder
+from ladder_tuning import LadderTuner
+from random_streams import RandomStream
+from variables import K_B
+
+# Energies of a system of constant heat capacity, whose exchange acceptance only depends on the ratio of the
+# temperatures, so that the even ladder is geometric
+DEGREES = 20
+
+
+def measure_acceptance(ladder, replicas, rng, rounds, tuner=None):
+    """
+    Run exchange rounds, drawing the energy of each replica at its temperature before each round,
+    retuning the ladder when the tuner is due, and return the acceptance of each pair over the rounds.
+    """
+    for _ in range(rounds):
+        for replica in replicas:
+            replica.lattice.energy = rng.gamma(DEGREES, K_B * replica.temperature)
+        ladder.exchange(replicas)
+        if tuner is not None and tuner.due(ladder):
+            ladder.retune(tuner.propose(ladder))
+            for k, replica in enumerate(ladder.replica_at):
+                replicas[replica].temperature = ladder.temperatures[k]
+    return np.array(ladder.acceptance_rates())
+
+
+def test_acceptance_tuning_evens_out_the_acceptance(rounds=4000):
+    temperatures = list(np.linspace(50, 800, 8))
+    replicas = [SimpleNamespace(temperature=temperature, lattice=SimpleNamespace(energy=0.0)) for temperature in temperatures]
+    ladder = ReplicaLadder(temperatures, RandomStream(1))
+    rng = np.random.default_rng(2)
+    before = measure_acceptance(ladder, replicas, rng, rounds)
+    tuner = LadderTuner("acceptance", warmup_rounds=rounds, cycles=3)
+    measure_acceptance(ladder, replicas, rng, 3 * rounds, tuner)
+    assert tuner.frozen
+    ladder.retune(ladder.temperatures)
+    after = measure_acceptance(ladder, replicas, rng, rounds)
+    # The linear ladder accepts far less at the cold end, where the temperatures are relatively further apart
+    assert before[0] < 0.2 and before[-1] > 0.6
+    assert after.max() - after.min() < 0.15
+    assert after.max() - after.min() < (before.max() - before.min()) / 3
+    # The tuned ladder is closer to geometric: its cold gaps are narrower than its hot ones
+    gaps = np.diff(ladder.temperatures)
+    assert gaps[0] < gaps[-1]
@@ -0,0 +1,78 @@
+"""
+The compiled backend follows step for step the trajectory of the Python path of `mc_search.run`.
+
+The kernel runs compiled if Numba is installed, and interpreted otherwise.
+"""
+
+import numpy as np
+import pytest
+import lattice as lat
+import MC_search as mc
+import sequence as seq
+from initialization import random_conformations
+from mc_kernel import MOVE_KINDS, run_lattice_segment
+from random_streams import RandomStream
+from variables import SI_1, SI_2, SI_3, SI_4, seq_ex1
+
+REFERENCE_SEQUENCES = [("SI_1", SI_1, True), ("SI_2", SI_2, True), ("SI_3", SI_3, True), ("SI_4", SI_4, True),
+                       ("seq_ex1", seq_ex1, False)]
+
+
+@pytest.mark.parametrize("seed, name, sequence, is_hp", [(seed, *reference) for seed, reference in enumerate(REFERENCE_SEQUENCES)],
+                         ids=[reference[0] for reference in REFERENCE_SEQUENCES])
+def test_kernel_matches_python_path(seed, name, sequence, is_hp, max_iteration=2000, segments=3, temperature=160, probability=0.5):
+    sequence = seq.Sequence(hp_sequence=sequence) if is_hp else seq.Sequence(sequence=sequence)
+    conformation = random_conformations(sequence, 1, RandomStream(seed))[0]
+    reference = mc.mc_search(lat.Lattice(sequence, conformation, sparse=False, rng=RandomStream(seed)), temperature,
+                             probability, max_iteration, trajectory_mode="full", backend="python")
+    kernel_lattice = lat.Lattice(sequence, conformation, sparse=False)
+    kernel_lattice.energy = kernel_lattice.calculate_energy()
+    # The kernel is given the draws `mc_search.run` makes from a stream of the same seed
+    generator = RandomStream(seed).generator
+    kernel_stats = {kind: {"proposed": 0, "applied": 0, "accepted": 0} for kind in MOVE_KINDS}
+    for _ in range(segments):
+        first_step, first_frame = reference.step, len(reference.trajectory)
+        reference.run()
+
+        residues = generator.integers(1, sequence.length + 1, size=max_iteration)
+        move_draws = generator.random(max_iteration)
+        acceptance_draws = generator.random(max_iteration)
+        steps, move_stats, energies, accepted = run_lattice_segment(kernel_lattice, residues, move_draws, acceptance_draws,
+                                                                    temperature, probability)
+
+        accepted_steps = np.flatnonzero(accepted)
+        assert steps == reference.step - first_step
+        assert (accepted_steps + first_step + 1).tolist() == reference.trajectory.steps[first_frame:]
+        assert energies[accepted_steps].tolist() == reference.trajectory.energies[first_frame:]
+        for kind, stats in move_stats.items():
+            for key, count in stats.items():
+                kernel_stats[kind][key] += count
+        assert kernel_stats == reference.move_stats
+        assert kernel_lattice.sequence.conformation.x == reference.lattice.sequence.conformation.x
+        assert kernel_lattice.sequence.conformation.y == reference.lattice.sequence.conformation.y
+        assert np.array_equal(kernel_lattice.lattice, reference.lattice.lattice)
+        assert kernel_lattice.energy == reference.lattice.energy == reference.lattice.calculate_energy()
+
+
+def test_compiled_backend_warns_on_a_sparse_lattice():
+    sequence = seq.Sequence(hp_sequence=SI_1)
+    with pytest.warns(UserWarning, match="dense lattice"):
+        search = mc.mc_search(lat.Lattice(sequence, sparse=True, rng=RandomStream(0)), 160, 0.5, 10, backend="compiled")
+    assert search.backend == "python"
+
+
+def test_compiled_backend_warns_when_validating_energies():
+    sequence = seq.Sequence(hp_sequence=SI_1)
+    with pytest.warns(UserWarning, match="does not validate"):
+        search = mc.mc_search(lat.Lattice(sequence, rng=RandomStream(0)), 160, 0.5, 10, backend="compiled", validate_energy=True)
+    assert search.backend == "python"
+
+
+@pytest.mark.filterwarnings("ignore:Numba is not installed")
+def test_long_chains_get_a_dense_lattice_with_the_compiled_backend():
+    from REMC_search import REMC_search
+    from variables import SPARSE_GRID_MIN_LENGTH
+
+    sequence = seq.Sequence(hp_sequence="HP" * (SPARSE_GRID_MIN_LENGTH // 2 + 5))
+    result = REMC_search(sequence, 160, 220, 2, max_iteration=10, seed=0, backend="compiled", max_rounds=1, observers=[])
+    assert not result.lattice.sparse
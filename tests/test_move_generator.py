@@ -0,0 +1,42 @@
+"""
+The rejection-free search selects moves from rates summed in a tree kept in step with the legal moves.
+"""
+
+import bisect
+import itertools
+import pytest
+import lattice as lat
+import MC_search as mc
+import sequence as seq
+from move_generator import RateTree
+from random_streams import RandomStream
+from variables import SI_4
+
+
+@pytest.mark.parametrize("length", [1, 2, 7, 16, 37])
+def test_rate_tree_finds_the_same_index_as_the_cumulated_rates(length, draws=200):
+    rng = RandomStream(length)
+    rates = [rng.random() if rng.random() < 0.7 else 0.0 for _ in range(length)]
+    tree = RateTree(length)
+    for index, rate in enumerate(rates):
+        tree.set(index, rate)
+    cumulative = list(itertools.accumulate(rates))
+    assert tree.total == pytest.approx(cumulative[-1])
+    for _ in range(draws):
+        draw = rng.random() * cumulative[-1]
+        index, rest = tree.find(draw)
+        expected = bisect.bisect_right(cumulative, draw)
+        assert index == expected
+        assert rest == pytest.approx(draw - (cumulative[index - 1] if index else 0.0), abs=1e-12)
+
+
+def test_rate_tree_follows_the_legal_moves(max_iteration=3000):
+    sequence = seq.Sequence(hp_sequence=SI_4)
+    search = mc.mc_search(lat.Lattice(sequence, rng=RandomStream(3)), 160, 0.5, max_iteration, rejection_free=True)
+    search.run()
+    generator = search.move_generator
+    generator.validate()
+    tree = generator.rate_tree
+    for chain_index, rate in enumerate(generator.rates):
+        assert tree.nodes[tree.size + chain_index] == rate
+    assert tree.total == pytest.approx(sum(generator.rates))
@@ -0,0 +1,70 @@
+"""
+The REMC search runs one replica at each temperature of its ladder, until one of its stop conditions is met.
+"""
+
+import os
+import signal
+import pytest
+import sequence as seq
+from REMC_search import REMC_search, temp_range
+from variables import SI_1
+
+
+def search(**kwargs):
+    """
+    Run a quiet REMC search on SI_1, with a safety cap on the rounds of the searches expected to stop otherwise.
+    """
+    kwargs.setdefault("max_rounds", 10000)
+    kwargs.setdefault("observers", [])
+    return REMC_search(seq.Sequence(hp_sequence=SI_1), 160, 220, 4, max_iteration=50, seed=1, **kwargs)
+
+
+def test_every_temperature_gets_a_replica_when_the_range_is_not_a_multiple():
+    # 60 degrees over 7 replicas gives a step of 8, hence 8 temperatures
+    temperatures = temp_range(160, 220, 7)
+    assert len(temperatures) == 8
+    result = REMC_search(seq.Sequence(hp_sequence=SI_1), 160, 220, 7, max_iteration=50, seed=1, max_rounds=3, observers=[])
+    assert result.rounds == 3
+    assert len(result.replica_steps) == len(temperatures)
+
+
+def test_stops_at_the_target_energy():
+    result = search(energy_optimal=-4)
+    assert result.reason == "target_energy"
+    assert result.energy <= -4
+
+
+def test_stops_when_the_wall_time_is_spent():
+    result = search(wall_time=0.5)
+    assert result.reason == "wall_time"
+    assert result.seconds >= 0.5
+
+
+def test_stops_after_max_rounds():
+    result = search(max_rounds=5)
+    assert result.reason == "max_rounds"
+    assert result.rounds == 5
+
+
+def test_stops_when_the_best_energy_stagnates():
+    result = search(stagnation_rounds=3)
+    assert result.reason == "stagnation"
+    assert result.rounds < 10000
+
+
+@pytest.mark.parametrize("signum", [signal.SIGINT, signal.SIGTERM])
+def test_stops_after_the_round_of_a_signal(signum):
+    rounds = []
+
+    def interrupt(record):
+        if record["event"] == "round":
+            rounds.append(record)
+            if len(rounds) == 2:
+                os.kill(os.getpid(), signum)
+
+    previous = signal.getsignal(signum)
+    result = search(observers=[interrupt])
+    assert result.reason == "interrupted"
+    assert result.rounds == 2
+    assert result.lattice is not None
+    assert signal.getsignal(signum) is previous
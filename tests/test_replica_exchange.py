@@ -0,0 +1,49 @@
+"""
+Replica exchanges permute the temperatures of the replicas, whose lattices stay in place.
+"""
+
+import lattice as lat
+import MC_search as mc
+import sequence as seq
+from REMC_search import ReplicaLadder, exchange_replicates
+from random_streams import RandomStream
+from variables import SI_1
+
+
+def replicas(temperatures, seed: int = 2):
+    """
+    Build one replica per temperature, each on its own random lattice.
+    """
+    rng = RandomStream(seed)
+    return [mc.mc_search(lat.make_lattice(seq.Sequence(hp_sequence=SI_1), rng=rng), temperature, 0.5, 10)
+            for temperature in temperatures]
+
+
+def test_exchange_swaps_temperatures_only():
+    cold, hot = replicas([160, 170])
+    lattices = cold.lattice, hot.lattice
+    conformations = [[axis.tolist() for axis in replica.lattice.sequence.conformation.axes] for replica in (cold, hot)]
+    # A colder replica with a higher energy is always exchanged
+    cold.lattice.energy, hot.lattice.energy = -1, -5
+    assert exchange_replicates(cold, hot, RandomStream(0))
+    assert (cold.temperature, hot.temperature) == (170, 160)
+    assert (cold.lattice, hot.lattice) == lattices
+    assert (cold.lattice.energy, hot.lattice.energy) == (-1, -5)
+    assert [[axis.tolist() for axis in replica.lattice.sequence.conformation.axes] for replica in (cold, hot)] == conformations
+
+
+def test_ladder_keeps_a_permutation_of_the_replicas(rounds=200):
+    temperatures = [160, 170, 180, 190, 200, 210]
+    replicates = replicas(temperatures)
+    ladder = ReplicaLadder(temperatures, RandomStream(4))
+    energies = RandomStream(5)
+    for _ in range(rounds):
+        for replica in replicates:
+            replica.lattice.energy = -int(energies.random() * 10)
+        ladder.exchange(replicates)
+        assert sorted(ladder.replica_at) == list(range(len(temperatures)))
+        for k, replica in enumerate(ladder.replica_at):
+            assert ladder.slot_of[replica] == k
+            assert replicates[replica].temperature == temperatures[k]
+    assert sum(ladder.accepts) > 0
+    assert ladder.replica_at != list(range(len(temperatures)))
@@ -0,0 +1,43 @@
+"""
+A search on the sparse lattice follows the same trajectory as on the dense one, without ever translating the chain.
+"""
+
+import lattice as lat
+import MC_search as mc
+import sequence as seq
+from occupancy import SparseGrid
+from random_streams import RandomStream
+from variables import SI_4
+
+
+def relative_coordinates(lattice: lat.Lattice):
+    """
+    Return the coordinates of the residues relative to the first one.
+    """
+    conformation = lattice.sequence.conformation
+    origin = conformation.position(0)
+    return [tuple(c - o for c, o in zip(conformation.position(index), origin)) for index in range(len(conformation))]
+
+
+def test_sparse_and_dense_searches_agree(segments=20, steps=1000):
+    # The chain starts stretched along the edge of the dense lattice, which has to translate it as it folds
+    conformation = seq.Conformation(SI_4)
+    for index in range(len(SI_4)):
+        conformation.x[index] = index
+    searches = []
+    for sparse in (False, True):
+        lattice = lat.make_lattice(seq.Sequence(hp_sequence=SI_4), conformation, sparse=sparse)
+        searches.append(mc.mc_search(lattice, 220, 0.5, steps, rng=RandomStream(9)))
+    dense, sparse = searches
+    assert isinstance(sparse.lattice.lattice, SparseGrid)
+    for _ in range(segments):
+        for search in searches:
+            search.run()
+        assert dense.lattice.energy == sparse.lattice.energy == sparse.lattice.calculate_energy()
+        assert relative_coordinates(dense.lattice) == relative_coordinates(sparse.lattice)
+        assert dense.move_stats == sparse.move_stats
+        occupied = {sparse.lattice.sequence.conformation.position(index): index + 1 for index in range(len(SI_4))}
+        assert sparse.lattice.lattice.cells == occupied
+    # Only the dense lattice has translated the chain
+    assert dense.lattice.sequence.conformation.position(0) != sparse.lattice.sequence.conformation.position(0)
+    assert sparse.lattice.translation_check_and_apply() == (0, 0)
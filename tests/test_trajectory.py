@@ -0,0 +1,57 @@
+"""
+The bounded trajectory modes keep the frames of the full trajectory they were recorded alongside.
+"""
+
+import pytest
+import lattice as lat
+import MC_search as mc
+import sequence as seq
+from random_streams import RandomStream
+from trajectory import Delta, Trajectory
+from variables import SI_4, SI3D_1
+
+
+def record(hp_sequence: str, dimension: int, trajectory: Trajectory, steps: int = 20000) -> Trajectory:
+    """
+    Run the same MC search on a dense lattice, recording it in the given trajectory. The chain starts stretched
+    along the edge of the lattice, so that it gets translated as it folds.
+    """
+    rng = RandomStream(11)
+    conformation = seq.Conformation(hp_sequence, dimension)
+    for index in range(len(hp_sequence)):
+        conformation.x[index] = index
+    lattice = lat.make_lattice(seq.Sequence(hp_sequence=hp_sequence), conformation, sparse=False, rng=rng)
+    search = mc.mc_search(lattice, 220, 0.5, steps)
+    search.trajectory = trajectory
+    trajectory.start(lattice)
+    search.run()
+    return trajectory
+
+
+def frames(trajectory: Trajectory):
+    """
+    Return the step, energy and coordinates of the frames of a trajectory, as plain values.
+    """
+    return [(step, energy, [axis.tolist() for axis in conformation.axes]) for step, energy, conformation in trajectory.replay()]
+
+
+@pytest.mark.parametrize("hp_sequence, dimension", [(SI_4, 2), (SI3D_1, 3)])
+def test_modes_reconstruct_the_full_trajectory(hp_sequence, dimension):
+    full = frames(record(hp_sequence, dimension, Trajectory("full")))
+    assert len(full) > 100
+
+    delta = record(hp_sequence, dimension, Trajectory("delta", keyframe_interval=7))
+    assert any(isinstance(frame, Delta) and any(frame.shift) for frame in delta.frames)
+    assert frames(delta) == full
+    for k in (0, 5, len(full) // 2, -1):
+        assert [axis.tolist() for axis in delta.conformation_at(k).axes] == full[k][2]
+
+    ring = record(hp_sequence, dimension, Trajectory("ring", size=50))
+    assert frames(ring) == full[-50:]
+
+    stride = record(hp_sequence, dimension, Trajectory("stride", stride=500))
+    sampled = frames(stride)
+    assert [step for step, _, _ in sampled] == list(range(0, 20001, 500))
+    for step, energy, axes in sampled:
+        # The conformation at a sampled step is the last one accepted up to that step
+        assert (energy, axes) == next((e, a) for s, e, a in reversed(full) if s <= step)